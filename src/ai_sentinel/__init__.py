@@ -1,4 +1,47 @@
 # init for whole package
-from .llm import BaseLLMClient, AzureOpenAIClient, GeminiClient, OpenAIClient
-from .core import LLMResponse
-from .guards import ToxicityGuard
+# names are imported on first access, so `import ai_sentinel` stays cheap and loads no provider SDK
+import importlib
+import importlib.util
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .llm import BaseLLMClient, AzureOpenAIClient, GeminiClient, OpenAIClient
+    from .core import LLMResponse
+    from .guards import ToxicityGuard
+
+# public name -> subpackage exporting it
+_LAZY: dict[str, str] = {
+    'BaseLLMClient': '.llm',
+    'AzureOpenAIClient': '.llm',
+    'GeminiClient': '.llm',
+    'OpenAIClient': '.llm',
+    'LLMResponse': '.core',
+    'ToxicityGuard': '.guards',
+}
+
+__all__ = [
+    'BaseLLMClient',
+    'AzureOpenAIClient',
+    'GeminiClient',
+    'OpenAIClient',
+    'LLMResponse',
+    'ToxicityGuard'
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        value: Any = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif not name.startswith('__') and importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        # subpackages stay reachable as attributes, as when they were imported eagerly
+        value = importlib.import_module(f'{__name__}.{name}')
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # cache it, later lookups don't go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,12 @@
+# init to show that benchmarks is a module
+from .imports import measure_imports
+from .runner import SCENARIOS, compare, run_benchmarks
+from .server import MockOpenAIServer
+
+__all__ = [
+    'MockOpenAIServer',
+    'run_benchmarks',
+    'measure_imports',
+    'compare',
+    'SCENARIOS'
+]
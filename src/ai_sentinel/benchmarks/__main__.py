@@ -0,0 +1,119 @@
+# python -m ai_sentinel.benchmarks {run,imports,serve,compare}
+import argparse
+import asyncio
+import json
+import sys
+
+from typing import Optional
+
+from ai_sentinel.benchmarks.imports import IMPORT_STATEMENTS, measure_imports
+from ai_sentinel.benchmarks.runner import SCENARIOS, compare, run_benchmarks
+from ai_sentinel.benchmarks.server import MockOpenAIServer
+
+
+def _add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--latency', default='lognormal', choices=['constant', 'uniform', 'exponential', 'lognormal'], help='latency distribution of the mock server')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='mean (median for lognormal) latency, 0 measures pure client overhead')
+    parser.add_argument('--sigma', type=float, default=0.5, help='shape of the lognormal latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the latency and failure draws')
+
+
+def _server_options(args: argparse.Namespace) -> dict:
+    return {
+        'latency': args.latency,
+        'latency_ms': args.latency_ms,
+        'sigma': args.sigma,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'retry_after': args.retry_after,
+        'seed': args.seed,
+    }
+
+
+def _print_table(report: dict) -> None:
+    '''Human-readable summary on stderr, stdout is kept for the JSON report'''
+    print(f"{'scenario':<14}{'conc':>6}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=sys.stderr)
+    for row in report['results']:
+        percentiles: str = ''.join(f'{row[key]:>10.1f}' if row[key] is not None else f"{'-':>10}" for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"{row['scenario']:<14}{row['concurrency']:>6}{row['errors']:>8}{row['throughput_rps']:>10.1f}{percentiles}", file=sys.stderr)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m ai_sentinel.benchmarks', description='Offline benchmarks of ai-sentinel against a local OpenAI-compatible mock server')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='benchmark ToxicityGuard and print a JSON report')
+    run.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='concurrency levels')
+    run.add_argument('--requests', type=int, default=200, help='requests per scenario and level')
+    run.add_argument('--warmup', type=int, default=10, help='untimed requests before measuring')
+    run.add_argument('--scenario', nargs='+', default=list(SCENARIOS), choices=SCENARIOS, help='scenarios to run')
+    run.add_argument('--base-url', default=None, help='benchmark an existing OpenAI-compatible server instead of the mock')
+    run.add_argument('--model', default='mock', help='model name sent to the server')
+    run.add_argument('--output', default=None, help='write the report to this file instead of stdout')
+    _add_server_arguments(run)
+
+    imports = commands.add_parser('imports', help='time importing the package in fresh interpreters and print a JSON report')
+    imports.add_argument('--statement', nargs='+', default=list(IMPORT_STATEMENTS), help='import statements to time')
+    imports.add_argument('--repeat', type=int, default=5, help='fresh interpreters per statement')
+    imports.add_argument('--output', default=None, help='write the report to this file instead of stdout')
+
+    serve = commands.add_parser('serve', help='run the mock server in the foreground')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    _add_server_arguments(serve)
+
+    diff = commands.add_parser('compare', help='compare two reports, exit with 1 on a regression')
+    diff.add_argument('baseline', help='report of the previous release')
+    diff.add_argument('current', help='report to check')
+    diff.add_argument('--tolerance', type=float, default=0.1, help='relative change tolerated, ex. 0.1 for 10%%')
+    diff.add_argument('--min-delta-ms', type=float, default=1.0, help='latency changes below this are ignored')
+
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.command in ('run', 'imports'):
+        report: dict
+        if args.command == 'run':
+            report = run_benchmarks(
+                concurrency=args.concurrency,
+                requests=args.requests,
+                scenarios=args.scenario,
+                warmup=args.warmup,
+                server_options=_server_options(args),
+                base_url=args.base_url,
+                model=args.model
+            )
+            _print_table(report)
+        else:
+            report = measure_imports(args.statement, args.repeat)
+            for row in report['results']:
+                print(f"{row['scenario']:<50}{row['p50_ms']:>10.1f} ms  {', '.join(row['heavy_modules']) or '-'}", file=sys.stderr)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        return 0
+
+    if args.command == 'serve':
+        server = MockOpenAIServer(host=args.host, port=args.port, **_server_options(args))
+        print(f'Serving on {server.base_url}', file=sys.stderr)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline: dict = json.load(file)
+    with open(args.current, encoding='utf-8') as file:
+        current: dict = json.load(file)
+    regressions: list[str] = compare(baseline, current, args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
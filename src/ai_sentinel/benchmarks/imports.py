@@ -0,0 +1,68 @@
+# import-time benchmark: how long importing the package takes and which heavy dependencies it loads
+import json
+import os
+import subprocess
+import sys
+
+from typing import Iterable
+
+from ai_sentinel.benchmarks.runner import environment
+from ai_sentinel.core.metrics import LatencyHistogram
+
+# dependencies that cost hundreds of milliseconds (or seconds) to import
+HEAVY_MODULES: tuple[str, ...] = ('openai', 'google.genai', 'torch', 'transformers', 'numpy', 'httpx')
+
+IMPORT_STATEMENTS: tuple[str, ...] = (
+    'import ai_sentinel',
+    'from ai_sentinel import ToxicityGuard',
+    'from ai_sentinel.llm import OpenAIClient',
+    'from ai_sentinel.llm import GeminiClient',
+)
+
+# runs in a fresh interpreter: time the statement, then list the heavy modules it loaded
+_PROBE: str = '''
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "loaded": [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+'''
+
+
+def measure_imports(statements: Iterable[str] = IMPORT_STATEMENTS, repeat: int = 5) -> dict:
+    '''
+    Time every import statement in {statements} {repeat} times, each in a fresh interpreter
+    Return a report like run_benchmarks' with one row per statement, including the heavy modules
+    the statement loaded, so compare() catches both slower imports and new heavy dependencies.
+    '''
+    if repeat < 1:
+        raise ValueError('Repeat must be at least 1')
+
+    # children resolve ai_sentinel the same way as this process, installed or not
+    env: dict[str, str] = {**os.environ, 'PYTHONPATH': os.pathsep.join(path for path in sys.path if path)}
+    rows: list[dict] = []
+    for statement in statements:
+        histogram = LatencyHistogram(window=repeat)
+        loaded: set[str] = set()
+        for _ in range(repeat):
+            output: str = subprocess.run(
+                [sys.executable, '-c', _PROBE, statement, json.dumps(HEAVY_MODULES)],
+                capture_output=True, text=True, check=True, env=env
+            ).stdout
+            sample: dict = json.loads(output.strip().splitlines()[-1])
+            histogram.observe(sample['ms'])
+            loaded.update(sample['loaded'])
+
+        stats: dict = histogram.stats
+        rows.append({
+            'scenario': f'import: {statement}',
+            'concurrency': 1,
+            'requests': repeat,
+            'errors': 0,
+            'mean_ms': stats['mean_ms'],
+            'p50_ms': stats['p50_ms'],
+            'p95_ms': stats['p95_ms'],
+            'p99_ms': stats['p99_ms'],
+            'heavy_modules': sorted(loaded),
+        })
+    return {**environment(), 'repeat': repeat, 'results': rows}
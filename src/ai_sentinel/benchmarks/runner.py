@@ -0,0 +1,247 @@
+# throughput and latency benchmarks of ToxicityGuard against the mock server
+import asyncio
+import multiprocessing
+import platform
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Any, Iterable, Optional
+
+from ai_sentinel.benchmarks.server import MockOpenAIServer
+from ai_sentinel.core.metrics import LatencyHistogram
+from ai_sentinel.guards.toxicity_guard import ToxicityGuard
+from ai_sentinel.llm.open_source_openai import OpenAIClient
+
+SCENARIOS: tuple[str, ...] = ('analyze_async', 'analyze')
+
+# metrics compared between two reports, and whether higher is better
+_COMPARED: dict[str, bool] = {'throughput_rps': True, 'p50_ms': False, 'p95_ms': False, 'p99_ms': False}
+
+
+def run_benchmarks(
+        concurrency: Iterable[int] = (1, 8, 32),
+        requests: int = 200,
+        scenarios: Iterable[str] = SCENARIOS,
+        warmup: int = 10,
+        server_options: Optional[dict] = None,
+        base_url: Optional[str] = None,
+        model: str = 'mock'
+    ) -> dict:
+    '''
+    Measure throughput and latency percentiles of ToxicityGuard at every {concurrency} level
+    Each scenario sends {requests} distinct texts ('analyze_async' from concurrent tasks, 'analyze'
+    from a thread pool) after {warmup} untimed ones. Unless {base_url} points at an existing
+    server, a MockOpenAIServer configured by {server_options} is started in a separate process, so
+    its work does not compete with the client for the GIL (scripts calling this need the usual
+    if __name__ == '__main__' guard of multiprocessing).
+    Return a JSON-serializable report; save it and compare() it with the next release's.
+    '''
+    levels: list[int] = sorted(set(concurrency))
+    scenarios = list(scenarios)
+    if not levels or levels[0] < 1:
+        raise ValueError('Concurrency levels must be at least 1')
+    if requests < 1 or warmup < 0:
+        raise ValueError('Requests must be at least 1 and warmup must not be negative')
+    unknown: set[str] = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f'Unknown scenarios: {sorted(unknown)}, choose from {list(SCENARIOS)}')
+
+    server_options = dict(server_options or {})
+    results: list[dict] = []
+    with _ServerProcess(server_options, base_url) as url:
+        client = OpenAIClient(base_url=url, model=model)
+        guard = ToxicityGuard(client)
+        try:
+            if 'analyze_async' in scenarios:
+                results.extend(asyncio.run(_run_async(guard, levels, requests, warmup)))
+            if 'analyze' in scenarios:
+                results.extend(_run_sync(guard, levels, requests, warmup))
+        finally:
+            client.close()
+
+    return {
+        **environment(),
+        'server': server_options if base_url is None else {'base_url': base_url},
+        'requests': requests,
+        'results': results,
+    }
+
+
+def environment() -> dict:
+    '''Return the package version, Python version, platform and time a report is made with'''
+    return {
+        'ai_sentinel': _version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1, min_delta_ms: float = 1.0) -> list[str]:
+    '''
+    Return the regressions of report {current} against report {baseline}: a throughput more than
+    {tolerance} lower, or a p50/p95/p99 more than {tolerance} (and {min_delta_ms}) higher, for the
+    same scenario and concurrency level, or an import that loads a heavy module it did not load
+    before. An empty list means no regression.
+    '''
+    previous: dict[tuple, dict] = {(row['scenario'], row['concurrency']): row for row in baseline.get('results', [])}
+    regressions: list[str] = []
+    for row in current.get('results', []):
+        before: Optional[dict] = previous.get((row['scenario'], row['concurrency']))
+        if before is None:
+            continue
+        for module in sorted(set(row.get('heavy_modules', [])) - set(before.get('heavy_modules', []))):
+            regressions.append(f"{row['scenario']}: now imports {module}")
+        for name, higher_is_better in _COMPARED.items():
+            old, new = before.get(name), row.get(name)
+            if old is None or new is None:
+                continue
+            if higher_is_better:
+                regressed: bool = new < old * (1 - tolerance)
+            else:
+                regressed = new > old * (1 + tolerance) and new - old > min_delta_ms
+            if regressed:
+                regressions.append(f"{row['scenario']} @ {row['concurrency']}: {name} {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def _texts(count: int, offset: int = 0) -> list[str]:
+    '''Distinct benchmark texts (every tenth one toxic), so no layer can answer from memory'''
+    return [
+        f'benchmark message {offset + idx}: ' + ('you are an idiot' if idx % 10 == 0 else 'have a nice day')
+        for idx in range(count)
+    ]
+
+
+async def _run_async(guard: ToxicityGuard, levels: list[int], requests: int, warmup: int) -> list[dict]:
+    '''Run the analyze_async scenario at every level on one event loop, so connections stay warm'''
+    await asyncio.gather(*[guard.analyze_async(text) for text in _texts(warmup, -warmup)], return_exceptions=True)
+    results: list[dict] = []
+    for level in levels:
+        texts: list[str] = _texts(requests, level * requests)
+        histogram = LatencyHistogram(window=requests)
+        errors: list[int] = [0]
+        queue = iter(texts)
+
+        async def worker():
+            # each worker pulls the next text off the shared iterator
+            for text in queue:
+                start: float = time.perf_counter()
+                try:
+                    await guard.analyze_async(text)
+                except Exception:
+                    errors[0] += 1
+                    continue
+                histogram.observe((time.perf_counter() - start) * 1000)
+
+        started_at: float = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(min(level, requests))])
+        results.append(_summary('analyze_async', level, requests, errors[0], time.perf_counter() - started_at, histogram))
+    return results
+
+
+def _run_sync(guard: ToxicityGuard, levels: list[int], requests: int, warmup: int) -> list[dict]:
+    '''Run the analyze scenario at every level, with one thread per concurrent caller'''
+    for text in _texts(warmup, -warmup):
+        try:
+            guard.analyze(text)
+        except Exception:
+            pass
+
+    results: list[dict] = []
+    for level in levels:
+        texts: list[str] = _texts(requests, -(level + 1) * requests)
+        histogram = LatencyHistogram(window=requests)
+        errors: list[int] = [0]
+        lock = threading.Lock()
+        queue = iter(texts)
+
+        def worker():
+            while True:
+                with lock:
+                    text: Optional[str] = next(queue, None)
+                if text is None:
+                    return
+                start: float = time.perf_counter()
+                try:
+                    guard.analyze(text)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                histogram.observe((time.perf_counter() - start) * 1000)
+
+        started_at: float = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            for future in [pool.submit(worker) for _ in range(min(level, requests))]:
+                future.result()
+        results.append(_summary('analyze', level, requests, errors[0], time.perf_counter() - started_at, histogram))
+    return results
+
+
+def _summary(scenario: str, level: int, requests: int, errors: int, duration: float, histogram: LatencyHistogram) -> dict:
+    stats: dict = histogram.stats
+    return {
+        'scenario': scenario,
+        'concurrency': level,
+        'requests': requests,
+        'errors': errors,
+        'duration_s': duration,
+        'throughput_rps': (requests - errors) / duration if duration > 0 else 0.0,
+        'mean_ms': stats['mean_ms'],
+        'p50_ms': stats['p50_ms'],
+        'p95_ms': stats['p95_ms'],
+        'p99_ms': stats['p99_ms'],
+    }
+
+
+def _version() -> Optional[str]:
+    try:
+        return metadata.version('ai-sentinel')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _serve(options: dict, connection: Any) -> None:
+    '''Entry point of the server process: start the mock, report its port, serve until terminated'''
+    async def main():
+        server = MockOpenAIServer(**options)
+        await server.start()
+        connection.send(server.port)
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class _ServerProcess:
+    '''Runs a MockOpenAIServer in a child process for the duration of a with block, yielding its base URL'''
+    def __init__(self, options: dict, base_url: Optional[str] = None, startup_timeout: float = 30.0):
+        self.options = options
+        self.base_url = base_url
+        self.startup_timeout = startup_timeout
+        self.process: Optional[multiprocessing.Process] = None
+
+    def __enter__(self) -> str:
+        if self.base_url is not None:
+            return self.base_url
+
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(target=_serve, args=(self.options, sender), daemon=True)
+        self.process.start()
+        deadline: float = time.monotonic() + self.startup_timeout
+        while not receiver.poll(0.1):
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                self.process.terminate()
+                raise RuntimeError('The mock server process did not start')
+        port: int = receiver.recv()
+        return f"http://{self.options.get('host', '127.0.0.1')}:{port}/v1"
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
@@ -0,0 +1,239 @@
+# local stand-in for an OpenAI-compatible endpoint, used by the benchmarks
+import asyncio
+import json
+import random
+import re
+import time
+
+from typing import Any, Literal, Optional
+
+from ai_sentinel.core.tokens import estimate_tokens
+
+LatencyDistribution = Literal['constant', 'uniform', 'exponential', 'lognormal']
+
+# words that make the mock judge answer "toxic", so results are deterministic per text
+_TOXIC_WORDS: re.Pattern = re.compile(r'\b(idiot|stupid|hate|kill|toxic)\b', re.IGNORECASE)
+
+_REASONS: dict[int, str] = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+
+
+class MockOpenAIServer:
+    '''
+    Minimal OpenAI-compatible chat completions server with configurable latency and failures
+
+    Answers /v1/chat/completions (plain and streamed) with a well-formed toxicity verdict, or a
+    verdict per id for packed requests, and /v1/models for validation. Every request waits a
+    latency drawn from {latency} around {latency_ms}, then fails with a 500 with probability
+    {error_rate} or with a 429 with probability {rate_limit_rate}. Serves HTTP/1.1 with keep-alive
+    on asyncio only, so it adds no dependencies and little overhead of its own.
+
+    Parameters:
+    latency (LatencyDistribution): 'constant', 'uniform' (0 to 2x), 'exponential' or 'lognormal' | default = 'lognormal'
+    latency_ms (float): Mean latency (median for 'lognormal'), 0 to measure pure client overhead | default = 50.0
+    sigma (float): Shape of the 'lognormal' distribution, higher gives a longer tail | default = 0.5
+    error_rate (float): Share of requests answered with a 500 | default = 0.0
+    rate_limit_rate (float): Share of requests answered with a 429 | default = 0.0
+    retry_after (Optional[float]): Seconds sent in the Retry-After header of 429s | default = None
+    host (str): Interface to listen on | default = '127.0.0.1'
+    port (int): Port to listen on, 0 picks a free one | default = 0
+    seed (Optional[int]): Seed of the latency and failure draws | default = None
+    '''
+    def __init__(
+            self,
+            latency: LatencyDistribution = 'lognormal',
+            latency_ms: float = 50.0,
+            sigma: float = 0.5,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            retry_after: Optional[float] = None,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            seed: Optional[int] = None
+        ):
+        if latency not in ('constant', 'uniform', 'exponential', 'lognormal'):
+            raise ValueError("Latency must be 'constant', 'uniform', 'exponential' or 'lognormal'")
+        if latency_ms < 0 or sigma < 0:
+            raise ValueError('Latency and sigma must not be negative')
+        if not 0.0 <= error_rate <= 1.0 or not 0.0 <= rate_limit_rate <= 1.0 or error_rate + rate_limit_rate > 1.0:
+            raise ValueError('Error rate and rate limit rate must be between 0.0 and 1.0 and add up to at most 1.0')
+
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.requests: int = 0
+        self.errors: int = 0
+        self.rate_limited: int = 0
+
+    @property
+    def base_url(self) -> str:
+        '''Base URL to pass to OpenAIClient'''
+        return f'http://{self.host}:{self.port}/v1'
+
+    async def start(self) -> None:
+        '''Start listening on the running event loop, the chosen port is stored in {port}'''
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        '''Stop listening and close the server'''
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        '''Start the server if needed and serve until cancelled'''
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def __aenter__(self) -> 'MockOpenAIServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    def sample_latency(self) -> float:
+        '''Draw the latency (seconds) of one request'''
+        mean: float = self.latency_ms / 1000
+        if mean == 0 or self.latency == 'constant':
+            return mean
+        if self.latency == 'uniform':
+            return self.random.uniform(0, 2 * mean)
+        if self.latency == 'exponential':
+            return self.random.expovariate(1 / mean)
+        return self.random.lognormvariate(0, self.sigma) * mean
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Serve the requests of one (keep-alive) connection'''
+        try:
+            while True:
+                request_line: bytes = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers: dict[str, str] = {}
+                while True:
+                    line: bytes = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body: bytes = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                await self._respond(method, path.split('?', 1)[0], body, writer)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if path.endswith('/models'):
+            self._write_json(writer, 200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'created': 0, 'owned_by': 'ai-sentinel'}]})
+            return
+        if not path.endswith('/chat/completions'):
+            self._write_json(writer, 404, {'error': {'message': f'Unknown path {path}', 'type': 'invalid_request_error'}})
+            return
+        if method != 'POST':
+            self._write_json(writer, 405, {'error': {'message': 'Use POST', 'type': 'invalid_request_error'}})
+            return
+
+        self.requests += 1
+        request: dict = json.loads(body or b'{}')
+        await asyncio.sleep(self.sample_latency())
+
+        draw: float = self.random.random()
+        if draw < self.error_rate:
+            self.errors += 1
+            self._write_json(writer, 500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            return
+        if draw < self.error_rate + self.rate_limit_rate:
+            self.rate_limited += 1
+            headers: dict[str, str] = {} if self.retry_after is None else {'Retry-After': f'{self.retry_after:g}'}
+            self._write_json(writer, 429, {'error': {'message': 'Injected rate limit', 'type': 'rate_limit_error'}}, headers)
+            return
+
+        messages: list[dict] = request.get('messages') or [{}]
+        prompt: str = str(messages[-1].get('content', ''))
+        content: str = json.dumps(_verdicts(prompt))
+        model: str = request.get('model', 'mock')
+        if request.get('stream'):
+            await self._write_stream(writer, model, content)
+            return
+
+        prompt_tokens: int = sum(estimate_tokens(str(message.get('content', ''))) for message in messages)
+        completion_tokens: int = estimate_tokens(content)
+        self._write_json(writer, 200, {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    @staticmethod
+    def _write_json(writer: asyncio.StreamWriter, status: int, payload: dict, headers: Optional[dict[str, str]] = None) -> None:
+        body: bytes = json.dumps(payload).encode()
+        head: str = f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+        for name, value in (headers or {}).items():
+            head += f'{name}: {value}\r\n'
+        writer.write(head.encode() + b'\r\n' + body)
+
+    @staticmethod
+    async def _write_stream(writer: asyncio.StreamWriter, model: str, content: str, piece: int = 16) -> None:
+        '''Stream {content} as server-sent chat completion chunks of {piece} characters'''
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        created: int = int(time.time())
+        deltas: list[dict] = [{'content': content[start:start + piece]} for start in range(0, len(content), piece)]
+        for position, delta in enumerate(deltas):
+            chunk: dict = {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': 'stop' if position == len(deltas) - 1 else None}],
+            }
+            _write_chunk(writer, f'data: {json.dumps(chunk)}\n\n'.encode())
+            await writer.drain()
+        _write_chunk(writer, b'data: [DONE]\n\n')
+        writer.write(b'0\r\n\r\n')
+
+
+def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    '''Write {data} as one chunk of a chunked transfer-encoded body'''
+    writer.write(b'%x\r\n' % len(data) + data + b'\r\n')
+
+
+def _verdict(text: str) -> dict:
+    '''Deterministic toxicity verdict for {text}'''
+    toxic: bool = bool(_TOXIC_WORDS.search(text))
+    return {
+        'is_toxic': toxic,
+        'confidence': 0.9 if toxic else 0.05,
+        'categories': ['harassment'] if toxic else [],
+        'reason': 'Contains an insult.' if toxic else 'No toxic content found.',
+    }
+
+
+def _verdicts(prompt: str) -> dict:
+    '''Verdict for a single text, or {"results": [...]} for a packed request (JSON array of {id, text})'''
+    if prompt.startswith('['):
+        try:
+            items: Any = json.loads(prompt)
+            return {'results': [{'id': item['id'], **_verdict(str(item['text']))} for item in items]}
+        except (json.JSONDecodeError, TypeError, KeyError):
+            pass
+    return _verdict(prompt)
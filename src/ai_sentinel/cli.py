@@ -0,0 +1,128 @@
+# ai-sentinel command line: ai-sentinel scan ...
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from typing import Optional
+
+from ai_sentinel.scan.records import parse_shard
+
+# environment variables read when an option is not given
+_API_KEY_VARIABLES: dict[str, str] = {'openai': 'OPENAI_API_KEY', 'azure': 'AZURE_OPENAI_API_KEY', 'gemini': 'GEMINI_API_KEY'}
+
+
+def _shard(value: str) -> tuple[int, int]:
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _client(args: argparse.Namespace):
+    '''Build the judge client the arguments ask for (imports only that provider's SDK)'''
+    api_key: Optional[str] = args.api_key or os.environ.get(_API_KEY_VARIABLES[args.provider])
+    if args.provider == 'openai':
+        from ai_sentinel.llm.open_source_openai import OpenAIClient
+
+        if not args.base_url:
+            raise ValueError('--base-url is required with the openai provider')
+        return OpenAIClient(base_url=args.base_url, model=args.model, api_key=api_key or 'EMPTY', timeout=args.timeout)
+    if args.provider == 'azure':
+        from ai_sentinel.llm.azure_openai import AzureOpenAIClient
+
+        return AzureOpenAIClient(
+            api_key=api_key,
+            model=args.model,
+            api_version=args.api_version or os.environ.get('OPENAI_API_VERSION'),
+            azure_endpoint=args.base_url or os.environ.get('AZURE_OPENAI_ENDPOINT'),
+            timeout=args.timeout
+        )
+    from ai_sentinel.llm.gemini import GeminiClient
+
+    return GeminiClient(api_key=api_key, model=args.model, timeout=args.timeout)
+
+
+def _report(progress) -> None:
+    '''One progress line on stderr per checkpoint'''
+    print(
+        f'row {progress.row}: {progress.analyzed} analyzed, {progress.toxic} toxic, '
+        f'{progress.failed} failed, {progress.skipped} skipped' + (' (done)' if progress.done else ''),
+        file=sys.stderr
+    )
+
+
+async def _scan(args: argparse.Namespace) -> dict:
+    from ai_sentinel.guards.toxicity_guard import SQLiteVerdictStore, ToxicityGuard
+    from ai_sentinel.scan.pipeline import scan_async
+
+    client = _client(args)
+    try:
+        guard = ToxicityGuard(client, store=SQLiteVerdictStore(args.store) if args.store else None)
+        progress = await scan_async(
+            guard,
+            args.input,
+            args.output.replace('{shard}', str(args.shard[0])),
+            input_format=args.format,
+            text_field=args.text_field,
+            id_field=args.id_field,
+            shard=args.shard,
+            chunk_size=args.chunk_size,
+            max_concurrency=args.concurrency,
+            packed=args.packed,
+            resume=not args.restart,
+            on_progress=None if args.quiet else _report
+        )
+    finally:
+        await client.aclose()
+    return progress.model_dump(mode='json')
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='ai-sentinel', description='AI Sentinel toxicity detection')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser(
+        'scan',
+        help='analyze every record of a JSONL or CSV file',
+        description='Stream a JSONL or CSV file through ToxicityGuard, writing one JSON line per record. '
+                    'Progress is checkpointed next to the output; running the same command again resumes a killed scan. '
+                    'Records are analyzed chunk by chunk and every chunk finishes before the next one starts, so the '
+                    'calls in flight drop to zero at each chunk boundary; keep --chunk-size well above --concurrency.'
+    )
+    scan.add_argument('input', help='JSONL or CSV file to scan')
+    scan.add_argument('-o', '--output', required=True, help='JSONL file to write, "{shard}" is replaced by the shard index')
+    scan.add_argument('--format', choices=['jsonl', 'csv'], default=None, help='input format, inferred from the extension by default')
+    scan.add_argument('--text-field', default='text', help='field holding the text')
+    scan.add_argument('--id-field', default=None, help='field holding the record id, copied to the output and used as the shard key')
+    scan.add_argument('--shard', type=_shard, default=(0, 1), help='scan only shard "index/count" of the input, ex. 0/4')
+    scan.add_argument('--chunk-size', type=int, default=1000, help='records analyzed and checkpointed together; the next chunk waits for the slowest call of the '
+                      'previous one, so chunks much smaller than ~50x --concurrency leave calls idle')
+    scan.add_argument('--concurrency', type=int, default=8, help='most LLM calls in flight, within a chunk')
+    scan.add_argument('--packed', action='store_true', help='pack several texts into each LLM call')
+    scan.add_argument('--store', default=None, help='SQLite verdict store, shared by the shards, so repeated texts are judged once')
+    scan.add_argument('--restart', action='store_true', help='ignore an existing checkpoint and start over')
+    scan.add_argument('--quiet', action='store_true', help='no progress lines on stderr')
+    scan.add_argument('--provider', choices=list(_API_KEY_VARIABLES), default='openai', help='LLM provider of the judge')
+    scan.add_argument('--model', required=True, help='judge model (deployment name for azure)')
+    scan.add_argument('--base-url', default=None, help='server URL for openai, endpoint for azure (default $AZURE_OPENAI_ENDPOINT)')
+    scan.add_argument('--api-key', default=None, help='API key, read from the provider\'s usual environment variable by default')
+    scan.add_argument('--api-version', default=None, help='API version for azure (default $OPENAI_API_VERSION)')
+    scan.add_argument('--timeout', type=float, default=30.0, help='seconds before an LLM call times out')
+
+    args: argparse.Namespace = parser.parse_args(argv)
+    try:
+        report: dict = asyncio.run(_scan(args))
+    except Exception as e:
+        print(f'ai-sentinel: {type(e).__name__}: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('ai-sentinel: interrupted, run the same command again to resume', file=sys.stderr)
+        return 130
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
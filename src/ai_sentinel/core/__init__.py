@@ -1,2 +1,6 @@
 # init to show that core is a module
+from .metrics import LatencyHistogram, MetricsHook, MetricsRecorder
 from .models import LLMResponse
+from .runner import LoopRunner, get_runner, run_sync
+from .singleflight import SingleFlight
+from .tokens import estimate_tokens
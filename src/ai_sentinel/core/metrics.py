@@ -0,0 +1,143 @@
+# latency and counter aggregation
+import threading
+
+from collections import deque
+from typing import Optional
+
+
+class LatencyHistogram:
+    '''
+    Percentiles over the last {window} latency samples (milliseconds)
+
+    Samples go into a ring buffer; percentiles are read from a sorted copy that is rebuilt at most
+    once every {refresh} new samples, so asking for a percentile on every request stays cheap.
+    Thread-safe.
+    '''
+    def __init__(self, window: int = 1000, refresh: int = 16):
+        if window < 1 or refresh < 1:
+            raise ValueError('Window and refresh must be at least 1')
+        self.window = window
+        self.refresh = refresh
+        self.count: int = 0
+        self.total_ms: float = 0.0
+        self._samples: deque = deque(maxlen=window)
+        self._sorted: list[float] = []
+        self._stale: int = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency_ms: float) -> None:
+        '''Record one latency sample'''
+        with self._lock:
+            self._samples.append(latency_ms)
+            self.count += 1
+            self.total_ms += latency_ms
+            self._stale += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        '''Return the {percent}th percentile (0-100) of the recent samples, None without samples'''
+        if not 0.0 <= percent <= 100.0:
+            raise ValueError('Percent must be between 0.0 and 100.0')
+        with self._lock:
+            if self._stale >= self.refresh or len(self._sorted) != len(self._samples) and self._stale:
+                self._sorted = sorted(self._samples)
+                self._stale = 0
+            if not self._sorted:
+                return None
+            rank: int = min(len(self._sorted) - 1, int(round(percent / 100.0 * (len(self._sorted) - 1))))
+            return self._sorted[rank]
+
+    @property
+    def samples(self) -> int:
+        '''Number of samples in the window'''
+        return len(self._samples)
+
+    @property
+    def stats(self) -> dict:
+        '''Return the sample count, mean and the usual percentiles of the window'''
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+        }
+
+
+class MetricsHook:
+    '''
+    Receiver of the measurements a guard takes, pass one as {metrics} to ToxicityGuard
+
+    Subclass it and override the methods you need to forward the measurements to your metrics
+    system (ex. Prometheus, StatsD, OpenTelemetry); the base class ignores everything.
+    Stages (milliseconds): analyze (a whole analyze_async call) and, per judge call, prompt_build,
+    queue and backoff (when the client reports them), generation, json_parse and validation;
+    pack_parse for packed requests and time_to_verdict for streamed ones.
+    Counters: requests, prefilter_hits, cache_hits, triage_hits, llm_calls, errors, prompt_tokens,
+    completion_tokens and total_tokens.
+    Methods are called on the event loop, so they must not block.
+    '''
+    def observe(self, stage: str, duration_ms: float) -> None:
+        '''Record that {stage} took {duration_ms} milliseconds'''
+
+    def count(self, name: str, value: float = 1) -> None:
+        '''Add {value} to the counter {name}'''
+
+
+class MetricsRecorder(MetricsHook):
+    '''
+    Built-in hook that aggregates the measurements in memory
+
+    Every stage gets a LatencyHistogram over its last {window} samples and every counter a running
+    total. Read them with snapshot() or render them in the Prometheus text format with
+    prometheus() to serve from a scrape endpoint. Thread-safe.
+    '''
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.counters: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        histogram: Optional[LatencyHistogram] = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram(self.window))
+        histogram.observe(duration_ms)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        '''Return the stats of every stage histogram and the value of every counter'''
+        with self._lock:
+            histograms: dict[str, LatencyHistogram] = dict(self.histograms)
+            counters: dict[str, float] = dict(self.counters)
+        return {
+            'timings': {stage: histogram.stats for stage, histogram in sorted(histograms.items())},
+            'counters': dict(sorted(counters.items())),
+        }
+
+    def prometheus(self, prefix: str = 'ai_sentinel') -> str:
+        '''Render the snapshot in the Prometheus text exposition format'''
+        snapshot: dict = self.snapshot()
+        lines: list[str] = []
+        if snapshot['timings']:
+            name: str = f'{prefix}_stage_duration_ms'
+            lines.append(f'# TYPE {name} summary')
+            for stage, stats in snapshot['timings'].items():
+                for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+                    if stats[key] is not None:
+                        lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {stats[key]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {stats["mean_ms"] * stats["count"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        for counter, value in snapshot['counters'].items():
+            lines.append(f'# TYPE {prefix}_{counter}_total counter')
+            lines.append(f'{prefix}_{counter}_total {value}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def reset(self) -> None:
+        '''Drop every histogram and counter'''
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
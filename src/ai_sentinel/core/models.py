@@ -20,3 +20,7 @@ class LLMResponse(BaseModel):
         default=None,
         description='Time taken to generate response'
     )
+    timings: dict[str, float] = Field(
+        default_factory=dict,
+        description='Milliseconds spent per stage on the client side (prompt_build, queue, generation)'
+    )
@@ -0,0 +1,133 @@
+# persistent background event loop used by the sync wrappers
+import asyncio
+import atexit
+import os
+import threading
+
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class LoopRunner:
+    '''
+    Runs coroutines on a single event loop that lives in a daemon thread.
+
+    Sync callers from any thread submit work with run(); because the loop is never
+    recreated, async SDK clients (and their HTTP connections) bound to it are reused
+    across calls. It never touches the caller's loop, so it is safe inside Jupyter.
+    '''
+    def __init__(self, name: str = 'ai-sentinel-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        '''Return the runner's event loop, starting the background thread on first use'''
+        if self._loop is None or self._loop.is_closed():
+            with self._lock:
+                if self._loop is None or self._loop.is_closed():
+                    self._start()
+        return self._loop
+
+    def _start(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_forever():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=run_forever, name=self.name, daemon=True)
+        thread.start()
+        ready.wait()
+        self._loop = loop
+        self._thread = thread
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        '''Run {coro} on the background loop and block until it returns (or raises)'''
+        loop: asyncio.AbstractEventLoop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError('LoopRunner.run() cannot be called from inside its own event loop, await the coroutine instead')
+
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        '''Stop the background loop and wait for its thread to exit'''
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None or loop.is_closed():
+            return
+
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        if thread is not None and thread.is_alive():
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+        loop.close()
+
+
+_default_runner: Optional[LoopRunner] = None
+_default_runner_lock = threading.Lock()
+
+
+def get_runner() -> LoopRunner:
+    '''Return the process-wide LoopRunner shared by all sync wrappers'''
+    global _default_runner
+    if _default_runner is None:
+        with _default_runner_lock:
+            if _default_runner is None:
+                _default_runner = LoopRunner()
+    return _default_runner
+
+
+def run_sync(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    '''Run {coro} to completion on the shared background loop from sync code'''
+    return get_runner().run(coro, timeout)
+
+
+async def close_on_owner_loops(closers: list[tuple[asyncio.AbstractEventLoop, Any]]) -> None:
+    '''
+    Await every close coroutine function in {closers} on the event loop that owns the resource:
+    directly for the running loop, through run_coroutine_threadsafe for other running loops.
+    Resources of closed loops can't be closed cleanly anymore and are skipped.
+    '''
+    current: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    for loop, close in closers:
+        if loop is current:
+            await close()
+        elif loop.is_running() and not loop.is_closed():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close(), loop))
+
+
+def _close_default_runner() -> None:
+    if _default_runner is not None:
+        _default_runner.close()
+
+
+def _reset_after_fork() -> None:
+    # the loop thread does not survive fork(), so the child has to start its own
+    global _default_runner, _default_runner_lock
+    _default_runner = None
+    _default_runner_lock = threading.Lock()
+
+
+atexit.register(_close_default_runner)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,74 @@
+# collapse concurrent identical calls into a single one
+import asyncio
+import weakref
+
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    '''One in-flight call and the number of callers awaiting it'''
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters: int = 0
+
+
+class SingleFlight:
+    '''
+    Deduplicate concurrent async calls by key
+
+    The first caller for a key starts the call, every caller that arrives while it is still
+    running awaits the same task and gets the same result (or exception). A caller that is
+    cancelled only stops waiting; the shared call is cancelled once nobody is waiting for it.
+    Calls are tracked per event loop, since a task can only be awaited from its own loop.
+    '''
+    def __init__(self):
+        self._calls: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.leaders: int = 0
+        self.coalesced: int = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        '''Run {fn} for {key} unless an identical call is already in flight, then await its result'''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        calls: dict[Hashable, _Call] = self._calls.setdefault(loop, {})
+
+        call: Any = calls.get(key)
+        if call is None:
+            call = _Call(loop.create_task(fn()))
+            calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(calls, key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # last one waiting: drop the shared call so a new caller starts a fresh one
+                call.task.cancel()
+                self._forget(calls, key, call)
+            raise
+        finally:
+            call.waiters -= 1
+
+    @staticmethod
+    def _forget(calls: dict, key: Hashable, call: _Call) -> None:
+        if calls.get(key) is call:
+            del calls[key]
+
+    @property
+    def in_flight(self) -> int:
+        '''Number of shared calls currently running, across all event loops'''
+        return sum(len(calls) for calls in list(self._calls.values()))
+
+    @property
+    def stats(self) -> dict:
+        '''Return how many calls were started and how many were coalesced into them'''
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'in_flight': self.in_flight,
+        }
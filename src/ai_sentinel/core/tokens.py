@@ -0,0 +1,12 @@
+# cheap token estimates for budgeting, no tokenizer needed
+import math
+
+# rough average for English text across the BPE tokenizers used by the supported providers
+CHARS_PER_TOKEN: float = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    '''Estimate how many tokens {text} will cost (about 4 characters per token)'''
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -1,10 +1,51 @@
 # init to show that llm is a module
+import importlib
+
+from typing import Any
+
+from .cache import BaseVerdictCache, SQLiteVerdictStore, VerdictCache
 from .detector import ToxicityGuard
-from .models import ToxicityCategories, ToxicityResult, ToxicityScore
+from .hedging import HedgingPolicy
+from .models import (
+    ChunkedToxicityResult,
+    StreamedToxicityResult,
+    ToxicityCategories,
+    ToxicityResult,
+    ToxicityScore,
+    ToxicSpan,
+)
+from .prefilter import LexiconPrefilter, PrefilterDecision
+from .stream import GuardedStream, ToxicContentError
 
 __all__ = [
     'ToxicityGuard',
+    'BaseVerdictCache',
+    'VerdictCache',
+    'SQLiteVerdictStore',
+    'LexiconPrefilter',
+    'PrefilterDecision',
+    'HedgingPolicy',
+    'GuardedStream',
+    'ToxicContentError',
     'ToxicityCategories', 
     'ToxicityResult', 
-    'ToxicityScore'
-]
\ No newline at end of file
+    'ToxicityScore',
+    'ChunkedToxicityResult',
+    'StreamedToxicityResult',
+    'ToxicSpan'
+]
+
+# NumPy-backed names, imported on first access so the guard itself does not need NumPy
+# (left out of __all__ so that a star import does not load it either)
+_LAZY: dict[str, str] = {
+    'ToxicityBatch': '.columnar',
+    'TriageClassifier': '.triage',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value: Any = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
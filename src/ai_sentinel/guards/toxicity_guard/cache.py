@@ -0,0 +1,320 @@
+# verdict caching so repeated texts skip the LLM round trip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from ai_sentinel.guards.toxicity_guard.models import ToxicityResult
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    '''Normalize {text} for cache lookups (unicode NFKC, collapsed whitespace, stripped)'''
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+@lru_cache(maxsize=32)
+def prompt_digest(system_prompt: str) -> str:
+    '''Return a short stable hash of {system_prompt} so prompt changes invalidate cached verdicts'''
+    return hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def verdict_key(text: str, provider: str, model: str, system_prompt: str) -> str:
+    '''
+    Build the cache key for a verdict: the normalized text, the provider, the model and
+    a hash of the system prompt, so a model or prompt change never serves stale verdicts
+    '''
+    material: str = '\x1f'.join((provider, model, prompt_digest(system_prompt), normalize_text(text)))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class BaseVerdictCache(ABC):
+    '''
+    Abstract Base Class for verdict caches used by ToxicityGuard
+    '''
+    @abstractmethod
+    def get(self, key: str) -> Optional[ToxicityResult]:
+        '''Return the cached verdict for {key}, or None on a miss'''
+        pass
+
+    @abstractmethod
+    def set(self, key: str, result: ToxicityResult) -> None:
+        '''Store {result} under {key}'''
+        pass
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, ToxicityResult]:
+        '''Return the cached verdicts for {keys}, missing keys are left out'''
+        found: dict[str, ToxicityResult] = {}
+        for key in keys:
+            result: Optional[ToxicityResult] = self.get(key)
+            if result is not None:
+                found[key] = result
+        return found
+
+    def set_many(self, items: dict[str, ToxicityResult]) -> None:
+        '''Store every verdict in {items}'''
+        for key, result in items.items():
+            self.set(key, result)
+
+    @abstractmethod
+    def clear(self) -> None:
+        '''Remove every cached verdict'''
+        pass
+
+    @property
+    @abstractmethod
+    def stats(self) -> dict:
+        '''Return hit/miss/eviction counters'''
+        pass
+
+
+class VerdictCache(BaseVerdictCache):
+    '''
+    Thread-safe in-memory verdict cache with LRU eviction and an optional TTL
+
+    Parameters:
+    max_size (int): Maximum number of verdicts kept before the least recently used is evicted | default = 10000
+    ttl (Optional[float]): Seconds a verdict stays valid, None keeps it until evicted | default = None
+    '''
+    def __init__(self, max_size: int = 10_000, ttl: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError('Max size must be at least 1')
+        if ttl is not None and ttl <= 0:
+            raise ValueError('TTL must be positive')
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, ToxicityResult]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def get(self, key: str) -> Optional[ToxicityResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # hand out copies so callers can't mutate the cached verdict
+        return result.model_copy(deep=True)
+
+    def set(self, key: str, result: ToxicityResult) -> None:
+        expires_at: float = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        stored: ToxicityResult = result.model_copy(deep=True)
+        with self._lock:
+            self._entries[key] = (expires_at, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            lookups: int = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SQLiteVerdictStore(BaseVerdictCache):
+    '''
+    Persistent verdict store backed by SQLite, safe to share between threads and processes
+
+    The database runs in WAL mode so readers never block the single writer, and every
+    thread gets its own connection. Verdicts are stored as ToxicityResult JSON under the
+    same keys as VerdictCache.
+
+    Parameters:
+    path (str): Location of the database file, created if missing
+    max_entries (Optional[int]): Size limit, the oldest verdicts are compacted away past it | default = None
+    ttl (Optional[float]): Seconds a verdict stays valid, None keeps it until compacted | default = None
+    busy_timeout (float): Seconds to wait for a lock held by another process | default = 30.0
+    '''
+    _SQLITE_MAX_PARAMS: int = 500
+
+    def __init__(
+            self,
+            path: str,
+            max_entries: Optional[int] = None,
+            ttl: Optional[float] = None,
+            busy_timeout: float = 30.0
+        ):
+        if not path or not isinstance(path, str):
+            raise ValueError('Path must be a non-empty string')
+        if max_entries is not None and max_entries < 1:
+            raise ValueError('Max entries must be at least 1')
+        if ttl is not None and ttl <= 0:
+            raise ValueError('TTL must be positive')
+
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._writes_since_compact: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        directory: str = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection: sqlite3.Connection = self._connection()
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS verdicts ('
+                'key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS verdicts_created_at ON verdicts (created_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        '''Return this thread's connection, opening it on first use'''
+        connection: Optional[sqlite3.Connection] = getattr(self._local, 'connection', None)
+        # connections must not be carried across fork()
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _oldest_valid(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float('-inf')
+
+    def get(self, key: str) -> Optional[ToxicityResult]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, ToxicityResult]:
+        keys = list(dict.fromkeys(keys))
+        found: dict[str, ToxicityResult] = {}
+        connection: sqlite3.Connection = self._connection()
+        oldest: float = self._oldest_valid()
+        for start in range(0, len(keys), self._SQLITE_MAX_PARAMS):
+            chunk: list[str] = keys[start:start + self._SQLITE_MAX_PARAMS]
+            placeholders: str = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, result FROM verdicts WHERE key IN ({placeholders}) AND created_at >= ?',
+                (*chunk, oldest)
+            ).fetchall()
+            for key, payload in rows:
+                found[key] = ToxicityResult.model_validate_json(payload)
+
+        with self._counter_lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, result: ToxicityResult) -> None:
+        self.set_many({key: result})
+
+    def set_many(self, items: dict[str, ToxicityResult]) -> None:
+        if not items:
+            return
+        now: float = time.time()
+        rows: list[tuple] = [(key, result.model_dump_json(), now) for key, result in items.items()]
+        connection: sqlite3.Connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('INSERT OR REPLACE INTO verdicts (key, result, created_at) VALUES (?, ?, ?)', rows)
+
+        if self.max_entries is not None:
+            with self._counter_lock:
+                self._writes_since_compact += len(rows)
+                # compact once the table may have grown by 10% past the limit
+                should_compact: bool = self._writes_since_compact >= max(1, self.max_entries // 10)
+                if should_compact:
+                    self._writes_since_compact = 0
+            if should_compact:
+                self.compact()
+
+    def compact(self, max_entries: Optional[int] = None) -> int:
+        '''
+        Delete expired verdicts, then the oldest ones beyond {max_entries} (defaults to the store limit)
+        Return the number of verdicts removed
+        '''
+        limit: Optional[int] = max_entries if max_entries is not None else self.max_entries
+        connection: sqlite3.Connection = self._connection()
+        removed: int = 0
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            if self.ttl is not None:
+                removed += connection.execute('DELETE FROM verdicts WHERE created_at < ?', (self._oldest_valid(),)).rowcount
+            if limit is not None:
+                removed += connection.execute(
+                    'DELETE FROM verdicts WHERE key IN ('
+                    'SELECT key FROM verdicts ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+                    (limit,)
+                ).rowcount
+        with self._counter_lock:
+            self.evictions += removed
+        return removed
+
+    def vacuum(self) -> None:
+        '''Give the space freed by compaction back to the file system'''
+        self._connection().execute('VACUUM')
+
+    def clear(self) -> None:
+        connection: sqlite3.Connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM verdicts')
+
+    def close(self) -> None:
+        '''Close this thread's connection'''
+        connection: Optional[sqlite3.Connection] = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+    @property
+    def stats(self) -> dict:
+        with self._counter_lock:
+            lookups: int = self.hits + self.misses
+            counters: dict = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+        counters['size'] = len(self)
+        counters['max_entries'] = self.max_entries
+        return counters
@@ -0,0 +1,94 @@
+# helpers for judging long texts in overlapping windows
+import math
+import re
+
+from ai_sentinel.core.tokens import CHARS_PER_TOKEN
+from ai_sentinel.guards.toxicity_guard.models import (
+    ChunkedToxicityResult,
+    ToxicityCategories,
+    ToxicityResult,
+    ToxicSpan,
+)
+
+_WORD = re.compile(r'\S+')
+
+
+def split_windows(text: str, max_window_tokens: int, overlap_tokens: int) -> list[tuple[int, int]]:
+    '''
+    Split {text} into windows of about {max_window_tokens} tokens, each starting about
+    {overlap_tokens} tokens before the previous one ended so content on a boundary is seen whole.
+    Windows end on whitespace unless a single word is longer than a window.
+    Return (start, end) character offsets, in text order.
+    '''
+    if max_window_tokens < 1:
+        raise ValueError('Max window tokens must be at least 1')
+    if not 0 <= overlap_tokens < max_window_tokens:
+        raise ValueError('Overlap tokens must be at least 0 and smaller than max window tokens')
+
+    max_chars: int = math.floor(max_window_tokens * CHARS_PER_TOKEN)
+    overlap_chars: int = math.floor(overlap_tokens * CHARS_PER_TOKEN)
+    words: list[tuple[int, int]] = [match.span() for match in _WORD.finditer(text)]
+    if not words:
+        return [(0, len(text))] if text else []
+
+    windows: list[tuple[int, int]] = []
+    first: int = 0
+    while first < len(words):
+        start: int = words[first][0]
+        last: int = first
+        while last + 1 < len(words) and words[last + 1][1] - start <= max_chars:
+            last += 1
+        end: int = min(words[last][1], start + max_chars)
+        windows.append((start, end))
+        if end < words[last][1]:
+            # one word longer than a window: cut it, carrying the overlap into the next piece
+            words[last] = (max(end - overlap_chars, start + 1), words[last][1])
+            first = last
+            continue
+        if last + 1 >= len(words):
+            break
+        # restart at the first word inside the overlap, but always move forward
+        following: int = last + 1
+        while following - 1 > first and words[following - 1][0] >= end - overlap_chars:
+            following -= 1
+        first = following
+    return windows
+
+
+def merge_window_results(
+        windows: list[tuple[int, int]],
+        results: dict[int, ToxicityResult]
+    ) -> ChunkedToxicityResult:
+    '''
+    Merge the verdicts of the judged windows ({results} by window index) into one result:
+    toxic if any window is, the highest confidence, the union of categories and one span per
+    toxic window. The reason is the one of the most confident window.
+    '''
+    judged: list[int] = sorted(results)
+    toxic: list[int] = [idx for idx in judged if results[idx].is_toxic]
+    found: set[ToxicityCategories] = {category for idx in judged for category in results[idx].categories}
+    # the most confident verdict among the toxic windows (or among all windows if none is toxic)
+    lead: int = max(toxic or judged, key=lambda idx: results[idx].confidence)
+
+    reason: str = results[lead].reason
+    if len(windows) > 1:
+        reason = f'[window {lead + 1}/{len(windows)}] {reason}'
+
+    return ChunkedToxicityResult(
+        is_toxic=bool(toxic),
+        confidence=max(results[idx].confidence for idx in judged),
+        categories=[category for category in ToxicityCategories if category in found],
+        reason=reason,
+        spans=[
+            ToxicSpan(
+                start=windows[idx][0],
+                end=windows[idx][1],
+                confidence=results[idx].confidence,
+                categories=results[idx].categories,
+                reason=results[idx].reason
+            )
+            for idx in toxic
+        ],
+        windows=len(windows),
+        windows_analyzed=len(judged)
+    )
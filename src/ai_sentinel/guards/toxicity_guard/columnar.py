@@ -0,0 +1,275 @@
+# compact columnar container for the results of large batches
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+from ai_sentinel.guards.toxicity_guard.models import ToxicityCategories, ToxicityResult, ToxicityScore
+
+# bit i of the category mask is the i-th ToxicityCategories member
+CATEGORY_BITS: dict[ToxicityCategories, int] = {category: 1 << bit for bit, category in enumerate(ToxicityCategories)}
+SCORE_CODES: dict[ToxicityScore, int] = {score: code for code, score in enumerate(ToxicityScore)}
+# score code of a row whose text failed (its exception is kept in ToxicityBatch.errors)
+NO_SCORE: int = 255
+
+_SCORES: list[ToxicityScore] = list(ToxicityScore)
+_CATEGORIES: list[ToxicityCategories] = list(ToxicityCategories)
+
+
+class ToxicityBatch:
+    '''
+    Results of a batch held as NumPy columns instead of one ToxicityResult object per text
+
+    One row per analyzed text: is_toxic (bool), confidence (float32), categories (uint8 bitmask,
+    see CATEGORY_BITS), score (uint8, see SCORE_CODES) and index, the row's position in the
+    original input, kept through filtering. Reasons are optional and stored apart, they are the
+    bulk of a result's memory. Rows whose text failed have score NO_SCORE, confidence NaN and
+    their exception in {errors}.
+
+    Indexing a row materializes it back into a ToxicityResult (or returns its exception), so a
+    ToxicityBatch can stand in for the list the batch APIs return; assigning a row stores a result
+    into the columns, which is how the batch APIs fill a batch allocated with empty().
+
+    Parameters:
+    is_toxic (np.ndarray): bool column
+    confidence (np.ndarray): float32 column
+    categories (np.ndarray): uint8 category bitmask column
+    score (np.ndarray): uint8 score code column
+    index (Optional[np.ndarray]): Position of every row in the original input, defaults to 0..n-1 | default = None
+    reasons (Optional[list[str]]): Reason of every row, None when reasons are not kept | default = None
+    errors (Optional[dict[int, Exception]]): Exception of every failed row, by row | default = None
+    '''
+    def __init__(
+            self,
+            is_toxic: np.ndarray,
+            confidence: np.ndarray,
+            categories: np.ndarray,
+            score: np.ndarray,
+            index: Optional[np.ndarray] = None,
+            reasons: Optional[list[str]] = None,
+            errors: Optional[dict[int, Exception]] = None
+        ):
+        size: int = len(is_toxic)
+        if index is None:
+            index = np.arange(size, dtype=np.int64)
+        if not len(confidence) == len(categories) == len(score) == len(index) == size:
+            raise ValueError('All columns must have the same length')
+        if reasons is not None and len(reasons) != size:
+            raise ValueError('Reasons must have one entry per row')
+
+        self.is_toxic: np.ndarray = np.asarray(is_toxic, dtype=np.bool_)
+        self.confidence: np.ndarray = np.asarray(confidence, dtype=np.float32)
+        self.categories: np.ndarray = np.asarray(categories, dtype=np.uint8)
+        self.score: np.ndarray = np.asarray(score, dtype=np.uint8)
+        self.index: np.ndarray = np.asarray(index, dtype=np.int64)
+        self.reasons: Optional[list[str]] = reasons
+        self.errors: dict[int, Exception] = errors or {}
+
+    @classmethod
+    def empty(cls, size: int, keep_reasons: bool = True) -> 'ToxicityBatch':
+        '''Allocate a batch of {size} rows, all failed until they are assigned (batch[row] = result)'''
+        return cls(
+            np.zeros(size, dtype=np.bool_),
+            np.full(size, np.nan, dtype=np.float32),
+            np.zeros(size, dtype=np.uint8),
+            np.full(size, NO_SCORE, dtype=np.uint8),
+            reasons=[''] * size if keep_reasons else None
+        )
+
+    @classmethod
+    def from_results(cls, results: Iterable[ToxicityResult | Exception], keep_reasons: bool = True) -> 'ToxicityBatch':
+        '''Build a batch from {results} as returned by the batch APIs (ToxicityResult or exception per text)'''
+        results = list(results)
+        batch: ToxicityBatch = cls.empty(len(results), keep_reasons)
+        for row, result in enumerate(results):
+            batch[row] = result
+        return batch
+
+    @classmethod
+    def concatenate(cls, batches: Iterable['ToxicityBatch']) -> 'ToxicityBatch':
+        '''Join {batches} into one, keeping their rows' index values (reasons only if every batch has them)'''
+        batches = list(batches)
+        if not batches:
+            return cls.from_results([])
+        keep_reasons: bool = all(batch.reasons is not None for batch in batches)
+        errors: dict[int, Exception] = {}
+        offset: int = 0
+        for batch in batches:
+            errors.update({offset + row: error for row, error in batch.errors.items()})
+            offset += len(batch)
+        return cls(
+            np.concatenate([batch.is_toxic for batch in batches]),
+            np.concatenate([batch.confidence for batch in batches]),
+            np.concatenate([batch.categories for batch in batches]),
+            np.concatenate([batch.score for batch in batches]),
+            index=np.concatenate([batch.index for batch in batches]),
+            reasons=[reason for batch in batches for reason in batch.reasons] if keep_reasons else None,
+            errors=errors
+        )
+
+    def __len__(self) -> int:
+        return len(self.is_toxic)
+
+    def __getitem__(self, row: int) -> ToxicityResult | Exception:
+        '''Materialize row {row} into a ToxicityResult, or return the exception of a failed row'''
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('Row out of range')
+        if row in self.errors:
+            return self.errors[row]
+        mask: int = int(self.categories[row])
+        result = ToxicityResult(
+            is_toxic=bool(self.is_toxic[row]),
+            # undo the float32 rounding (0.3 would come back as 0.30000001)
+            confidence=round(float(self.confidence[row]), 6),
+            categories=[category for category in _CATEGORIES if mask & CATEGORY_BITS[category]],
+            reason=self.reasons[row] if self.reasons is not None else ''
+        )
+        # the stored score, not one recomputed from the rounded confidence
+        result.score = _SCORES[self.score[row]]
+        return result
+
+    def __setitem__(self, row: int, result: ToxicityResult | Exception) -> None:
+        '''Store {result} (or the exception of a failed text) in row {row}'''
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('Row out of range')
+        if isinstance(result, BaseException):
+            self.errors[row] = result
+            self.is_toxic[row] = False
+            self.confidence[row] = np.nan
+            self.categories[row] = 0
+            self.score[row] = NO_SCORE
+            if self.reasons is not None:
+                self.reasons[row] = ''
+            return
+
+        self.errors.pop(row, None)
+        mask: int = 0
+        for category in result.categories:
+            mask |= CATEGORY_BITS[category]
+        self.is_toxic[row] = result.is_toxic
+        self.confidence[row] = result.confidence
+        self.categories[row] = mask
+        self.score[row] = SCORE_CODES[result.score] if result.score is not None else NO_SCORE
+        if self.reasons is not None:
+            self.reasons[row] = result.reason
+
+    def __iter__(self) -> Iterator[ToxicityResult | Exception]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_results(self) -> list[ToxicityResult | Exception]:
+        '''Materialize every row, like the list the batch APIs return without as_columnar'''
+        return list(self)
+
+    @property
+    def failed(self) -> np.ndarray:
+        '''bool mask of the rows whose text failed'''
+        return self.score == NO_SCORE
+
+    def has_category(self, *categories: ToxicityCategories) -> np.ndarray:
+        '''bool mask of the rows flagged with any of {categories}'''
+        bits: int = 0
+        for category in categories:
+            bits |= CATEGORY_BITS[ToxicityCategories(category)]
+        return (self.categories & bits) != 0
+
+    def where(
+            self,
+            toxic: Optional[bool] = None,
+            min_confidence: Optional[float] = None,
+            categories: Optional[Iterable[ToxicityCategories]] = None,
+            score: Optional[ToxicityScore] = None
+        ) -> np.ndarray:
+        '''bool mask of the (successful) rows matching every condition given'''
+        mask: np.ndarray = ~self.failed
+        if toxic is not None:
+            mask &= self.is_toxic == toxic
+        if min_confidence is not None:
+            mask &= self.confidence >= min_confidence
+        if categories is not None:
+            mask &= self.has_category(*categories)
+        if score is not None:
+            mask &= self.score == SCORE_CODES[ToxicityScore(score)]
+        return mask
+
+    def filter(self, selection: np.ndarray) -> 'ToxicityBatch':
+        '''Return the rows picked by {selection} (bool mask or row numbers) as a new batch'''
+        rows: np.ndarray = np.asarray(selection)
+        if rows.dtype == np.bool_:
+            if len(rows) != len(self):
+                raise ValueError('Mask must have one entry per row')
+            rows = np.flatnonzero(rows)
+        rows = rows.astype(np.int64, copy=False)
+        errors: dict[int, Exception] = {}
+        if self.errors:
+            for position, row in enumerate(rows.tolist()):
+                if row in self.errors:
+                    errors[position] = self.errors[row]
+        return ToxicityBatch(
+            self.is_toxic[rows],
+            self.confidence[rows],
+            self.categories[rows],
+            self.score[rows],
+            index=self.index[rows],
+            reasons=[self.reasons[row] for row in rows.tolist()] if self.reasons is not None else None,
+            errors=errors
+        )
+
+    def drop_reasons(self) -> 'ToxicityBatch':
+        '''Free the reasons, keeping only the columns'''
+        self.reasons = None
+        return self
+
+    def category_counts(self) -> dict[ToxicityCategories, int]:
+        '''Number of rows flagged with each category'''
+        return {category: int(np.count_nonzero(self.categories & bit)) for category, bit in CATEGORY_BITS.items()}
+
+    def summary(self) -> dict:
+        '''Aggregate the batch: row, failure and toxic counts, mean confidence, counts per category and score'''
+        ok: np.ndarray = ~self.failed
+        analyzed: int = int(np.count_nonzero(ok))
+        toxic: int = int(np.count_nonzero(self.is_toxic & ok))
+        score_counts: np.ndarray = np.bincount(self.score[ok], minlength=len(_SCORES))
+        return {
+            'rows': len(self),
+            'failed': len(self) - analyzed,
+            'toxic': toxic,
+            'toxic_rate': toxic / analyzed if analyzed else 0.0,
+            'mean_confidence': float(self.confidence[ok].mean()) if analyzed else None,
+            'categories': {category.value: count for category, count in self.category_counts().items()},
+            'scores': {score.value: int(score_counts[code]) for score, code in SCORE_CODES.items()},
+        }
+
+    def to_numpy(self) -> dict[str, np.ndarray]:
+        '''Return the columns by name, without copying'''
+        return {
+            'index': self.index,
+            'is_toxic': self.is_toxic,
+            'confidence': self.confidence,
+            'categories': self.categories,
+            'score': self.score,
+        }
+
+    def to_arrow(self) -> Any:
+        '''
+        Return the batch as a pyarrow.Table (needs the 'pyarrow' package)
+        Numeric columns share memory with the NumPy arrays; is_toxic is bit-packed by Arrow and the
+        reasons (when kept) are copied into a string column.
+        '''
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Arrow export needs the 'pyarrow' package (pip install pyarrow)") from e
+
+        columns: dict[str, Any] = {name: pa.array(column) for name, column in self.to_numpy().items()}
+        if self.reasons is not None:
+            columns['reason'] = pa.array(self.reasons, type=pa.string())
+        return pa.table(columns)
+
+    def __repr__(self) -> str:
+        return f'ToxicityBatch(rows={len(self)}, failed={len(self.errors)}, reasons={self.reasons is not None})'
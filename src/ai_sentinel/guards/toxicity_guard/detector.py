@@ -1,52 +1,628 @@
 # where all the stuff will happen
+import asyncio
 import json
+import time
+
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Literal, Optional
+
+from pydantic import BaseModel, ValidationError
 
 from ai_sentinel.llm.base import BaseLLMClient
+from ai_sentinel.core.metrics import MetricsHook
 from ai_sentinel.core.models import LLMResponse
-from ai_sentinel.guards.toxicity_guard.models import ToxicityResult
-from ai_sentinel.guards.toxicity_guard.prompts import SYSTEM_PROMPT
+from ai_sentinel.core.runner import run_sync
+from ai_sentinel.core.singleflight import SingleFlight
+from ai_sentinel.guards.toxicity_guard.cache import BaseVerdictCache, verdict_key
+from ai_sentinel.guards.toxicity_guard.chunking import merge_window_results, split_windows
+from ai_sentinel.guards.toxicity_guard.hedging import HedgingPolicy
+from ai_sentinel.guards.toxicity_guard.models import (
+    ChunkedToxicityResult,
+    PackedToxicityResults,
+    StreamedToxicityResult,
+    ToxicityResult,
+    ToxicityScore,
+)
+from ai_sentinel.guards.toxicity_guard.prefilter import LexiconPrefilter, PrefilterDecision
+from ai_sentinel.guards.toxicity_guard.partial_json import StreamingJSONObject
+from ai_sentinel.guards.toxicity_guard.packing import build_packs, render_pack, split_pack_response
+from ai_sentinel.guards.toxicity_guard.prompts import PACKED_SYSTEM_PROMPT, SYSTEM_PROMPT
+from ai_sentinel.guards.toxicity_guard.stream import GuardedStream
+
+if TYPE_CHECKING:
+    # imported for annotations only, so the guard does not pull in NumPy unless triage or columnar results are used
+    from ai_sentinel.guards.toxicity_guard.columnar import ToxicityBatch
+    from ai_sentinel.guards.toxicity_guard.triage import TriageClassifier
+
+
+class _StopWindows(Exception):
+    '''Raised inside a window worker to stop the remaining windows of a long text'''
 
 
 class ToxicityGuard:
-    '''Toxicity Guard implementation for input'''
-    def __init__(self, llm_client: BaseLLMClient):
-        self.llm_client: BaseLLMClient = llm_client 
+    '''
+    Toxicity Guard implementation for input
+
+    Parameters:
+    llm_client (BaseLLMClient): Client used as the judge
+    cache (Optional[BaseVerdictCache]): Verdict cache checked before calling the LLM (ex. VerdictCache) | default = None
+    store (Optional[BaseVerdictCache]): Persistent verdict store checked after the cache (ex. SQLiteVerdictStore) | default = None
+    coalesce (bool): Share one LLM call between concurrent requests for the same text | default = False
+    prefilter (Optional[LexiconPrefilter]): Lexicon stage that may answer a text before any cache or LLM call | default = None
+    triage (Optional[TriageClassifier]): Local classifier consulted after the cache, the LLM only sees the texts it is unsure about | default = None
+    hedging (Optional[HedgingPolicy]): Duplicate judge calls that run past a latency percentile and keep the first answer | default = None
+    metrics (Optional[MetricsHook]): Receives per-stage timings and counters (ex. MetricsRecorder) | default = None
+    '''
+    def __init__(
+            self,
+            llm_client: BaseLLMClient,
+            cache: Optional[BaseVerdictCache] = None,
+            store: Optional[BaseVerdictCache] = None,
+            coalesce: bool = False,
+            prefilter: Optional[LexiconPrefilter] = None,
+            triage: Optional['TriageClassifier'] = None,
+            hedging: Optional[HedgingPolicy] = None,
+            metrics: Optional[MetricsHook] = None
+        ):
+        self.llm_client: BaseLLMClient = llm_client
         self.system_prompt: str = SYSTEM_PROMPT
+        self.packed_system_prompt: str = PACKED_SYSTEM_PROMPT
+        self.cache: Optional[BaseVerdictCache] = cache
+        self.store: Optional[BaseVerdictCache] = store
+        self.coalesce: bool = coalesce
+        self.singleflight: SingleFlight = SingleFlight()
+        self.prefilter: Optional[LexiconPrefilter] = prefilter
+        self.triage: Optional['TriageClassifier'] = triage
+        self.hedging: Optional[HedgingPolicy] = hedging
+        self.metrics: Optional[MetricsHook] = metrics
 
-    async def analyze_async(self, text: str) -> ToxicityResult: 
+    async def analyze_async(self, text: str) -> ToxicityResult:
         '''
         Analyze the toxicity in the user input using LLM-as-a-judge (async)
         Return the finished evaluation as a ToxicityResult object
         '''
-        response: LLMResponse = await self.llm_client.generate_text_async(text, self.system_prompt, **self._structure_output())
-        toxicity_response: dict = json.loads(response.content)
+        started_at: float = time.perf_counter()
+        self._count('requests')
+        key, result = await self._answer_locally_async(text)
+        if result is None:
+            result = await self._resolve_async(text, key)
 
-        result = ToxicityResult(**toxicity_response)
+        self._observe('analyze', (time.perf_counter() - started_at) * 1000)
         return result
 
-    def analyze(self, text: str) -> ToxicityResult: 
+    def analyze(self, text: str) -> ToxicityResult:
         '''
         Analyze the toxicness in the user input using LLM-as-a-judge (sync wrapper)
         Return the finished evaluation as a ToxicityResult object
         '''
-        response: LLMResponse = self.llm_client.generate_text(text, self.system_prompt, **self._structure_output())
+        return run_sync(self.analyze_async(text))
+
+    async def analyze_streaming_async(
+            self,
+            text: str,
+            reason: Literal['background', 'skip'] = 'background'
+        ) -> StreamedToxicityResult:
+        '''
+        Analyze the toxicity in the user input with a streamed judge response (async)
+        Return as soon as is_toxic, confidence and categories have been generated, without waiting
+        for the reason. With {reason} 'background' the response keeps streaming in a background task
+        that fills in result.reason (await result.wait_for_reason()) and then caches the verdict;
+        with 'skip' the stream is closed right away, the reason is left empty and nothing is cached.
+        Verdicts from the prefilter, cache or triage classifier are returned complete.
+        '''
+        if reason not in ('background', 'skip'):
+            raise ValueError("Reason must be 'background' or 'skip'")
+
+        self._count('requests')
+        key, result = await self._answer_locally_async(text)
+        if result is None:
+            return await self._judge_streaming_async(text, key, reason)
+        return StreamedToxicityResult(**result.model_dump(exclude={'score'}))
+
+    def analyze_streaming(
+            self,
+            text: str,
+            reason: Literal['background', 'skip'] = 'background'
+        ) -> StreamedToxicityResult:
+        '''
+        Analyze the toxicity in the user input with a streamed judge response (sync wrapper)
+        A reason streamed in the background is filled into the returned result once it arrives.
+        '''
+        return run_sync(self.analyze_streaming_async(text, reason))
+
+    async def analyze_many_async(
+            self,
+            texts: Iterable[str],
+            max_concurrency: int = 8,
+            return_exceptions: bool = True,
+            as_columnar: bool = False
+        ) -> 'list[ToxicityResult | Exception] | ToxicityBatch':
+        '''
+        Analyze many texts concurrently, with at most {max_concurrency} LLM calls in flight (async)
+        Return one entry per text, in input order. When {return_exceptions} is True a failing text
+        (bad JSON, invalid ToxicityResult, provider error, ...) gets its exception in place of a
+        result instead of failing the whole batch. With {as_columnar} the results come back as a
+        ToxicityBatch of NumPy columns (needs NumPy).
+        '''
+        if max_concurrency < 1:
+            raise ValueError('Max concurrency must be at least 1')
+
+        results, keys, todo = await self._prepare_batch(texts)
+        output = self._batch_output(results, as_columnar)
+
+        async def judge(item: tuple[int, str]):
+            idx, text = item
+            try:
+                output[idx] = await self._resolve_async(text, keys[idx])
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                output[idx] = e
+
+        await self._run_workers(todo, judge, max_concurrency)
+        return output
+
+    def analyze_batch(
+            self,
+            texts: Iterable[str],
+            max_concurrency: int = 8,
+            return_exceptions: bool = True,
+            as_columnar: bool = False
+        ) -> 'list[ToxicityResult | Exception] | ToxicityBatch':
+        '''
+        Analyze many texts concurrently (sync wrapper around analyze_many_async)
+        Return one entry per text, in input order
+        '''
+        return run_sync(self.analyze_many_async(texts, max_concurrency, return_exceptions, as_columnar))
+
+    async def analyze_packed_async(
+            self,
+            texts: Iterable[str],
+            max_pack_tokens: int = 2000,
+            max_pack_size: int = 32,
+            max_concurrency: int = 8,
+            return_exceptions: bool = True,
+            as_columnar: bool = False
+        ) -> 'list[ToxicityResult | Exception] | ToxicityBatch':
+        '''
+        Analyze many (short) texts by packing several of them into each LLM request (async)
+        The system prompt is sent once per pack instead of once per text. Packs hold at most
+        {max_pack_size} texts and about {max_pack_tokens} tokens of text; texts whose verdict is
+        missing or malformed in the packed answer are retried on their own.
+        Return one entry per text, in input order (or a ToxicityBatch with {as_columnar}), like analyze_many_async.
+        '''
+        if max_concurrency < 1:
+            raise ValueError('Max concurrency must be at least 1')
+        if max_pack_size < 1 or max_pack_tokens < 1:
+            raise ValueError('Max pack size and max pack tokens must be at least 1')
+
+        results, keys, todo = await self._prepare_batch(texts)
+        output = self._batch_output(results, as_columnar)
+
+        async def judge_pack(pack: list[tuple[int, str]]):
+            verdicts: dict[int, ToxicityResult] = {}
+            if len(pack) > 1:
+                try:
+                    verdicts = await self._judge_pack_async([text for _, text in pack])
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    for idx, _ in pack:
+                        output[idx] = e
+                    return
+
+            fresh: dict[str, ToxicityResult] = {}
+            retries: list[tuple[int, str]] = []
+            for position, (idx, text) in enumerate(pack):
+                if position in verdicts:
+                    output[idx] = verdicts[position]
+                    if keys[idx] is not None:
+                        fresh[keys[idx]] = verdicts[position]
+                else:
+                    retries.append((idx, text))
+            if fresh and self._caching:
+                await self._remember_async(fresh)
+
+            retried = await asyncio.gather(
+                *[self._resolve_async(text, keys[idx]) for idx, text in retries],
+                return_exceptions=True
+            )
+            for (idx, _), outcome in zip(retries, retried):
+                if isinstance(outcome, BaseException) and not return_exceptions:
+                    raise outcome
+                output[idx] = outcome
+
+        packs: list[list[tuple[int, str]]] = build_packs(todo, max_pack_tokens, max_pack_size)
+        await self._run_workers(packs, judge_pack, max_concurrency)
+        return output
+
+    def analyze_packed(
+            self,
+            texts: Iterable[str],
+            max_pack_tokens: int = 2000,
+            max_pack_size: int = 32,
+            max_concurrency: int = 8,
+            return_exceptions: bool = True,
+            as_columnar: bool = False
+        ) -> 'list[ToxicityResult | Exception] | ToxicityBatch':
+        '''
+        Analyze many (short) texts several per LLM request (sync wrapper around analyze_packed_async)
+        Return one entry per text, in input order
+        '''
+        return run_sync(self.analyze_packed_async(texts, max_pack_tokens, max_pack_size, max_concurrency, return_exceptions, as_columnar))
+
+    async def analyze_long_async(
+            self,
+            text: str,
+            max_window_tokens: int = 1000,
+            overlap_tokens: int = 100,
+            max_concurrency: int = 8,
+            stop_on_high: bool = True
+        ) -> ChunkedToxicityResult:
+        '''
+        Analyze a long text (thread, transcript, document) in overlapping windows judged concurrently (async)
+        Each window holds about {max_window_tokens} tokens and overlaps the previous one by about
+        {overlap_tokens}, and goes through the same prefilter/cache/triage steps as analyze_async.
+        With {stop_on_high} the windows still pending are cancelled as soon as one window scores HIGH.
+        Return one ChunkedToxicityResult merging the judged windows, with the toxic windows as spans.
+        '''
+        if max_concurrency < 1:
+            raise ValueError('Max concurrency must be at least 1')
+
+        windows: list[tuple[int, int]] = split_windows(text, max_window_tokens, overlap_tokens) or [(0, 0)]
+        results: dict[int, ToxicityResult] = {}
+
+        async def judge(idx: int):
+            start, end = windows[idx]
+            results[idx] = await self.analyze_async(text[start:end])
+            if stop_on_high and results[idx].score == ToxicityScore.HIGH:
+                raise _StopWindows()
+
+        try:
+            await self._run_workers(list(range(len(windows))), judge, max_concurrency)
+        except _StopWindows:
+            pass
+        return merge_window_results(windows, results)
+
+    def analyze_long(
+            self,
+            text: str,
+            max_window_tokens: int = 1000,
+            overlap_tokens: int = 100,
+            max_concurrency: int = 8,
+            stop_on_high: bool = True
+        ) -> ChunkedToxicityResult:
+        '''
+        Analyze a long text in overlapping windows (sync wrapper around analyze_long_async)
+        Return one ChunkedToxicityResult
+        '''
+        return run_sync(self.analyze_long_async(text, max_window_tokens, overlap_tokens, max_concurrency, stop_on_high))
+
+    def guard_stream(self, chunks: AsyncIterable[str], **kwargs) -> GuardedStream:
+        '''
+        Guard a stream of text chunks (ex. an LLM generation) while it is being produced
+        Return a GuardedStream relaying {chunks} that raises ToxicContentError as soon as part of
+        the text is judged toxic. Keyword arguments are passed on to GuardedStream (boundary,
+        release, on_toxic, ...).
+        '''
+        return GuardedStream(self, chunks, **kwargs)
+
+    async def _answer_locally_async(self, text: str) -> tuple[Optional[str], Optional[ToxicityResult]]:
+        '''
+        Try to answer {text} without the LLM: prefilter, then cache/store, then triage classifier
+        Return (key, result) where key is the cache key (when caching or coalescing) and result is
+        None if the LLM has to judge the text.
+        '''
+        if self.prefilter is not None:
+            decision: PrefilterDecision = self.prefilter.check(text)
+            if decision.result is not None:
+                self._count('prefilter_hits')
+                return None, decision.result
+
+        key: Optional[str] = None
+        if self._caching or self.coalesce:
+            key = self._cache_key(text)
+        if self._caching:
+            cached: Optional[ToxicityResult] = await self._lookup_async(key)
+            if cached is not None:
+                self._count('cache_hits')
+                return key, cached
+
+        if self.triage is not None:
+            triaged: Optional[ToxicityResult] = self.triage.triage(text)
+            if triaged is not None:
+                self._count('triage_hits')
+                return key, triaged
+        return key, None
+
+    async def _prepare_batch(
+            self,
+            texts: Iterable[str]
+        ) -> tuple[list, list[Optional[str]], list[tuple[int, str]]]:
+        '''
+        Set up a batch: one result slot and one key per text, filled in by the prefilter, then from
+        the cache/store with a single bulk lookup and then by the triage classifier in one vectorized
+        pass. Return (results, keys, todo) where todo lists the (index, text) pairs that still need the LLM.
+        '''
+        pending: list[str] = list(texts)
+        results: list[ToxicityResult | Exception | None] = [None] * len(pending)
+        todo: list[tuple[int, str]] = list(enumerate(pending))
+        self._count('requests', len(pending))
+
+        if self.prefilter is not None:
+            for idx, decision in enumerate(self.prefilter.check_many(pending)):
+                results[idx] = decision.result
+            todo = [(idx, text) for idx, text in todo if results[idx] is None]
+            self._count('prefilter_hits', len(pending) - len(todo))
+        keys: list[Optional[str]] = [None] * len(pending)
+        if self._caching or self.coalesce:
+            keys = [self._cache_key(text) for text in pending]
+
+        # answer what we can with one bulk lookup, only the misses go to the LLM
+        if self._caching and todo:
+            found: dict[str, ToxicityResult] = await self._lookup_many_async([keys[idx] for idx, _ in todo])
+            for idx, _ in todo:
+                if keys[idx] in found:
+                    results[idx] = found[keys[idx]].model_copy(deep=True)
+            todo = [(idx, text) for idx, text in todo if keys[idx] not in found]
+            self._count('cache_hits', len(found))
+
+        if self.triage is not None and todo:
+            for (idx, _), triaged in zip(todo, self.triage.triage_many([text for _, text in todo])):
+                results[idx] = triaged
+            undecided: int = len(todo)
+            todo = [(idx, text) for idx, text in todo if results[idx] is None]
+            self._count('triage_hits', undecided - len(todo))
+        return results, keys, todo
+
+    @staticmethod
+    def _batch_output(results: list[ToxicityResult | Exception | None], as_columnar: bool) -> 'list[ToxicityResult | Exception | None] | ToxicityBatch':
+        '''
+        Return what the LLM verdicts of a batch are stored into (output[idx] = verdict): {results} itself,
+        or with {as_columnar} a ToxicityBatch holding the rows already answered, so verdicts go straight
+        into its columns and no ToxicityResult is kept per row
+        '''
+        if not as_columnar:
+            return results
+        from ai_sentinel.guards.toxicity_guard.columnar import ToxicityBatch
+
+        batch: ToxicityBatch = ToxicityBatch.empty(len(results))
+        for idx, result in enumerate(results):
+            if result is not None:
+                batch[idx] = result
+                results[idx] = None
+        return batch
+
+    @staticmethod
+    async def _run_workers(items: list, handle: Callable[[Any], Awaitable[None]], max_concurrency: int) -> None:
+        '''Call {handle} on every item with at most {max_concurrency} running at once'''
+        queue = iter(items)
+
+        async def worker():
+            # each worker pulls the next item off the shared iterator
+            for item in queue:
+                await handle(item)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(max_concurrency, len(items)))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+    async def _judge_pack_async(self, texts: list[str]) -> dict[int, ToxicityResult]:
+        '''Judge {texts} in one request, return the verdicts that came back well-formed by position'''
+        started_at: float = time.perf_counter()
+        prompt: str = render_pack(texts)
+        self._observe('prompt_build', (time.perf_counter() - started_at) * 1000)
+        try:
+            response: LLMResponse = await self._generate_async(prompt, self.packed_system_prompt, PackedToxicityResults)
+        except Exception:
+            self._count('errors')
+            raise
+        self._record_response(response)
+
+        # parsing and validating the packed answer happen entry by entry, they are timed together
+        started_at = time.perf_counter()
+        verdicts: dict[int, ToxicityResult] = split_pack_response(response.content, len(texts))
+        self._observe('pack_parse', (time.perf_counter() - started_at) * 1000)
+        return verdicts
+
+    async def _resolve_async(self, text: str, key: Optional[str] = None) -> ToxicityResult:
+        '''Judge {text}, joining an identical in-flight call instead when coalescing'''
+        if not self.coalesce:
+            return await self._judge_async(text, key)
+
+        result: ToxicityResult = await self.singleflight.do(key, lambda: self._judge_async(text, key))
+        # every caller gets its own copy of the shared verdict
+        return result.model_copy(deep=True)
+
+    async def _judge_async(self, text: str, key: Optional[str] = None) -> ToxicityResult:
+        '''Ask the LLM judge about {text}, remembering the verdict under {key} when caching'''
+        try:
+            response: LLMResponse = await self._generate_async(text, self.system_prompt)
+            self._record_response(response)
+            result: ToxicityResult = self._parse_response(response)
+        except Exception:
+            self._count('errors')
+            raise
+
+        if key is not None and self._caching:
+            await self._remember_async({key: result})
+        return result
+
+    async def _generate_async(
+            self,
+            prompt: str,
+            system_prompt: str,
+            schema: type[BaseModel] = ToxicityResult
+        ) -> LLMResponse:
+        '''Send one judge request for structured output of {schema}, hedged when a hedging policy is set'''
+        if self.hedging is None:
+            return await self.llm_client.generate_text_async(prompt, system_prompt, **self._structure_output(schema))
+        return await self.hedging.run(
+            self.llm_client,
+            lambda client: client.generate_text_async(prompt, system_prompt, **self._structure_output(schema, client))
+        )
+
+    async def _judge_streaming_async(
+            self,
+            text: str,
+            key: Optional[str],
+            reason: Literal['background', 'skip']
+        ) -> StreamedToxicityResult:
+        '''Ask the LLM judge about {text} over a streamed response, stopping once the verdict fields are in'''
+        started_at: float = time.perf_counter()
+        self._count('llm_calls')
+        stream: AsyncIterator[str] = aiter(
+            self.llm_client.stream_text_async(text, self.system_prompt, **self._structure_output())
+        )
+        parser = StreamingJSONObject()
+        result: Optional[StreamedToxicityResult] = None
+        try:
+            async for chunk in stream:
+                parser.feed(chunk)
+                if parser.has('is_toxic', 'confidence', 'categories'):
+                    result = self._early_result(parser)
+                    if result is not None:
+                        break
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self._count('errors')
+            await stream.aclose()
+            raise
+        self._observe('time_to_verdict', (time.perf_counter() - started_at) * 1000)
+
+        if result is None:
+            # the stream ended first (or the verdict fields were malformed): parse the whole response
+            try:
+                full: ToxicityResult = self._parse_response(LLMResponse(content=parser.text, model=self.llm_client.model))
+            except Exception:
+                self._count('errors')
+                raise
+            if key is not None and self._caching:
+                await self._remember_async({key: full})
+            return StreamedToxicityResult(**full.model_dump(exclude={'score'}))
+
+        if reason == 'skip' or result.reason_complete:
+            await stream.aclose()
+            if result.reason_complete and key is not None and self._caching:
+                await self._remember_async({key: ToxicityResult(**result.model_dump(exclude={'score', 'reason_complete'}))})
+            return result
+
+        task: asyncio.Task = asyncio.create_task(self._stream_reason_async(stream, parser, result, key))
+        # don't warn about an exception nobody awaited, the reason just stays incomplete
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        result._reason_task = task
+        return result
+
+    async def _stream_reason_async(
+            self,
+            stream: AsyncIterator[str],
+            parser: StreamingJSONObject,
+            result: StreamedToxicityResult,
+            key: Optional[str]
+        ) -> None:
+        '''Keep reading {stream} until the reason is complete, then fill it into {result} and cache the verdict'''
+        try:
+            async for chunk in stream:
+                parser.feed(chunk)
+                if parser.has('reason'):
+                    break
+        finally:
+            await stream.aclose()
+
+        if not isinstance(parser.fields.get('reason'), str):
+            return
+        result.reason = parser.fields['reason']
+        result.reason_complete = True
+        if key is not None and self._caching:
+            await self._remember_async({key: ToxicityResult(**result.model_dump(exclude={'score', 'reason_complete'}))})
+
+    @staticmethod
+    def _early_result(parser: StreamingJSONObject) -> Optional[StreamedToxicityResult]:
+        '''Build a result from the verdict fields parsed so far, None if they are malformed'''
+        reason: Any = parser.fields.get('reason')
+        try:
+            return StreamedToxicityResult(
+                is_toxic=parser.fields['is_toxic'],
+                confidence=parser.fields['confidence'],
+                categories=parser.fields['categories'],
+                reason=reason if isinstance(reason, str) else '',
+                reason_complete=isinstance(reason, str)
+            )
+        except (ValidationError, AttributeError, TypeError):
+            return None
+
+    @property
+    def _caching(self) -> bool:
+        return self.cache is not None or self.store is not None
+
+    async def _lookup_async(self, key: str) -> Optional[ToxicityResult]:
+        '''Look {key} up in the cache, then in the store (promoting store hits into the cache)'''
+        return (await self._lookup_many_async([key])).get(key)
+
+    async def _lookup_many_async(self, keys: list[str]) -> dict[str, ToxicityResult]:
+        '''Bulk version of _lookup_async, missing keys are left out'''
+        found: dict[str, ToxicityResult] = {}
+        if self.cache is not None:
+            found = self.cache.get_many(keys)
+
+        if self.store is not None:
+            missing: list[str] = [key for key in keys if key not in found]
+            if missing:
+                # the store may hit the disk or wait on another process' lock, keep it off the loop
+                stored: dict[str, ToxicityResult] = await asyncio.to_thread(self.store.get_many, missing)
+                if stored and self.cache is not None:
+                    self.cache.set_many(stored)
+                found.update(stored)
+        return found
+
+    async def _remember_async(self, items: dict[str, ToxicityResult]) -> None:
+        '''Write fresh verdicts to the cache and the store'''
+        if self.cache is not None:
+            self.cache.set_many(items)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set_many, items)
+
+    def _cache_key(self, text: str) -> str:
+        '''Return the verdict cache key of {text} under the current client, model and system prompt'''
+        return verdict_key(text, self.llm_client.provider_name, self.llm_client.model, self.system_prompt)
+
+    def _parse_response(self, response: LLMResponse) -> ToxicityResult:
+        '''Turn the judge's raw JSON response into a ToxicityResult'''
+        started_at: float = time.perf_counter()
         toxicity_response: dict = json.loads(response.content)
+        parsed_at: float = time.perf_counter()
+        self._observe('json_parse', (parsed_at - started_at) * 1000)
 
         result = ToxicityResult(**toxicity_response)
+        self._observe('validation', (time.perf_counter() - parsed_at) * 1000)
         return result
 
-    def _structure_output(self) -> dict:
-        '''Return the nessessary args to generate structured output for the specific LLM client'''
-        provider: str = self.llm_client.provider_name
-        response_format: dict = {}
-        if 'gemini' in provider:
-            response_format = {
-                'response_type': 'application/json',
-                'response_schema': ToxicityResult
-            }
-        elif 'openai' in provider:
-            response_format = {
-                'response_format': ToxicityResult
-            }
-
-        return response_format
+    def _record_response(self, response: LLMResponse) -> None:
+        '''Report the client-side stage timings and the token usage of one judge response'''
+        if self.metrics is None:
+            return
+        self.metrics.count('llm_calls')
+        for stage, duration_ms in response.timings.items():
+            self.metrics.observe(stage, duration_ms)
+        if 'generation' not in response.timings and response.response_time_ms is not None:
+            self.metrics.observe('generation', response.response_time_ms)
+        for name, usage_key in (('prompt_tokens', 'prompt_tokens'), ('completion_tokens', 'model_tokens'), ('total_tokens', 'total_tokens')):
+            value: Any = (response.usage or {}).get(usage_key)
+            if isinstance(value, (int, float)):
+                self.metrics.count(name, value)
+
+    def _observe(self, stage: str, duration_ms: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(stage, duration_ms)
+
+    def _count(self, name: str, value: float = 1) -> None:
+        if self.metrics is not None and value:
+            self.metrics.count(name, value)
+
+    def _structure_output(self, schema: type[BaseModel] = ToxicityResult, client: Optional[BaseLLMClient] = None) -> dict:
+        '''Return the nessessary args to generate structured output of {schema} for {client} (default: the guard's LLM client)'''
+        return (client or self.llm_client).structured_output_kwargs(schema)
@@ -0,0 +1,129 @@
+# hedged judge requests: duplicate a call that runs long and keep whichever answer comes first
+import asyncio
+import time
+import weakref
+
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from ai_sentinel.core.metrics import LatencyHistogram
+from ai_sentinel.llm.base import BaseLLMClient
+
+T = TypeVar('T')
+
+
+class HedgingPolicy:
+    '''
+    Opt-in policy that cuts tail latency by hedging slow calls
+
+    If a call has not returned after the {percentile}th percentile of its client's recent latency,
+    a duplicate is fired at {secondary} (or the same client) and the first answer wins; the other
+    call is cancelled. A call that fails while its twin is still running waits for the twin.
+    Hedges are capped at {max_extra_ratio} extra requests per request, so a provider that is slow
+    across the board is not hit with twice the load. No hedging happens until a client has
+    {min_samples} latency samples.
+
+    Parameters:
+    percentile (float): Latency percentile (0-100) after which a call is hedged | default = 95.0
+    secondary (Optional[BaseLLMClient]): Client the hedge is sent to, defaults to the primary client | default = None
+    max_extra_ratio (float): Most hedges per request, ex. 0.05 for at most 5% extra requests | default = 0.05
+    min_samples (int): Latency samples needed before hedging | default = 20
+    min_delay_ms (float): Never hedge sooner than this | default = 0.0
+    window (int): Latency samples kept per client | default = 1000
+    '''
+    def __init__(
+            self,
+            percentile: float = 95.0,
+            secondary: Optional[BaseLLMClient] = None,
+            max_extra_ratio: float = 0.05,
+            min_samples: int = 20,
+            min_delay_ms: float = 0.0,
+            window: int = 1000
+        ):
+        if not 0.0 < percentile < 100.0:
+            raise ValueError('Percentile must be between 0.0 and 100.0')
+        if not 0.0 <= max_extra_ratio <= 1.0:
+            raise ValueError('Max extra ratio must be between 0.0 and 1.0')
+        if min_samples < 1 or min_delay_ms < 0:
+            raise ValueError('Min samples must be at least 1 and min delay must not be negative')
+
+        self.percentile = percentile
+        self.secondary = secondary
+        self.max_extra_ratio = max_extra_ratio
+        self.min_samples = min_samples
+        self.min_delay_ms = min_delay_ms
+        self.window = window
+        self.histograms: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+        self.requests: int = 0
+        self.hedged: int = 0
+        self.hedge_wins: int = 0
+
+    def histogram(self, client: BaseLLMClient) -> LatencyHistogram:
+        '''Return the latency histogram of {client}'''
+        histogram: Optional[LatencyHistogram] = self.histograms.get(client)
+        if histogram is None:
+            histogram = self.histograms.setdefault(client, LatencyHistogram(self.window))
+        return histogram
+
+    def hedge_delay(self, client: BaseLLMClient) -> Optional[float]:
+        '''Return the seconds after which a call to {client} is hedged, None while there are too few samples'''
+        histogram: LatencyHistogram = self.histogram(client)
+        if histogram.samples < self.min_samples:
+            return None
+        return max(self.min_delay_ms, histogram.percentile(self.percentile)) / 1000
+
+    async def run(self, primary: BaseLLMClient, call: Callable[[BaseLLMClient], Awaitable[T]]) -> T:
+        '''Run {call} on {primary}, hedging it on the secondary client if it runs long'''
+        self.requests += 1
+        first: asyncio.Task = asyncio.ensure_future(self._timed(primary, call))
+        delay: Optional[float] = self.hedge_delay(primary)
+        if delay is None:
+            return await first
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except BaseException:
+            first.cancel()
+            raise
+        if done or self.hedged >= self.max_extra_ratio * self.requests:
+            return await first
+
+        self.hedged += 1
+        second: asyncio.Task = asyncio.ensure_future(self._timed(self.secondary or primary, call))
+        pending: set[asyncio.Task] = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner: Optional[asyncio.Task] = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is second:
+                        self.hedge_wins += 1
+                    return winner.result()
+                if not pending:
+                    # both failed, report the original call's error
+                    return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, client: BaseLLMClient, call: Callable[[BaseLLMClient], Awaitable[T]]) -> T:
+        '''
+        Run {call} on {client}, recording its latency however it ends
+        A call that fails or is cancelled (the loser of a hedge) records the time it ran as a lower
+        bound of its latency, so slow calls are not left out of the percentile the hedge delay uses.
+        '''
+        start: float = time.perf_counter()
+        try:
+            return await call(client)
+        finally:
+            self.histogram(client).observe((time.perf_counter() - start) * 1000)
+
+    @property
+    def stats(self) -> dict:
+        '''Return how many requests were hedged and how many hedges won'''
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'extra_ratio': self.hedged / self.requests if self.requests else 0.0,
+        }
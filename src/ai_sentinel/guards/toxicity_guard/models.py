@@ -1,8 +1,11 @@
 
+import asyncio
+
 from pydantic import (
     BaseModel, 
     BeforeValidator, 
     Field, 
+    PrivateAttr,
     model_validator
 )
 from typing import (
@@ -84,4 +87,45 @@ class ToxicityResult(BaseModel):
             expected_score = ToxicityScore.MEDIUM
         
         self.score = expected_score
-        return self
\ No newline at end of file
+        return self
+
+class PackedToxicityResult(ToxicityResult):
+    '''ToxicityResult for one text of a packed request, tagged with the id of that text'''
+
+    id: int = Field(description='id of the text this assessment belongs to')
+
+class PackedToxicityResults(BaseModel):
+    '''Structured output from LLM toxicity assessment of several packed texts'''
+
+    results: list[PackedToxicityResult] = Field(
+        default_factory=list,
+        description='one assessment per input text'
+    )
+
+class ToxicSpan(BaseModel):
+    '''Part of a long text that was judged toxic, located by character offsets'''
+
+    start: int = Field(ge=0, description='offset of the first character of the span')
+    end: int = Field(ge=0, description='offset just past the last character of the span')
+    confidence: float = Field(ge=0.0, le=1.0, description='confidence that the span is toxic (0.0-1.0)')
+    categories: list[ToxicityCategories] = Field(default_factory=list, description='toxic categories detected in the span')
+    reason: str = Field(default='', description='explanation of the assessment of the span')
+
+class ChunkedToxicityResult(ToxicityResult):
+    '''ToxicityResult of a long text analyzed in windows, with the offending spans'''
+
+    spans: list[ToxicSpan] = Field(default_factory=list, description='windows judged toxic, in text order')
+    windows: int = Field(default=1, description='number of windows the text was split into')
+    windows_analyzed: int = Field(default=1, description='number of windows judged before stopping')
+
+class StreamedToxicityResult(ToxicityResult):
+    '''ToxicityResult returned from a streamed judge response before its reason may have been generated'''
+
+    reason_complete: bool = Field(default=True, description='whether the reason has been received in full')
+    _reason_task: Optional[asyncio.Task] = PrivateAttr(default=None)
+
+    async def wait_for_reason(self) -> str:
+        '''Wait until the reason has been filled in by the background stream (if any) and return it'''
+        if self._reason_task is not None:
+            await self._reason_task
+        return self.reason
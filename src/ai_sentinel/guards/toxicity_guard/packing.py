@@ -0,0 +1,79 @@
+# helpers for judging several short texts in one LLM request
+import json
+
+from typing import Any
+
+from pydantic import ValidationError
+
+from ai_sentinel.core.tokens import estimate_tokens
+from ai_sentinel.guards.toxicity_guard.models import ToxicityResult
+
+# json framing added around every packed text ({"id": 12, "text": "..."}, )
+_ITEM_OVERHEAD_TOKENS: int = 8
+
+
+def build_packs(
+        items: list[tuple[int, str]],
+        max_pack_tokens: int,
+        max_pack_size: int
+    ) -> list[list[tuple[int, str]]]:
+    '''
+    Greedily group {items} (index, text) into packs of at most {max_pack_size} texts whose estimated
+    token cost stays under {max_pack_tokens}. A text that is too big on its own gets a pack to itself.
+    '''
+    packs: list[list[tuple[int, str]]] = []
+    current: list[tuple[int, str]] = []
+    current_tokens: int = 0
+    for item in items:
+        cost: int = estimate_tokens(item[1]) + _ITEM_OVERHEAD_TOKENS
+        if current and (current_tokens + cost > max_pack_tokens or len(current) >= max_pack_size):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def render_pack(texts: list[str]) -> str:
+    '''Render {texts} as the JSON array sent as the user message, ids are positions in the pack'''
+    return json.dumps([{'id': idx, 'text': text} for idx, text in enumerate(texts)], ensure_ascii=False)
+
+
+def split_pack_response(content: str, size: int) -> dict[int, ToxicityResult]:
+    '''
+    Split the judge's {"results": [...]} answer for a pack of {size} texts into per-text results.
+    Entries that are malformed, duplicated or carry an unknown id are dropped, so the caller can
+    retry just those texts; a response that is not valid JSON at all yields no results.
+    '''
+    try:
+        payload: Any = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+    entries: Any = payload.get('results') if isinstance(payload, dict) else payload
+    if not isinstance(entries, list):
+        return {}
+
+    results: dict[int, ToxicityResult] = {}
+    duplicates: set[int] = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        entry = dict(entry)
+        idx: Any = entry.pop('id', None)
+        if not isinstance(idx, int) or isinstance(idx, bool) or not 0 <= idx < size:
+            continue
+        if idx in results:
+            duplicates.add(idx)
+            continue
+        try:
+            results[idx] = ToxicityResult(**entry)
+        except (ValidationError, AttributeError, TypeError):
+            continue
+
+    # an id answered twice is ambiguous, judge that text again on its own
+    for idx in duplicates:
+        results.pop(idx, None)
+    return results
@@ -0,0 +1,86 @@
+# incremental parsing of a JSON object that arrives in pieces (streamed judge responses)
+import json
+
+from typing import Any, Optional
+
+
+class StreamingJSONObject:
+    '''
+    Incremental parser for the top-level fields of a streamed JSON object
+
+    Feed the text as it arrives; a field is decoded as soon as the text after its value
+    (a comma or the closing brace) shows the value is complete, so the first fields of an
+    object are available long before the last one has been generated. Anything before the
+    opening brace (ex. a markdown code fence) is skipped. Every character is scanned once.
+    '''
+    def __init__(self):
+        self.text: str = ''
+        self.fields: dict[str, Any] = {}
+        self.closed: bool = False
+        self._pos: int = 0
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._escaped: bool = False
+        self._expecting_key: bool = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> dict[str, Any]:
+        '''Add {chunk} to the object and return the fields it completed'''
+        self.text += chunk
+        completed: dict[str, Any] = {}
+        text: str = self.text
+        for pos in range(self._pos, len(text)):
+            if self.closed:
+                break
+            ch: str = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:pos + 1])
+                        self._key_start = None
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expecting_key:
+                    self._key_start = pos
+            elif ch in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = ch == '{'
+            elif self._depth != 1:
+                if ch in '}]':
+                    self._depth -= 1
+            elif ch == ':' and self._expecting_key and self._key is not None:
+                self._expecting_key = False
+                self._value_start = pos + 1
+            elif ch in ',}':
+                self._complete(text[self._value_start:pos] if self._value_start is not None else '', completed)
+                self._expecting_key = True
+                if ch == '}':
+                    self._depth = 0
+                    self.closed = True
+        self._pos = len(text)
+        return completed
+
+    def _complete(self, raw: str, completed: dict[str, Any]) -> None:
+        key: Optional[str] = self._key
+        self._key, self._value_start = None, None
+        if key is None or not raw.strip():
+            return
+        try:
+            completed[key] = self.fields[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            # leave malformed values out, the caller falls back to parsing the whole response
+            return
+
+    def has(self, *keys: str) -> bool:
+        '''True once every one of {keys} has been decoded'''
+        return all(key in self.fields for key in keys)
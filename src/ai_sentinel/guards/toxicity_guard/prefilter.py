@@ -0,0 +1,267 @@
+# cheap lexicon stage that runs before the LLM judge
+import re
+import unicodedata
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Iterable, Literal, Optional, Sequence
+
+from ai_sentinel.guards.toxicity_guard.models import ToxicityCategories, ToxicityResult
+
+PrefilterAction = Literal['block', 'allow', 'escalate']
+
+# look-alike letters from other scripts, mapped to the latin letter they imitate
+_CONFUSABLES: dict[str, str] = {
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p',
+    'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'і': 'i', 'ї': 'i', 'ј': 'j', 'ѕ': 's', 'ԁ': 'd',
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+}
+# common leetspeak substitutions
+_LEETSPEAK: dict[str, str] = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b', '@': 'a', '$': 's', '+': 't',
+}
+# characters used to hide words from filters (zero-width spaces and joiners, soft hyphen, ...)
+_INVISIBLE: str = '\u00ad\u180e\u200b\u200c\u200d\u2060\ufeff'
+
+_TRANSLATION: dict[int, Optional[str]] = {
+    **str.maketrans({**_CONFUSABLES, **_LEETSPEAK}),
+    **{ord(ch): None for ch in _INVISIBLE},
+}
+_REPEATS = re.compile(r'(\w)\1{2,}')
+_WORD = re.compile(r'\w+')
+
+
+def normalize_for_matching(text: str) -> str:
+    '''
+    Normalize {text} for lexicon matching: unicode NFKC, case folding, look-alike letters and
+    leetspeak mapped to latin letters, invisible characters removed, letter runs longer than
+    two squeezed to two ("loooser" -> "looser") and whitespace collapsed
+    '''
+    if text.isascii():
+        # ascii is already NFKC and casefold() is lower() there, skip the expensive calls
+        text = text.lower().translate(_TRANSLATION)
+    else:
+        text = unicodedata.normalize('NFKC', text).casefold().translate(_TRANSLATION)
+    text = _REPEATS.sub(r'\1\1', text)
+    return ' '.join(text.split())
+
+
+class _AhoCorasick:
+    '''
+    Aho-Corasick automaton finding every occurrence of many patterns in one pass over a sequence
+    Symbols can be characters (patterns are strings) or words (patterns are tuples of words).
+    Transitions (goto plus failure links) are resolved once per (state, symbol) and cached, so
+    the scan does a single dict lookup per symbol. Only symbols that occur in some pattern are
+    cached: any other symbol leads back to the root, and caching it would grow the table with
+    every new word seen.
+    '''
+    def __init__(self, patterns: list[Sequence[Hashable]]):
+        self.patterns = patterns
+        self._goto: list[dict[Hashable, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[tuple[int, ...]] = [()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            node: int = 0
+            for ch in pattern:
+                next_node: Optional[int] = self._goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][ch] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                node = next_node
+            self._output[node] += (pattern_id,)
+
+        # breadth-first pass to set the failure links and merge outputs along them
+        queue: list[int] = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback: int = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target: int = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] += self._output[self._fail[child]]
+
+        self._transitions: list[dict[Hashable, int]] = [dict(children) for children in self._goto]
+        self._alphabet: frozenset[Hashable] = frozenset(ch for pattern in patterns for ch in pattern)
+
+    def _resolve(self, node: int, ch: Hashable) -> int:
+        '''Follow failure links from {node} until {ch} can be consumed, and cache the result'''
+        if ch not in self._alphabet:
+            return 0
+        state: int = node
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        target: int = self._goto[state].get(ch, 0)
+        self._transitions[node][ch] = target
+        return target
+
+    def search(self, text: Sequence[Hashable]) -> list[tuple[int, int]]:
+        '''Return (end index, pattern id) for every match in {text}'''
+        if self._alphabet.isdisjoint(text):
+            # nothing of any pattern in it, the usual case for clean text: skip the per-symbol loop
+            return []
+        transitions, output = self._transitions, self._output
+        matches: list[tuple[int, int]] = []
+        node: int = 0
+        for idx, ch in enumerate(text):
+            next_node: Optional[int] = transitions[node].get(ch)
+            node = next_node if next_node is not None else self._resolve(node, ch)
+            if output[node]:
+                for pattern_id in output[node]:
+                    matches.append((idx + 1, pattern_id))
+        return matches
+
+
+# a plain frozen dataclass rather than a pydantic model: one is built per text on the hot path
+@dataclass(frozen=True, slots=True)
+class PrefilterDecision:
+    '''
+    Outcome of the prefilter for one text, kept for auditing
+
+    action: block or allow (answered by the prefilter) or escalate (sent to the LLM)
+    rule: name of the rule that decided
+    matches: normalized terms that matched
+    categories: categories of the matched terms
+    result: verdict when the prefilter short-circuits
+    '''
+    action: PrefilterAction
+    rule: str
+    matches: tuple[str, ...] = ()
+    categories: tuple[ToxicityCategories, ...] = ()
+    result: Optional[ToxicityResult] = field(default=None, compare=False)
+
+
+_NO_MATCH = PrefilterDecision(action='escalate', rule='no_match')
+
+
+class LexiconPrefilter:
+    '''
+    Lexicon stage in front of the LLM judge
+
+    Texts are normalized (case, look-alike letters, leetspeak) and scanned for all terms at once with
+    an Aho-Corasick automaton (over words when {whole_words}, over characters otherwise). Terms of a category listed in {block_categories} short-circuit to a
+    toxic ToxicityResult; terms of any other category are always escalated to the LLM. Texts that
+    match one of {allow_phrases} exactly (after normalization) short-circuit to a non-toxic result.
+    Texts without matches are escalated unless {on_no_match} is 'allow'. Every decision is tagged
+    with the rule that made it, counted in {stats}, passed to {audit} if given, and prefilter
+    verdicts carry a "[prefilter:<rule>]" tag at the start of their reason.
+
+    Parameters:
+    terms (dict[ToxicityCategories, Iterable[str]]): Term lists per category
+    block_categories (Iterable[ToxicityCategories]): Categories whose matches are blocked without the LLM | default = ()
+    allow_phrases (Iterable[str]): Whole texts that are answered as non-toxic without the LLM | default = ()
+    on_no_match (PrefilterAction): What to do with texts that match nothing, 'escalate' or 'allow' | default = 'escalate'
+    block_confidence (float): Confidence given to blocked texts | default = 0.95
+    whole_words (bool): Only match terms on word boundaries | default = True
+    audit (Optional[Callable[[str, PrefilterDecision], None]]): Called with every text and its decision | default = None
+    '''
+    def __init__(
+            self,
+            terms: dict[ToxicityCategories, Iterable[str]],
+            block_categories: Iterable[ToxicityCategories] = (),
+            allow_phrases: Iterable[str] = (),
+            on_no_match: PrefilterAction = 'escalate',
+            block_confidence: float = 0.95,
+            whole_words: bool = True,
+            audit: Optional[Callable[[str, PrefilterDecision], None]] = None
+        ):
+        if on_no_match not in ('escalate', 'allow'):
+            raise ValueError("On no match must be 'escalate' or 'allow'")
+        if not 0.0 <= block_confidence <= 1.0:
+            raise ValueError('Block confidence must be between 0.0 and 1.0')
+
+        self.block_categories: set[ToxicityCategories] = set(block_categories)
+        self.allow_phrases: set[str] = {self._phrase_key(normalize_for_matching(phrase)) for phrase in allow_phrases}
+        self.allow_phrases.discard('')
+        self.on_no_match = on_no_match
+        self.block_confidence = block_confidence
+        self.whole_words = whole_words
+        self.audit = audit
+        self.stats: Counter = Counter()
+
+        # one pattern per normalized term, a term may belong to several categories
+        pattern_categories: dict[str, set[ToxicityCategories]] = {}
+        for category, category_terms in terms.items():
+            for term in category_terms:
+                normalized: str = normalize_for_matching(term)
+                if normalized:
+                    pattern_categories.setdefault(normalized, set()).add(ToxicityCategories(category))
+        self._terms: list[str] = list(pattern_categories)
+        self._categories: list[frozenset[ToxicityCategories]] = [frozenset(pattern_categories[t]) for t in self._terms]
+        patterns: list[Sequence[Hashable]] = (
+            [tuple(_WORD.findall(term)) for term in self._terms] if whole_words else list(self._terms)
+        )
+        self._automaton = _AhoCorasick(patterns)
+        # validated once, each allowed text gets a copy
+        self._allow_results: dict[str, ToxicityResult] = {rule: self._allow_result(rule) for rule in ('allow_phrase', 'no_match')}
+
+    def check(self, text: str) -> PrefilterDecision:
+        '''Run the prefilter on {text} and return its decision'''
+        normalized: str = normalize_for_matching(text)
+        decision: PrefilterDecision = self._decide(normalized)
+        self.stats[decision.rule] += 1
+        if self.audit is not None:
+            self.audit(text, decision)
+        return decision
+
+    def check_many(self, texts: Iterable[str]) -> list[PrefilterDecision]:
+        '''Run the prefilter on every text'''
+        return [self.check(text) for text in texts]
+
+    def _find(self, symbols: Sequence[Hashable]) -> list[int]:
+        '''Return the ids of the terms found in {symbols} (words or characters), in order of appearance'''
+        found: list[int] = []
+        for _, term_id in self._automaton.search(symbols):
+            if term_id not in found:
+                found.append(term_id)
+        return found
+
+    def _decide(self, normalized: str) -> PrefilterDecision:
+        words: Optional[list[str]] = _WORD.findall(normalized) if self.whole_words or self.allow_phrases else None
+        found: list[int] = self._find(words if self.whole_words else normalized) if self._terms else []
+        if not found:
+            if self.allow_phrases and ' '.join(words) in self.allow_phrases:
+                return PrefilterDecision(action='allow', rule='allow_phrase', result=self._allowed('allow_phrase'))
+            if self.on_no_match == 'allow':
+                return PrefilterDecision(action='allow', rule='no_match', result=self._allowed('no_match'))
+            return _NO_MATCH
+
+        matches: tuple[str, ...] = tuple(self._terms[term_id] for term_id in found)
+        matched: set[ToxicityCategories] = set().union(*(self._categories[term_id] for term_id in found))
+        categories: tuple[ToxicityCategories, ...] = tuple(category for category in ToxicityCategories if category in matched)
+
+        blocked: list[ToxicityCategories] = [category for category in categories if category in self.block_categories]
+        if not blocked:
+            return PrefilterDecision(action='escalate', rule='term_match', matches=matches, categories=categories)
+
+        result = ToxicityResult(
+            is_toxic=True,
+            confidence=self.block_confidence,
+            categories=blocked,
+            reason=f'[prefilter:block_term] matched blocked term(s): {", ".join(matches)}'
+        )
+        return PrefilterDecision(action='block', rule='block_term', matches=matches, categories=categories, result=result)
+
+    @staticmethod
+    def _phrase_key(normalized: str) -> str:
+        '''Allow phrases match whole texts word for word, ignoring punctuation ("thanks!" -> "thanks")'''
+        return ' '.join(_WORD.findall(normalized))
+
+    def _allowed(self, rule: str) -> ToxicityResult:
+        '''Copy of the non-toxic result of {rule}, without validating it again'''
+        return self._allow_results[rule].model_copy(update={'categories': []})
+
+    @staticmethod
+    def _allow_result(rule: str) -> ToxicityResult:
+        return ToxicityResult(
+            is_toxic=False,
+            confidence=0.0,
+            categories=[],
+            reason=f'[prefilter:{rule}] answered by the prefilter without the LLM judge'
+        )
@@ -140,3 +140,21 @@ SYSTEM_PROMPT: str = f"""
         [TEXT TO ANALYZE WILL BE INSERTED HERE]
 
 """
+
+# packed mode: several texts judged in one request, sharing a single copy of the prompt above
+PACKED_SYSTEM_PROMPT: str = f"""{SYSTEM_PROMPT}
+    BATCH MODE:
+        The user message is a JSON array of objects shaped like {{"id": integer, "text": string}}.
+        Analyze every text on its own, exactly as if it were the only text sent, following all of the instructions above.
+        Do not let one text influence the assessment of another.
+
+    BATCH RESPONSE FORMAT:
+        Respond with a single JSON object containing one entry per input text, in any order:
+            {{
+                "results": [
+                    {{"id": integer, "is_toxic": boolean, "confidence": number, "categories": [...], "reason": "string", "score": "string"}}
+                ]
+            }}
+        Every "id" from the input must appear exactly once, copied unchanged.
+
+"""
@@ -0,0 +1,238 @@
+# incremental guard over streamed text (LLM generations, chat relays, ...)
+import asyncio
+import math
+import re
+
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Literal, Optional
+
+from ai_sentinel.core.tokens import CHARS_PER_TOKEN
+from ai_sentinel.guards.toxicity_guard.chunking import merge_window_results
+from ai_sentinel.guards.toxicity_guard.models import ChunkedToxicityResult, ToxicityResult
+
+if TYPE_CHECKING:
+    from ai_sentinel.guards.toxicity_guard.detector import ToxicityGuard
+
+StreamBoundary = Literal['sentence', 'tokens']
+StreamRelease = Literal['immediate', 'cleared']
+
+# end of a sentence (closing quotes/brackets included) followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r'[.!?…]+["\'”’)\]]*\s+|\n+')
+
+
+class ToxicContentError(Exception):
+    '''
+    Raised by a guarded stream as soon as a part of it is judged toxic
+
+    result: verdict of the offending part
+    start, end: character offsets of the offending part in the streamed text
+    '''
+    def __init__(self, result: ToxicityResult, start: int, end: int):
+        super().__init__(f'Toxic content in characters {start}-{end}: {result.reason}')
+        self.result = result
+        self.start = start
+        self.end = end
+
+
+class GuardedStream:
+    '''
+    Async iterator that relays a text stream while judging it incrementally
+
+    The incoming text is cut into segments at {boundary}: sentence ends (merged until at least
+    {min_segment_tokens} long) or every {max_segment_tokens} tokens, the latter also bounding
+    sentences that run on. Every segment is judged once, in the background, together with about
+    {context_tokens} tokens of the text before it; text that was already cleared is never judged
+    again beyond that context.
+
+    With release 'immediate' chunks are relayed as they arrive and the stream is cut as soon as a
+    verdict comes back toxic; with release 'cleared' text is only relayed once its segment has been
+    judged non-toxic, so toxic text never gets out. On toxic content the source stream is closed and
+    ToxicContentError is raised ({on_toxic} 'raise') or iteration just ends ({on_toxic} 'stop').
+    Verdicts so far are merged in {result}.
+
+    Parameters:
+    guard (ToxicityGuard): Guard used to judge every segment
+    chunks (AsyncIterable[str]): Source stream of text chunks (tokens, deltas, lines, ...)
+    boundary (StreamBoundary): Cut segments at 'sentence' ends or only every max_segment_tokens 'tokens' | default = 'sentence'
+    min_segment_tokens (int): Shortest segment cut at a sentence end | default = 16
+    max_segment_tokens (int): Longest segment, cut at the last whitespace | default = 128
+    context_tokens (int): Text before a segment sent along with it | default = 32
+    release (StreamRelease): Relay chunks 'immediate'ly or only once 'cleared' | default = 'immediate'
+    on_toxic (Literal['raise', 'stop']): Raise ToxicContentError or end the stream on toxic content | default = 'raise'
+    max_concurrency (int): Segments judged at once | default = 4
+    '''
+    def __init__(
+            self,
+            guard: 'ToxicityGuard',
+            chunks: AsyncIterable[str],
+            boundary: StreamBoundary = 'sentence',
+            min_segment_tokens: int = 16,
+            max_segment_tokens: int = 128,
+            context_tokens: int = 32,
+            release: StreamRelease = 'immediate',
+            on_toxic: Literal['raise', 'stop'] = 'raise',
+            max_concurrency: int = 4
+        ):
+        if boundary not in ('sentence', 'tokens'):
+            raise ValueError("Boundary must be 'sentence' or 'tokens'")
+        if release not in ('immediate', 'cleared'):
+            raise ValueError("Release must be 'immediate' or 'cleared'")
+        if on_toxic not in ('raise', 'stop'):
+            raise ValueError("On toxic must be 'raise' or 'stop'")
+        if not 1 <= min_segment_tokens <= max_segment_tokens:
+            raise ValueError('Segment tokens must satisfy 1 <= min_segment_tokens <= max_segment_tokens')
+        if context_tokens < 0 or max_concurrency < 1:
+            raise ValueError('Context tokens must not be negative and max concurrency must be at least 1')
+
+        self.guard = guard
+        self.chunks = chunks
+        self.boundary = boundary
+        self.release = release
+        self.on_toxic = on_toxic
+        self._min_chars: int = math.ceil(min_segment_tokens * CHARS_PER_TOKEN)
+        self._max_chars: int = math.floor(max_segment_tokens * CHARS_PER_TOKEN)
+        self._context_chars: int = math.floor(context_tokens * CHARS_PER_TOKEN)
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.text: str = ''
+        self.segments: list[tuple[int, int]] = []
+        self.verdicts: dict[int, ToxicityResult] = {}
+        self.flagged: Optional[ToxicContentError] = None
+        self._cut_at: int = 0
+        self._released: int = 0
+        self._error: Optional[BaseException] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._alarm: Optional[asyncio.Event] = None
+        self._started: bool = False
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        if self._started:
+            raise RuntimeError('A guarded stream can only be iterated once')
+        self._started = True
+        return self._relay()
+
+    @property
+    def result(self) -> Optional[ChunkedToxicityResult]:
+        '''Merged verdict of the segments judged so far (None before the first verdict)'''
+        if not self.verdicts:
+            return None
+        return merge_window_results(self.segments, self.verdicts)
+
+    async def _relay(self) -> AsyncIterator[str]:
+        self._alarm = asyncio.Event()
+        source: AsyncIterator[str] = aiter(self.chunks)
+        alarm: asyncio.Task = asyncio.ensure_future(self._alarm.wait())
+        upcoming: Optional[asyncio.Task] = None
+        try:
+            while True:
+                upcoming = asyncio.ensure_future(anext(source))
+                # wake up on the next chunk or on a toxic verdict, whichever comes first
+                await asyncio.wait({upcoming, alarm}, return_when=asyncio.FIRST_COMPLETED)
+                if self._alarm.is_set():
+                    break
+                try:
+                    chunk: str = upcoming.result()
+                except StopAsyncIteration:
+                    break
+
+                self.text += chunk
+                self._schedule(final=False)
+                if self.release == 'immediate':
+                    yield chunk
+                elif released := self._release():
+                    yield released
+
+            if not self._alarm.is_set():
+                self._schedule(final=True)
+                while self._tasks and not self._alarm.is_set():
+                    await asyncio.wait(self._tasks | {alarm}, return_when=asyncio.FIRST_COMPLETED)
+                    if released := self._release():
+                        yield released
+
+            if self._error is not None:
+                raise self._error
+            if self.flagged is not None:
+                if self.on_toxic == 'raise':
+                    raise self.flagged
+                return
+            if released := self._release(final=True):
+                yield released
+        finally:
+            alarm.cancel()
+            pending: set[asyncio.Task] = set(self._tasks)
+            if upcoming is not None and not upcoming.done():
+                pending.add(upcoming)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            # stop the source too (ex. close the generation's HTTP stream)
+            close = getattr(source, 'aclose', None)
+            if close is not None:
+                await close()
+
+    def _schedule(self, final: bool) -> None:
+        '''Cut the segments that are complete and start judging them in the background'''
+        while True:
+            length: Optional[int] = self._next_cut(self.text[self._cut_at:], final)
+            if length is None:
+                return
+            start, end = self._cut_at, self._cut_at + length
+            self._cut_at = end
+            if not self.text[start:end].strip():
+                # whitespace only, nothing to judge
+                continue
+            self.segments.append((start, end))
+            task: asyncio.Task = asyncio.ensure_future(self._judge(len(self.segments) - 1))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _next_cut(self, pending: str, final: bool) -> Optional[int]:
+        '''Return the length of the next complete segment at the start of {pending}, if any'''
+        if not pending:
+            return None
+        if self.boundary == 'sentence':
+            for match in _SENTENCE_END.finditer(pending, 0, self._max_chars + 1):
+                if match.end() >= self._min_chars:
+                    return match.end()
+        if len(pending) > self._max_chars:
+            space: int = max(pending.rfind(' ', 0, self._max_chars + 1), pending.rfind('\n', 0, self._max_chars + 1))
+            return space + 1 if space > 0 else self._max_chars
+        return len(pending) if final else None
+
+    async def _judge(self, idx: int) -> None:
+        start, end = self.segments[idx]
+        context: int = max(0, start - self._context_chars)
+        # start the context on a word boundary
+        while context < start and context > 0 and not self.text[context - 1].isspace():
+            context += 1
+        try:
+            async with self._semaphore:
+                result: ToxicityResult = await self.guard.analyze_async(self.text[context:end])
+        except Exception as e:
+            self._error = self._error or e
+            self._alarm.set()
+            return
+
+        self.verdicts[idx] = result
+        if result.is_toxic and (self.flagged is None or start < self.flagged.start):
+            self.flagged = ToxicContentError(result, start, end)
+            self._alarm.set()
+
+    def _release(self, final: bool = False) -> str:
+        '''
+        In 'cleared' mode return the text that became cleared since the last call
+        ({final}: the stream is over and every segment was cleared, release the rest)
+        '''
+        if self.release != 'cleared' or self.flagged is not None or self._error is not None:
+            return ''
+        cleared: int = len(self.text) if final else self._released
+        if not final:
+            for idx, (_, end) in enumerate(self.segments):
+                if idx not in self.verdicts or self.verdicts[idx].is_toxic:
+                    break
+                cleared = end
+        if cleared <= self._released:
+            return ''
+        released: str = self.text[self._released:cleared]
+        self._released = cleared
+        return released
@@ -0,0 +1,255 @@
+# local triage classifier trained from past LLM verdicts
+import json
+import zlib
+
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from ai_sentinel.guards.toxicity_guard.models import ToxicityCategories, ToxicityResult
+from ai_sentinel.guards.toxicity_guard.prefilter import normalize_for_matching
+
+# head 0 predicts is_toxic, head 1 + i predicts the i-th ToxicityCategories member
+_CATEGORIES: list[ToxicityCategories] = list(ToxicityCategories)
+_HEADS: int = 1 + len(_CATEGORIES)
+
+
+class _SparseBatch:
+    '''Hashed features of a batch of texts, kept as flat (row, column, value) arrays'''
+    def __init__(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray, size: int):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.size = size
+
+
+class TriageClassifier:
+    '''
+    CPU-only triage tier in front of the LLM judge
+
+    Texts are turned into hashed word uni/bi-gram and character tri-gram features (after the same
+    normalization as the prefilter) and scored by a linear model with one logistic head for is_toxic
+    and one per ToxicityCategories member. Everything past feature hashing is vectorized NumPy.
+
+    triage()/triage_many() only answer when the predicted is_toxic probability falls outside
+    {uncertainty_band}; texts inside the band are left to the LLM.
+
+    Parameters:
+    n_features (int): Size of the hashed feature space, must be a power of two | default = 2**18
+    uncertainty_band (tuple[float, float]): Probabilities in (low, high) are considered uncertain | default = (0.1, 0.9)
+    category_threshold (float): Probability above which a category is reported | default = 0.5
+    '''
+    def __init__(
+            self,
+            n_features: int = 2 ** 18,
+            uncertainty_band: tuple[float, float] = (0.1, 0.9),
+            category_threshold: float = 0.5
+        ):
+        if n_features < 2 or n_features & (n_features - 1):
+            raise ValueError('Number of features must be a power of two')
+        low, high = uncertainty_band
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError('Uncertainty band must satisfy 0.0 <= low <= high <= 1.0')
+
+        self.n_features = n_features
+        self.uncertainty_band = (low, high)
+        self.category_threshold = category_threshold
+        self.weights: np.ndarray = np.zeros((n_features, _HEADS), dtype=np.float32)
+        self.bias: np.ndarray = np.zeros(_HEADS, dtype=np.float32)
+        # adagrad accumulators, kept so fit() can resume training on new verdicts
+        self._weight_accumulator: np.ndarray = np.zeros((n_features, _HEADS), dtype=np.float32)
+        self._bias_accumulator: np.ndarray = np.zeros(_HEADS, dtype=np.float32)
+        self.trained_examples: int = 0
+
+    def _hash_features(self, text: str) -> dict[int, float]:
+        '''Return the hashed, L2-normalized feature counts of {text}'''
+        mask: int = self.n_features - 1
+        words: list[str] = normalize_for_matching(text).split()
+        features: list[str] = ['w:' + word for word in words]
+        features += ['b:' + first + ' ' + second for first, second in zip(words, words[1:])]
+        for word in words:
+            padded: str = f' {word} '
+            features += ['c:' + padded[idx:idx + 3] for idx in range(len(padded) - 2)]
+
+        counts: dict[int, float] = {}
+        for feature in features:
+            column: int = zlib.crc32(feature.encode('utf-8')) & mask
+            counts[column] = counts.get(column, 0.0) + 1.0
+        norm: float = sum(value * value for value in counts.values()) ** 0.5
+        if norm:
+            counts = {column: value / norm for column, value in counts.items()}
+        return counts
+
+    def _featurize(self, texts: list[str]) -> _SparseBatch:
+        rows: list[int] = []
+        columns: list[int] = []
+        values: list[float] = []
+        for row, text in enumerate(texts):
+            counts: dict[int, float] = self._hash_features(text)
+            rows.extend([row] * len(counts))
+            columns.extend(counts.keys())
+            values.extend(counts.values())
+        return _SparseBatch(
+            np.asarray(rows, dtype=np.int64),
+            np.asarray(columns, dtype=np.int64),
+            np.asarray(values, dtype=np.float32),
+            len(texts)
+        )
+
+    def _scores(self, batch: _SparseBatch) -> np.ndarray:
+        '''Return the (texts, heads) logits of {batch}'''
+        contributions: np.ndarray = self.weights[batch.columns] * batch.values[:, None]
+        scores: np.ndarray = np.empty((batch.size, _HEADS), dtype=np.float32)
+        for head in range(_HEADS):
+            scores[:, head] = np.bincount(batch.rows, weights=contributions[:, head], minlength=batch.size)
+        return scores + self.bias
+
+    def predict_proba(self, texts: Iterable[str]) -> np.ndarray:
+        '''
+        Return a (texts, 9) float32 array of probabilities: column 0 is is_toxic,
+        column 1 + i is the i-th ToxicityCategories member
+        '''
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, _HEADS), dtype=np.float32)
+        return _sigmoid(self._scores(self._featurize(texts)))
+
+    def fit(
+            self,
+            texts: Iterable[str],
+            results: Iterable[ToxicityResult | dict],
+            epochs: int = 5,
+            learning_rate: float = 0.5,
+            l2: float = 1e-6,
+            batch_size: int = 512,
+            seed: int = 0
+        ) -> 'TriageClassifier':
+        '''
+        Train on {texts} and their LLM verdicts {results} with mini-batch AdaGrad on the logistic loss.
+        Calling fit() again keeps training from the current weights.
+        '''
+        texts = list(texts)
+        labels: np.ndarray = np.asarray([_label(result) for result in results], dtype=np.float32).reshape(-1, _HEADS)
+        if len(texts) != len(labels):
+            raise ValueError('Texts and results must have the same length')
+        if not texts:
+            return self
+
+        batch: _SparseBatch = self._featurize(texts)
+        # row boundaries in the flat feature arrays, so mini-batches can be sliced out cheaply
+        offsets: np.ndarray = np.searchsorted(batch.rows, np.arange(len(texts) + 1))
+        generator: np.random.Generator = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order: np.ndarray = generator.permutation(len(texts))
+            for start in range(0, len(texts), batch_size):
+                chosen: np.ndarray = order[start:start + batch_size]
+                spans: list[np.ndarray] = [np.arange(offsets[row], offsets[row + 1]) for row in chosen]
+                positions: np.ndarray = np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+                local_rows: np.ndarray = np.repeat(np.arange(len(chosen)), [len(span) for span in spans])
+                minibatch = _SparseBatch(local_rows, batch.columns[positions], batch.values[positions], len(chosen))
+                self._step(minibatch, labels[chosen], learning_rate, l2)
+
+        self.trained_examples += len(texts)
+        return self
+
+    def _step(self, batch: _SparseBatch, labels: np.ndarray, learning_rate: float, l2: float) -> None:
+        errors: np.ndarray = (_sigmoid(self._scores(batch)) - labels) / batch.size
+        touched: np.ndarray = np.unique(batch.columns)
+        # X^T @ errors, one bincount per head, restricted to the columns present in the batch
+        gradient: np.ndarray = np.empty((len(touched), _HEADS), dtype=np.float32)
+        local_columns: np.ndarray = np.searchsorted(touched, batch.columns)
+        for head in range(_HEADS):
+            gradient[:, head] = np.bincount(
+                local_columns, weights=batch.values * errors[batch.rows, head], minlength=len(touched)
+            )
+        gradient += l2 * self.weights[touched]
+
+        self._weight_accumulator[touched] += gradient ** 2
+        self.weights[touched] -= learning_rate * gradient / (np.sqrt(self._weight_accumulator[touched]) + 1e-8)
+
+        bias_gradient: np.ndarray = errors.sum(axis=0)
+        self._bias_accumulator += bias_gradient ** 2
+        self.bias -= learning_rate * bias_gradient / (np.sqrt(self._bias_accumulator) + 1e-8)
+
+    def triage_many(self, texts: Iterable[str]) -> list[Optional[ToxicityResult]]:
+        '''
+        Return a ToxicityResult for every text the classifier is confident about and None for the
+        texts whose is_toxic probability falls inside the uncertainty band (send those to the LLM)
+        '''
+        probabilities: np.ndarray = self.predict_proba(texts)
+        low, high = self.uncertainty_band
+        results: list[Optional[ToxicityResult]] = []
+        for row in probabilities:
+            toxic_probability: float = float(row[0])
+            if low < toxic_probability < high:
+                results.append(None)
+                continue
+            is_toxic: bool = toxic_probability >= high
+            categories: list[ToxicityCategories] = []
+            if is_toxic:
+                categories = [
+                    category for category, probability in zip(_CATEGORIES, row[1:])
+                    if probability >= self.category_threshold
+                ]
+            results.append(ToxicityResult(
+                is_toxic=is_toxic,
+                confidence=round(toxic_probability, 4),
+                categories=categories,
+                reason=f'[triage] local classifier verdict (p_toxic={toxic_probability:.3f})'
+            ))
+        return results
+
+    def triage(self, text: str) -> Optional[ToxicityResult]:
+        '''Single-text version of triage_many'''
+        return self.triage_many([text])[0]
+
+    def save(self, path: str) -> None:
+        '''Save weights and configuration to {path} (NumPy .npz)'''
+        config: dict[str, Any] = {
+            'n_features': self.n_features,
+            'uncertainty_band': list(self.uncertainty_band),
+            'category_threshold': self.category_threshold,
+            'trained_examples': self.trained_examples,
+            'categories': [category.value for category in _CATEGORIES],
+        }
+        with open(path, 'wb') as file:
+            np.savez_compressed(
+                file,
+                weights=self.weights,
+                bias=self.bias,
+                weight_accumulator=self._weight_accumulator,
+                bias_accumulator=self._bias_accumulator,
+                config=np.asarray(json.dumps(config))
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'TriageClassifier':
+        '''Load a classifier saved with save()'''
+        with np.load(path) as data:
+            config: dict[str, Any] = json.loads(str(data['config']))
+            if config['categories'] != [category.value for category in _CATEGORIES]:
+                raise ValueError('Saved classifier was trained on a different set of toxicity categories')
+            classifier = cls(
+                n_features=config['n_features'],
+                uncertainty_band=tuple(config['uncertainty_band']),
+                category_threshold=config['category_threshold']
+            )
+            classifier.weights = data['weights'].astype(np.float32)
+            classifier.bias = data['bias'].astype(np.float32)
+            classifier._weight_accumulator = data['weight_accumulator'].astype(np.float32)
+            classifier._bias_accumulator = data['bias_accumulator'].astype(np.float32)
+            classifier.trained_examples = config['trained_examples']
+        return classifier
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return (1.0 / (1.0 + np.exp(-np.clip(values, -30.0, 30.0)))).astype(np.float32)
+
+
+def _label(result: ToxicityResult | dict) -> list[float]:
+    '''Turn a verdict into the target row: is_toxic followed by one flag per category'''
+    if not isinstance(result, ToxicityResult):
+        result = ToxicityResult(**result)
+    present: set[ToxicityCategories] = set(result.categories)
+    return [float(result.is_toxic)] + [float(category in present) for category in _CATEGORIES]
@@ -1,12 +1,65 @@
 # init to show that llm is a module
-from .base import BaseLLMClient
-from .azure_openai import AzureOpenAIClient
-from .gemini import GeminiClient
-from .open_source_openai import OpenAIClient
+# clients are imported on first access, so a process only loads the SDK of the provider it uses
+import importlib
+import importlib.util
 
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .base import BaseLLMClient, MalformedResponseError
+    from .azure_openai import AzureOpenAIClient
+    from .gemini import GeminiClient
+    from .open_source_openai import OpenAIClient
+    from .ratelimit import RateLimitedClient
+    from .replicas import ReplicaCrashedError, TransformersReplicaPool
+    from .router import CircuitOpenError, RouterClient
+    from .transformers_llm import TransformersClient
+    from .transport import HTTPPool
+
+# public name -> module defining it
+_LAZY: dict[str, str] = {
+    'BaseLLMClient': '.base',
+    'MalformedResponseError': '.base',
+    'AzureOpenAIClient': '.azure_openai',
+    'GeminiClient': '.gemini',
+    'OpenAIClient': '.open_source_openai',
+    'HTTPPool': '.transport',
+    'RateLimitedClient': '.ratelimit',
+    'RouterClient': '.router',
+    'CircuitOpenError': '.router',
+    'TransformersClient': '.transformers_llm',
+    'TransformersReplicaPool': '.replicas',
+    'ReplicaCrashedError': '.replicas',
+}
+
+# TransformersClient is left out so that a star import does not load torch
 __all__ = [
     'BaseLLMClient',
+    'MalformedResponseError',
     'AzureOpenAIClient',
     'GeminiClient',
-    'OpenAIClient'
+    'OpenAIClient',
+    'HTTPPool',
+    'RateLimitedClient',
+    'RouterClient',
+    'CircuitOpenError',
+    'TransformersReplicaPool',
+    'ReplicaCrashedError'
 ]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        value: Any = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif not name.startswith('__') and importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        # submodules stay reachable as attributes, as when they were imported eagerly
+        value = importlib.import_module(f'{__name__}.{name}')
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # cache it, later lookups don't go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY))
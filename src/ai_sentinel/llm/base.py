@@ -1,13 +1,43 @@
+import asyncio
+import weakref
+
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
 
 from ai_sentinel.core.models import LLMResponse
+from ai_sentinel.core.runner import close_on_owner_loops, run_sync
+
+if TYPE_CHECKING:
+    # annotations only, so importing the base class does not pull in httpx
+    import httpx
+
+    from ai_sentinel.llm.transport import HTTPPool
+
+
+class MalformedResponseError(ValueError):
+    '''Raised when a provider answered with output that is not what was asked for (no JSON object, unfinished constrained JSON, ...)'''
+
 
 class BaseLLMClient(ABC):
     '''
     Abstract Base Class for LLM Clients
+
+    Clients can be used as (async) context managers, which close their connections on exit.
+
+    Parameters:
+    api_key (str): Provider API key
+    model (str): Model name
+    timeout (Optional[float]): Request timeout in seconds | default = 30.0
+    http_pool (Optional[HTTPPool | httpx.AsyncClient]): Connection pool to share with other clients, or one httpx client used on a single event loop | default = None
     '''
-    def __init__(self, api_key: str, model: str, timeout: Optional[float] = 30.0, **kwargs):
+    def __init__(
+            self,
+            api_key: str,
+            model: str,
+            timeout: Optional[float] = 30.0,
+            http_pool: Optional['HTTPPool | httpx.AsyncClient'] = None,
+            **kwargs
+        ):
         # validate inputs early - fail fast principle
         if not api_key or not isinstance(api_key, str):
             raise ValueError('API key must be a non-empty string')
@@ -20,6 +50,10 @@ class BaseLLMClient(ABC):
         self.model = model
         self.timeout = timeout
         self.kwargs = kwargs
+        self.http_pool = http_pool
+
+        # native async SDK clients, one per event loop (their connection pools are bound to a loop)
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
     @abstractmethod
     async def generate_text_async(
@@ -57,17 +91,28 @@ class BaseLLMClient(ABC):
         Generate a response from LLM based on the prompt and optional inputs (sync wrapper).
         
         This is a synchronous wrapper around the async method that is safe to run
-        in any environment, including Jupyter notebooks.
+        in any environment, including Jupyter notebooks. Calls from every thread are
+        run on one shared background event loop, so connections are reused between calls.
         '''
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+        return run_sync(self.generate_text_async(prompt, system_prompt, context, temperature, **kwargs))
 
-        def run_async_in_thread():
-            return asyncio.run(self.generate_text_async(prompt, system_prompt, context, temperature, **kwargs))
+    async def stream_text_async(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        context: Optional[list[dict[str,str]]] = None,
+        temperature: Optional[float] = 0.7,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        '''
+        Generate a response from LLM and yield its text as it is produced (async generator).
+        Closing the generator early (ex. aclose() or breaking out of the loop) stops the generation
+        where the provider supports it. Takes the same parameters as generate_text_async.
 
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(run_async_in_thread)
-            return future.result()
+        Clients without native streaming fall back to yielding the whole response at once.
+        '''
+        response: LLMResponse = await self.generate_text_async(prompt, system_prompt, context, temperature, **kwargs)
+        yield response.content
 
     @abstractmethod
     async def validate_async(self) -> bool:
@@ -81,15 +126,125 @@ class BaseLLMClient(ABC):
         '''
         Validate the provided API key by making a call to the provider (sync wrapper).
         '''
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+        return run_sync(self.validate_async())
+
+    def structured_output_kwargs(self, schema: type) -> dict:
+        '''
+        Return the generate_text_async keyword arguments that make this client answer with JSON
+        matching the pydantic model {schema} (empty when the client has no structured output support)
+        Clients override this; the default keeps the provider-name convention for other subclasses.
+        '''
+        provider: str = self.provider_name
+        if 'gemini' in provider:
+            return {
+                'response_type': 'application/json',
+                'response_schema': schema
+            }
+        if 'openai' in provider:
+            return {'response_format': schema}
+        return {}
+
+    def _build_messages(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None
+        ) -> list:
+        '''Build the chat messages: optional system prompt, then the context, then the user prompt'''
+        message: list = []
+
+        # check if there is a system prompt given
+        if system_prompt:
+            message.append({
+                'role': 'system',
+                'content': system_prompt
+            })
+
+        # check if there is any context given
+        if context:
+            message.extend(context)
+
+        # finally add the user prompt
+        message.append({
+            'role': 'user',
+            'content': prompt
+        })
+        return message
 
-        def run_async_in_thread():
-            return asyncio.run(self.validate_async())
+    def _create_async_client(self) -> Any:
+        '''Create the provider's native async SDK client, None for clients without one (override in subclasses that have one)'''
+        return None
 
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(run_async_in_thread)
-            return future.result()
+    def _get_async_client(self) -> Any:
+        '''
+        Return the native async SDK client for the running event loop, creating it on first use.
+        None for clients without a native async client. Must be called from inside a coroutine.
+        '''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        client: Any = self._async_clients.get(loop)
+        if client is None:
+            client = self._create_async_client()
+            if client is not None:
+                self._async_clients[loop] = client
+        return client
+
+    def _http_client(self) -> Optional['httpx.AsyncClient']:
+        '''Return the shared httpx client to build the native async client on (None lets the SDK build its own)'''
+        from ai_sentinel.llm.transport import HTTPPool
+
+        if isinstance(self.http_pool, HTTPPool):
+            return self.http_pool.get()
+        return self.http_pool
+
+    async def _close_async_client(self, client: Any) -> None:
+        '''Release the native async client {client} (override in subclasses that have one)'''
+        pass
+
+    async def aclose(self) -> None:
+        '''
+        Close the native async clients and their connections (async)
+        A shared {http_pool} is left open. Clients of another event loop that is still running are
+        closed on that loop, those of loops that are already closed are dropped.
+        '''
+        clients: list[tuple[asyncio.AbstractEventLoop, Any]] = list(self._async_clients.items())
+        self._async_clients.clear()
+        await close_on_owner_loops([
+            (loop, lambda client=client: self._close_async_client(client)) for loop, client in clients
+        ])
+
+    def close(self) -> None:
+        '''Close the native async clients and their connections (sync wrapper)'''
+        run_sync(self.aclose())
+
+    async def __aenter__(self) -> 'BaseLLMClient':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    def __enter__(self) -> 'BaseLLMClient':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def warmup_async(self, connections: int = 1) -> bool:
+        '''
+        Open {connections} connections to the provider ahead of traffic, TLS handshakes included, so the
+        first real requests find them warm in the pool of the running event loop (async)
+        Return True if every warm-up call succeeded
+        '''
+        if connections < 1:
+            raise ValueError('Connections must be at least 1')
+        results: list[bool] = await asyncio.gather(*[self.validate_async() for _ in range(connections)])
+        return all(results)
+
+    def warmup(self, connections: int = 1) -> bool:
+        '''
+        Open {connections} connections to the provider ahead of traffic (sync wrapper)
+        Warms the pool of the shared background loop that serves every sync call.
+        '''
+        return run_sync(self.warmup_async(connections))
 
     @property
     @abstractmethod
@@ -0,0 +1,129 @@
+# dynamic request batching: collect concurrent requests and run them as one batch
+import asyncio
+
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional
+
+
+class _Request:
+    '''One queued request and the future its caller is awaiting'''
+    def __init__(self, payload: Any, future: asyncio.Future, enqueued_at: float, timings: Optional[dict[str, float]] = None):
+        self.payload = payload
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.timings = timings
+
+
+class BatchScheduler:
+    '''
+    Collects concurrent requests on one event loop and hands them to {run_batch} together
+
+    A batch is dispatched once {max_batch_size} requests are waiting or {max_wait_ms} has passed
+    since the first one arrived. {run_batch} is a blocking function taking the list of payloads
+    and returning one output per payload, in order; it runs in {executor} so the loop stays free
+    to keep collecting the next batch while the current one is generating.
+    '''
+    def __init__(
+            self,
+            run_batch: Callable[[list[Any]], list[Any]],
+            executor: Optional[Executor] = None,
+            max_batch_size: int = 8,
+            max_wait_ms: float = 5.0
+        ):
+        if max_batch_size < 1:
+            raise ValueError('Max batch size must be at least 1')
+        if max_wait_ms < 0:
+            raise ValueError('Max wait must not be negative')
+
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_sizes: Counter = Counter()
+        self.max_queue_depth: int = 0
+        self.total_wait_ms: float = 0.0
+        self.requests: int = 0
+
+    async def submit(self, payload: Any, timings: Optional[dict[str, float]] = None) -> Any:
+        '''
+        Queue {payload} for the next batch and return its output
+        If {timings} is given, the milliseconds spent waiting for the batch are stored in it as 'queue'.
+        '''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+        request = _Request(payload, loop.create_future(), loop.time(), timings)
+        self._queue.put_nowait(request)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await request.future
+
+    async def _run(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            batch: list[_Request] = [await self._queue.get()]
+            deadline: float = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining: float = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # callers that gave up while waiting don't take a slot in the batch
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+
+            started_at: float = loop.time()
+            self.batch_sizes[len(batch)] += 1
+            self.requests += len(batch)
+            for request in batch:
+                wait_ms: float = (started_at - request.enqueued_at) * 1000
+                self.total_wait_ms += wait_ms
+                if request.timings is not None:
+                    request.timings['queue'] = wait_ms
+
+            try:
+                outputs: list[Any] = await loop.run_in_executor(
+                    self.executor, self.run_batch, [request.payload for request in batch]
+                )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output)
+
+    @property
+    def queue_depth(self) -> int:
+        '''Number of requests waiting for a batch'''
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def stats(self) -> dict:
+        '''Return queue depth and batch-size histogram counters for tuning'''
+        batches: int = sum(self.batch_sizes.values())
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'batches': batches,
+            'requests': self.requests,
+            'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+            'mean_batch_size': self.requests / batches if batches else 0.0,
+            'mean_queue_wait_ms': self.total_wait_ms / self.requests if self.requests else 0.0,
+        }
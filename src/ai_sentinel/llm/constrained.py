@@ -0,0 +1,357 @@
+# schema-constrained decoding that only lets the model emit valid ToxicityResult JSON
+import re
+
+from typing import Any, Optional
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+from ai_sentinel.guards.toxicity_guard.models import ToxicityCategories
+
+# every element below is a tiny state machine over characters:
+#   start       -> initial state
+#   step(s, ch) -> next state, or None if {ch} is not allowed here
+#   done(s)     -> True if the element may end in state {s}
+#   max_characters -> most characters the element can consume
+
+
+class _Literal:
+    def __init__(self, text: str):
+        self.text = text
+        self.start = 0
+        self.max_characters: int = len(text)
+
+    def step(self, state: int, ch: str) -> Optional[int]:
+        if state < len(self.text) and self.text[state] == ch:
+            return state + 1
+        return None
+
+    def done(self, state: int) -> bool:
+        return state == len(self.text)
+
+
+class _Space:
+    '''Optional run of at most {max_length} spaces'''
+    def __init__(self, max_length: int = 1):
+        self.max_length = max_length
+        self.start = 0
+
+    @property
+    def max_characters(self) -> int:
+        return self.max_length
+
+    def step(self, state: int, ch: str) -> Optional[int]:
+        if ch == ' ' and state < self.max_length:
+            return state + 1
+        return None
+
+    def done(self, state: int) -> bool:
+        return True
+
+
+class _Choice:
+    '''One of a fixed set of bare words (true / false)'''
+    def __init__(self, options: tuple[str, ...]):
+        self.options = options
+        self.start = ''
+        self.max_characters: int = max(len(option) for option in options)
+
+    def step(self, state: str, ch: str) -> Optional[str]:
+        candidate: str = state + ch
+        if any(option.startswith(candidate) for option in self.options):
+            return candidate
+        return None
+
+    def done(self, state: str) -> bool:
+        return state in self.options
+
+
+class _Confidence:
+    '''A number between 0 and 1 with at most {max_decimals} decimals'''
+    def __init__(self, max_decimals: int = 4):
+        self._partial = re.compile(rf'0(\.\d{{0,{max_decimals}}})?|1(\.0{{0,{max_decimals}}})?')
+        self._complete = re.compile(rf'0(\.\d{{1,{max_decimals}}})?|1(\.0{{1,{max_decimals}}})?')
+        self.start = ''
+        self.max_characters: int = 2 + max_decimals
+
+    def step(self, state: str, ch: str) -> Optional[str]:
+        candidate: str = state + ch
+        if self._partial.fullmatch(candidate):
+            return candidate
+        return None
+
+    def done(self, state: str) -> bool:
+        return self._complete.fullmatch(state) is not None
+
+
+class _EnumArray:
+    '''JSON array of distinct strings taken from {options}'''
+    def __init__(self, options: tuple[str, ...]):
+        self.options = options
+        self.start = ('start',)
+        # brackets, every option quoted, and a ", " between them
+        self.max_characters: int = 2 + sum(len(option) + 2 for option in options) + 2 * (len(options) - 1)
+
+    def _open_string(self, used: frozenset) -> tuple:
+        return ('string', '', used)
+
+    def step(self, state: tuple, ch: str) -> Optional[tuple]:
+        phase: str = state[0]
+        if phase == 'start':
+            return ('open', frozenset()) if ch == '[' else None
+        if phase == 'open':
+            if ch == '"':
+                return self._open_string(state[1])
+            return ('end',) if ch == ']' else None
+        if phase == 'string':
+            buffer, used = state[1], state[2]
+            if ch == '"':
+                return ('after', used | {buffer}) if buffer in self.options else None
+            candidate: str = buffer + ch
+            if any(option.startswith(candidate) for option in self.options if option not in used):
+                return ('string', candidate, used)
+            return None
+        if phase == 'after':
+            if ch == ',' and len(state[1]) < len(self.options):
+                return ('comma', state[1])
+            return ('end',) if ch == ']' else None
+        if phase == 'comma':
+            if ch == ' ':
+                return ('space', state[1])
+            return self._open_string(state[1]) if ch == '"' else None
+        if phase == 'space':
+            return self._open_string(state[1]) if ch == '"' else None
+        return None
+
+    def done(self, state: tuple) -> bool:
+        return state[0] == 'end'
+
+
+class _FreeString:
+    '''JSON string of at most {max_length} characters as written (an escape counts two; simple escapes only)'''
+    _ESCAPES: str = '"\\/bfnrt'
+
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self.start = ('start',)
+
+    @property
+    def max_characters(self) -> int:
+        return 2 + self.max_length
+
+    def step(self, state: tuple, ch: str) -> Optional[tuple]:
+        phase: str = state[0]
+        if phase == 'start':
+            return ('in', 0, False) if ch == '"' else None
+        if phase != 'in':
+            return None
+        length, escaped = state[1], state[2]
+        if escaped:
+            return ('in', length + 1, False) if ch in self._ESCAPES else None
+        if ch == '"':
+            return ('end',)
+        if length >= self.max_length or ord(ch) < 0x20:
+            return None
+        if ch == '\\':
+            return ('in', length + 1, True) if length + 2 <= self.max_length else None
+        return ('in', length + 1, False)
+
+    def done(self, state: tuple) -> bool:
+        return state[0] == 'end'
+
+
+class ToxicityJSONGrammar:
+    '''
+    Character-level acceptor for a ToxicityResult JSON object with keys in schema order:
+    {"is_toxic": bool, "confidence": 0..1, "categories": [...], "reason": "..."}
+    The score is left out, ToxicityResult derives it from the confidence. The reason is capped at
+    {max_reason_length} characters of JSON, which keeps the longest object (see max_length) and so
+    the token budget of a constrained generation small.
+    '''
+    def __init__(self, max_reason_length: int = 300):
+        categories: tuple[str, ...] = tuple(category.value for category in ToxicityCategories)
+        self.elements: list[Any] = [
+            _Literal('{'), _Space(), _Literal('"is_toxic":'), _Space(), _Choice(('true', 'false')),
+            _Literal(','), _Space(), _Literal('"confidence":'), _Space(), _Confidence(),
+            _Literal(','), _Space(), _Literal('"categories":'), _Space(), _EnumArray(categories),
+            _Literal(','), _Space(), _Literal('"reason":'), _Space(), _FreeString(max_reason_length),
+            _Space(), _Literal('}'),
+        ]
+
+    @property
+    def start(self) -> tuple:
+        return (0, self.elements[0].start)
+
+    @property
+    def max_length(self) -> int:
+        '''Most characters a complete object can have'''
+        return sum(element.max_characters for element in self.elements)
+
+    def advance(self, state: tuple, text: str) -> Optional[tuple]:
+        '''Feed {text} from {state}, return the new state or None if {text} can't follow'''
+        idx, sub = state
+        for ch in text:
+            while True:
+                if idx >= len(self.elements):
+                    return None
+                element: Any = self.elements[idx]
+                new_sub: Any = element.step(sub, ch)
+                if new_sub is not None:
+                    sub = new_sub
+                    break
+                if not element.done(sub):
+                    return None
+                idx += 1
+                if idx < len(self.elements):
+                    sub = self.elements[idx].start
+        return (idx, sub)
+
+    def is_complete(self, state: tuple) -> bool:
+        '''True once the closing brace of the object has been emitted'''
+        idx, sub = state
+        return idx == len(self.elements) - 1 and self.elements[idx].done(sub)
+
+    def accepts(self, text: str) -> bool:
+        '''True if {text} is a complete object of the grammar'''
+        state: Optional[tuple] = self.advance(self.start, text)
+        return state is not None and self.is_complete(state)
+
+
+def token_strings(tokenizer: Any) -> list[Optional[str]]:
+    '''
+    Return the text every token id adds when appended to a sequence (None for special tokens and
+    for tokens that are only part of a multi-byte character). Decoding after an anchor token keeps
+    the leading space that SentencePiece-style tokenizers drop when decoding a token on its own.
+    '''
+    anchor: list[int] = tokenizer.encode('a', add_special_tokens=False)[:1]
+    base: str = tokenizer.decode(anchor)
+    special: set[int] = set(tokenizer.all_special_ids)
+    strings: list[Optional[str]] = []
+    for token_id in range(len(tokenizer)):
+        if token_id in special:
+            strings.append(None)
+            continue
+        text: str = tokenizer.decode(anchor + [token_id])[len(base):]
+        strings.append(text if text and '\ufffd' not in text else None)
+    return strings
+
+
+class GrammarVocabulary:
+    '''
+    Token strings of a tokenizer (see token_strings) indexed for a grammar: every token is mapped to
+    its first character, and the characters that may come next in a grammar state are worked out once
+    and cached (up to {max_states} states), so finding the legal tokens of a state is one gather over
+    the vocabulary instead of running the grammar on every token. Build one per tokenizer and share it.
+    '''
+    def __init__(self, strings: list[Optional[str]], grammar: Optional[ToxicityJSONGrammar] = None, max_states: int = 1024):
+        self.strings = strings
+        self.grammar = grammar or ToxicityJSONGrammar()
+        self.max_states = max_states
+        first: dict[str, int] = {}
+        for text in strings:
+            if text is not None:
+                first.setdefault(text[0], len(first))
+        self.first_chars: list[str] = list(first)
+        # first character of every token (its index in first_chars), the extra last slot for tokens without text
+        self.first_index: torch.Tensor = torch.tensor(
+            [first[text[0]] if text is not None else len(first) for text in strings], dtype=torch.long
+        )
+        self._allowed: dict[tuple, torch.Tensor] = {}
+
+    def allowed(self, state: tuple) -> torch.Tensor:
+        '''bool mask of the tokens whose first character can follow {state} (the rest of each token still has to be checked)'''
+        chars: Optional[torch.Tensor] = self._allowed.get(state)
+        if chars is None:
+            chars = torch.tensor([self.grammar.advance(state, ch) is not None for ch in self.first_chars] + [False])
+            if len(self._allowed) >= self.max_states:
+                self._allowed.clear()
+            self._allowed[state] = chars
+        return chars[self.first_index]
+
+
+class ToxicityJSONLogitsProcessor(LogitsProcessor):
+    '''
+    Greedy constrained decoding: at every step only the highest-scoring token that keeps each row
+    a valid ToxicityResult JSON prefix is allowed, and once a row's object is closed only eos is.
+    A row for which no token is allowed is stuck: it is ended with eos too, but flagged in {stuck}
+    rather than {complete}, its output is an unfinished object.
+    '''
+    def __init__(
+            self,
+            vocabulary: GrammarVocabulary,
+            eos_token_id: int,
+            top_k: int = 64
+        ):
+        self.vocabulary = vocabulary
+        self.strings = vocabulary.strings
+        self.grammar = vocabulary.grammar
+        self.eos_token_id = eos_token_id
+        self.top_k = top_k
+        self.states: Optional[list[Optional[tuple]]] = None
+        self.complete: Optional[list[bool]] = None
+        self.stuck: Optional[list[bool]] = None
+
+    def _pick(self, state: tuple, row_scores: torch.Tensor) -> tuple[Optional[int], Optional[tuple]]:
+        '''Return the best token allowed from {state} and the state after it'''
+        # most of the time the winner is among the top few candidates
+        token_id, new_state = self._first_legal(state, row_scores, torch.topk(row_scores, min(self.top_k, row_scores.shape[-1])).indices)
+        if token_id is not None:
+            return token_id, new_state
+
+        # otherwise only the tokens starting with a character the grammar allows here are candidates
+        scores: torch.Tensor = row_scores[:len(self.strings)]
+        scores = scores.masked_fill(~self.vocabulary.allowed(state), float('-inf'))
+        legal: int = int(torch.isfinite(scores).sum())
+        if legal == 0:
+            return None, None
+        return self._first_legal(state, scores, torch.topk(scores, legal).indices)
+
+    def _first_legal(self, state: tuple, row_scores: torch.Tensor, candidates: torch.Tensor) -> tuple[Optional[int], Optional[tuple]]:
+        '''Return the first of {candidates} (best first) the grammar accepts from {state}, and the state after it'''
+        for token_id in candidates.tolist():
+            if token_id >= len(self.strings) or row_scores[token_id] == float('-inf'):
+                continue
+            text: Optional[str] = self.strings[token_id]
+            if text is None:
+                continue
+            new_state: Optional[tuple] = self.grammar.advance(state, text)
+            if new_state is not None:
+                return token_id, new_state
+        return None, None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        batch_size: int = scores.shape[0]
+        if self.states is None:
+            self.states = [self.grammar.start] * batch_size
+            self.complete = [False] * batch_size
+            self.stuck = [False] * batch_size
+
+        masked: torch.FloatTensor = torch.full_like(scores, float('-inf'))
+        for row in range(batch_size):
+            state: Optional[tuple] = self.states[row]
+            token_id: Optional[int] = None
+            if state is not None and not self.complete[row]:
+                token_id, state = self._pick(state, scores[row])
+                self.states[row] = state
+                if state is not None and self.grammar.is_complete(state):
+                    self.complete[row] = True
+                elif state is None:
+                    self.stuck[row] = True
+
+            if token_id is None:
+                # finished or stuck: end the row
+                token_id = self.eos_token_id
+            masked[row, token_id] = scores[row, token_id] if scores[row, token_id] != float('-inf') else 0.0
+        return masked
+
+
+class JSONCompleteCriteria(StoppingCriteria):
+    '''Stop each row as soon as its ToxicityResult object is closed, or it got stuck'''
+    def __init__(self, processor: ToxicityJSONLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.processor.complete is None:
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        finished: list[bool] = [complete or stuck for complete, stuck in zip(self.processor.complete, self.processor.stuck)]
+        return torch.tensor(finished, dtype=torch.bool, device=input_ids.device)
@@ -1,5 +1,6 @@
-from typing import Optional, Any
-from datetime import datetime
+import time
+
+from typing import Optional, Any, AsyncIterator
 
 from google import genai
 from google.genai import types, errors
@@ -20,6 +21,22 @@ class GeminiClient(BaseLLMClient):
         super().__init__(api_key, model, timeout, **kwargs)
 
         self.client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=timeout*1000)) 
+
+    def _create_async_client(self) -> genai.Client:
+        '''
+        Create the client whose native async interface (client.aio) is used by the async methods
+        The shared httpx client is only handed over by google-genai versions that accept one.
+        '''
+        options: dict[str, Any] = {'timeout': self.timeout*1000}
+        if 'httpx_async_client' in types.HttpOptions.model_fields:
+            options['httpx_async_client'] = self._http_client()
+        return genai.Client(api_key=self.api_key, http_options=types.HttpOptions(**options))
+
+    async def _close_async_client(self, client: genai.Client) -> None:
+        '''Close {client} (a shared httpx client is left open by the SDK itself, older SDKs have nothing to close)'''
+        aclose = getattr(client.aio, 'aclose', None)
+        if aclose is not None:
+            await aclose()
             
     async def generate_text_async(
             self, 
@@ -34,13 +51,43 @@ class GeminiClient(BaseLLMClient):
             raise ValueError('Prompt must be a non-empty string')
         
         
+        started_at: float = time.perf_counter()
+        config, message = self._build_request(prompt, system_prompt, context, temperature, **kwargs)
+        timings: dict[str, float] = {'prompt_build': (time.perf_counter() - started_at) * 1000}
+
+        started_at = time.perf_counter()
+        response: types.GenerateContentResponse = await self._get_async_client().aio.models.generate_content( # returns 
+            model=self.model,
+            config=config,
+            contents=message,
+        )
+        timings['generation'] = (time.perf_counter() - started_at) * 1000
+
+        formatted_response: LLMResponse = self._format_llm_response(response, timings)
+        return formatted_response
+    
+    def structured_output_kwargs(self, schema: type) -> dict:
+        return {
+            'response_type': 'application/json',
+            'response_schema': schema
+        }
+
+    def _build_request(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = None,
+            **kwargs
+        ) -> tuple[Optional[types.GenerateContentConfig], list]:
+        '''Build the generation config and the contents (context, then the user prompt) of a request'''
         response_type: Optional[str] = kwargs.get('response_type')
         response_schema: Optional[Any] = kwargs.get('response_schema')
         if (not response_schema) ^ (not response_type): # ^ stands for xor operator
             raise ValueError('Response Schema and Response Type must both be passed if one is present')
 
         message: list = []
-        config = None
+        config: Optional[types.GenerateContentConfig] = None
 
         # check if there is a system prompt given
         if system_prompt or temperature or response_schema:
@@ -62,20 +109,36 @@ class GeminiClient(BaseLLMClient):
             )
         )
 
-        response_start_time: datetime = datetime.utcnow()
-        response: types.GenerateContentResponse = self.client.models.generate_content( # returns 
+        return config, message
+
+    async def stream_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = None,
+            **kwargs # supply response format in kwargs
+        ) -> AsyncIterator[str]:
+
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError('Prompt must be a non-empty string')
+
+        config, message = self._build_request(prompt, system_prompt, context, temperature, **kwargs)
+        stream: Any = await self._get_async_client().aio.models.generate_content_stream(
             model=self.model,
             config=config,
             contents=message,
         )
-        if not response.create_time: # gemini keeps not returning shit
-            response.create_time = response_start_time
+        try:
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # closing the response stream ends the generation early
+            await stream.aclose()
 
-        formatted_response: LLMResponse = self._format_llm_response(response)
-        return formatted_response
-    
-    def _format_llm_response(self, response: types.GenerateContentResponse) -> LLMResponse:
-        '''Convert response to built in Model type to a response type of LLMResponse'''
+    def _format_llm_response(self, response: types.GenerateContentResponse, timings: dict[str, float]) -> LLMResponse:
+        '''Convert response to built in Model type to a response type of LLMResponse, {timings} in ms per stage'''
         output: LLMResponse = LLMResponse(
             content=response.text,
             model = response.model_version
@@ -85,17 +148,16 @@ class GeminiClient(BaseLLMClient):
             'prompt_tokens': response.usage_metadata.prompt_token_count,
             'total_tokens': response.usage_metadata.total_token_count,
         }
-        if response.create_time:
-            output.response_time_ms = output.timestamp.timestamp() - response.create_time.timestamp()
-        else:
-            output.response_time_ms = 0.0
+        # measured locally, gemini does not always return create_time
+        output.response_time_ms = timings['generation']
+        output.timings = timings
         output.finish_reason = response.candidates[0].finish_reason.name
         return output
     
     async def validate_async(self) -> bool:
         # make a simple API call
         try:
-            self.client.models.list()
+            await self._get_async_client().aio.models.list()
             return True
         except errors.APIError as e: # should I be catching these errors?
             print(f'API key is invalid or general Gemini API Error occured: {e}')
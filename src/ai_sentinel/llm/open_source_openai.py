@@ -1,6 +1,8 @@
-from typing import Optional, Any
+import time
 
-from openai import OpenAI
+from typing import Optional, Any, AsyncIterator
+
+from openai import OpenAI, AsyncOpenAI
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.parsed_chat_completion import ParsedChatCompletion
 
@@ -34,6 +36,20 @@ class OpenAIClient(BaseLLMClient):
             timeout=self.timeout
         )
 
+    def _create_async_client(self) -> AsyncOpenAI:
+        '''Create the native async client used by the async methods'''
+        return AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            timeout=self.timeout,
+            http_client=self._http_client()
+        )
+
+    async def _close_async_client(self, client: AsyncOpenAI) -> None:
+        '''Close {client}, unless it runs on a shared pool that outlives this client'''
+        if self.http_pool is None:
+            await client.close()
+
     async def generate_text_async(
             self, 
             prompt: str, 
@@ -48,46 +64,62 @@ class OpenAIClient(BaseLLMClient):
         
         response_format: Optional[Any] = kwargs.get('response_format')
 
-        message: list = []
+        started_at: float = time.perf_counter()
+        message: list = self._build_messages(prompt, system_prompt, context)
+        timings: dict[str, float] = {'prompt_build': (time.perf_counter() - started_at) * 1000}
         response = None
 
-        # check if there is a system prompt given
-        if system_prompt:
-            message.append({
-                'role': 'system',
-                'content': system_prompt
-            })
-        
-        # check if there is any context given
-        if context:
-            message.extend(context)
-        
-        # finally add the user prompt
-        message.append({
-            'role': 'user',
-            'content': prompt
-        })
-        
+        started_at = time.perf_counter()
         if response_format:
             # use parse instead of create bc using structured output 
-            response: ParsedChatCompletion = self.client.chat.completions.parse(
+            response: ParsedChatCompletion = await self._get_async_client().chat.completions.parse(
                 model=self.model,
                 messages=message,
                 temperature=temperature,
                 response_format=response_format
             )
         else:
-            response: ChatCompletion = self.client.chat.completions.create(
+            response: ChatCompletion = await self._get_async_client().chat.completions.create(
                 model=self.model,
                 messages=message,
                 temperature=temperature
             )
+        timings['generation'] = (time.perf_counter() - started_at) * 1000
 
-        formatted_response: LLMResponse = self._format_llm_response(response)
+        formatted_response: LLMResponse = self._format_llm_response(response, timings)
         return formatted_response
 
-    def _format_llm_response(self, response: ChatCompletion | ParsedChatCompletion) -> LLMResponse:
-        '''Convert response to built in Model type to a response type of LLMResponse'''
+    def structured_output_kwargs(self, schema: type) -> dict:
+        return {'response_format': schema}
+
+    async def stream_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = 0.0,
+            **kwargs # supply response format in kwargs
+        ) -> AsyncIterator[str]:
+
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError('Prompt must be a non-empty string')
+
+        response_format: Optional[Any] = kwargs.get('response_format')
+        options: dict = {'response_format': response_format} if response_format else {}
+
+        # leaving the block closes the HTTP stream, which ends the generation early
+        async with self._get_async_client().chat.completions.stream(
+            model=self.model,
+            messages=self._build_messages(prompt, system_prompt, context),
+            temperature=temperature,
+            **options
+        ) as stream:
+            async for event in stream:
+                if event.type == 'content.delta' and event.delta:
+                    yield event.delta
+
+    def _format_llm_response(self, response: ChatCompletion | ParsedChatCompletion, timings: dict[str, float]) -> LLMResponse:
+        '''Convert response to built in Model type to a response type of LLMResponse, {timings} in ms per stage'''
 
         output: LLMResponse = LLMResponse(
             content= response.choices[0].message.content,
@@ -99,14 +131,15 @@ class OpenAIClient(BaseLLMClient):
             'total_tokens': response.usage.total_tokens,
         }
 
-        output.response_time_ms = output.timestamp.timestamp() - response.created
+        output.response_time_ms = timings['generation']
+        output.timings = timings
         output.finish_reason = response.choices[0].finish_reason
         return output
     
     async def validate_async(self) -> bool:
         # make a simple API call
         try:
-            self.client.models.list()
+            await self._get_async_client().models.list()
             # if call is successful then the key is valid
             return True
         
@@ -0,0 +1,414 @@
+# client wrapper that keeps requests under the provider's rate limits
+import asyncio
+import math
+import random
+import threading
+import time
+
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Optional
+
+from ai_sentinel.core.models import LLMResponse
+from ai_sentinel.core.tokens import estimate_tokens
+from ai_sentinel.llm.base import BaseLLMClient
+
+# status codes worth retrying: rate limited, overloaded or a transient server error
+_RETRY_STATUS: frozenset[int] = frozenset({429, 500, 502, 503, 504, 529})
+
+
+class TokenBucket:
+    '''
+    Token bucket refilled at {per_minute} units per minute, holding at most {burst} units
+
+    Callers reserve what they need up front and are told how long to wait for it; the level may
+    go negative, which queues later callers behind earlier ones without any wake-up bookkeeping.
+    Thread-safe, so one bucket can be shared by clients on different event loops.
+    '''
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        if per_minute <= 0:
+            raise ValueError('Rate per minute must be positive')
+        self.rate: float = per_minute / 60.0
+        self.capacity: float = burst if burst is not None else per_minute
+        self.level: float = self.capacity
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now: float = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        '''Take {amount} units and return how many seconds to wait before they are covered'''
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        '''Give back (positive) or charge (negative) {amount} units, ex. once the real usage is known'''
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds: float) -> None:
+        '''Hand out nothing for the next {seconds} (ex. the provider sent Retry-After)'''
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+
+class AdaptiveConcurrency:
+    '''
+    Concurrency limit adjusted AIMD-style: every success adds about one slot per limit's worth of
+    requests (additive increase), a 429 or timeout multiplies the limit by {decrease} (multiplicative
+    decrease). Like TCP, only requests started after the last decrease can trigger the next one, so
+    a burst of errors from one window of requests counts once.
+
+    Works across event loops: a released slot is handed to the next waiter on its own loop.
+    '''
+    def __init__(
+            self,
+            initial: int,
+            minimum: int = 1,
+            maximum: int = 64,
+            decrease: float = 0.5
+        ):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Concurrency must satisfy 1 <= minimum <= initial <= maximum')
+        if not 0.0 < decrease < 1.0:
+            raise ValueError('Decrease must be between 0.0 and 1.0')
+        self.limit: float = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight: int = 0
+        self._last_decrease: float = -math.inf
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        '''Wait for a slot'''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return
+            future: asyncio.Future = loop.create_future()
+            self._waiters.append((loop, future))
+            # waiters that gave up may be queued ahead of us while slots are free
+            self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just as we were cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        '''Give a slot back'''
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_congestion(self, started_at: float) -> None:
+        '''Shrink the limit after a request started at {started_at} (time.monotonic()) hit a 429 or timeout'''
+        with self._lock:
+            if started_at >= self._last_decrease:
+                self.limit = max(float(self.minimum), self.limit * self.decrease)
+                self._last_decrease = time.monotonic()
+
+    def _wake(self) -> None:
+        # called with the lock held
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._hand_over, future)
+            except RuntimeError:
+                # the waiter's loop is gone
+                self.in_flight -= 1
+
+    def _hand_over(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class RateLimitedClient(BaseLLMClient):
+    '''
+    Wrapper around any client that keeps it at the provider's quota without retry storms
+
+    Requests are metered by a requests-per-minute and a tokens-per-minute bucket. Token cost is
+    estimated from the prompt plus {expected_output_tokens} before the call and corrected with the
+    usage the provider reports (for streams, with an estimate of the streamed text); calls that fail
+    or are cancelled, even while still waiting on the limits, give it back. Concurrency adapts AIMD-style, shrinking on 429s and timeouts and
+    growing back while calls succeed. A Retry-After header pauses both buckets for every caller.
+    429s, timeouts and transient server errors are retried up to {max_retries} times, with
+    jittered exponential backoff when the provider gives no Retry-After.
+    The wrapper reports the inner client's provider and model, so guards structure output the same way.
+    Time spent waiting on the limits is added to the response's timings as 'queue', sleeps
+    between retries as 'backoff'.
+
+    Note: the OpenAI SDK also retries on its own (2 times by default) before an error gets here.
+
+    Parameters:
+    client (BaseLLMClient): Client to wrap
+    requests_per_minute (Optional[float]): Request quota, None for no limit | default = None
+    tokens_per_minute (Optional[float]): Token quota, None for no limit | default = None
+    max_concurrency (int): Upper bound of the adaptive concurrency limit | default = 32
+    min_concurrency (int): Lower bound of the adaptive concurrency limit | default = 1
+    initial_concurrency (Optional[int]): Starting limit, defaults to max_concurrency | default = None
+    max_retries (int): Retries of a failed call | default = 3
+    expected_output_tokens (int): Output tokens assumed per call until the real usage is known | default = 256
+    backoff_base (float): First backoff in seconds, doubled on every retry | default = 0.5
+    backoff_max (float): Longest backoff in seconds | default = 20.0
+    '''
+    def __init__(
+            self,
+            client: BaseLLMClient,
+            requests_per_minute: Optional[float] = None,
+            tokens_per_minute: Optional[float] = None,
+            max_concurrency: int = 32,
+            min_concurrency: int = 1,
+            initial_concurrency: Optional[int] = None,
+            max_retries: int = 3,
+            expected_output_tokens: int = 256,
+            backoff_base: float = 0.5,
+            backoff_max: float = 20.0
+        ):
+        super().__init__(client.api_key, client.model, client.timeout)
+        if max_retries < 0 or expected_output_tokens < 0:
+            raise ValueError('Max retries and expected output tokens must not be negative')
+
+        self.client: BaseLLMClient = client
+        self.requests: Optional[TokenBucket] = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens: Optional[TokenBucket] = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(
+            initial_concurrency or max_concurrency,
+            minimum=min_concurrency,
+            maximum=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.expected_output_tokens = expected_output_tokens
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.retries: int = 0
+        self.throttled: int = 0
+        self.failures: int = 0
+
+    async def generate_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = 0.0,
+            **kwargs
+        ) -> LLMResponse:
+        estimate: int = self._estimate(prompt, system_prompt, context)
+        attempt: int = 0
+        # time spent waiting on the limiter and sleeping between retries, reported with the response
+        queued_ms: float = 0.0
+        backoff_ms: float = 0.0
+        while True:
+            started_at: float = time.monotonic()
+            await self._admit(estimate)
+            queued_ms += (time.monotonic() - started_at) * 1000
+            started_at = time.monotonic()
+            settled: bool = False
+            try:
+                response: LLMResponse = await self.client.generate_text_async(
+                    prompt, system_prompt, context, temperature, **kwargs
+                )
+            except Exception as e:
+                delay: Optional[float] = self._on_error(e, attempt, started_at)
+                if delay is None or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+            else:
+                self.concurrency.on_success()
+                self._correct(estimate, response)
+                settled = True
+                response.timings['queue'] = response.timings.get('queue', 0.0) + queued_ms
+                if backoff_ms:
+                    response.timings['backoff'] = backoff_ms
+                return response
+            finally:
+                # failed or cancelled: assume the tokens were not spent, a retry reserves them again
+                if not settled and self.tokens is not None:
+                    self.tokens.adjust(estimate)
+                self.concurrency.release()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+            backoff_ms += delay * 1000
+
+    async def stream_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = 0.0,
+            **kwargs
+        ) -> AsyncIterator[str]:
+        # metered like generate_text_async but not retried, chunks may already have been handed out
+        estimate: int = self._estimate(prompt, system_prompt, context)
+        await self._admit(estimate)
+        started_at: float = time.monotonic()
+        streamed: list[str] = []
+        try:
+            async for chunk in self.client.stream_text_async(prompt, system_prompt, context, temperature, **kwargs):
+                streamed.append(chunk)
+                yield chunk
+        except Exception as e:
+            self._on_error(e, 0, started_at)
+            self.failures += 1
+            raise
+        else:
+            self.concurrency.on_success()
+        finally:
+            # streams report no usage: once output arrived the prompt was spent, so swap the expected
+            # output for an estimate of what was streamed; nothing streamed (failed, cancelled or
+            # closed early) gives the whole reservation back
+            if self.tokens is not None:
+                if streamed:
+                    self.tokens.adjust(self.expected_output_tokens - estimate_tokens(''.join(streamed)))
+                else:
+                    self.tokens.adjust(estimate)
+            self.concurrency.release()
+
+    async def _admit(self, estimate: int) -> None:
+        '''Wait for the request and token budget, then for a concurrency slot (the budget is given back if cancelled meanwhile)'''
+        wait: float = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimate))
+        try:
+            if wait > 0:
+                self.throttled += 1
+                await asyncio.sleep(wait)
+            await self.concurrency.acquire()
+        except asyncio.CancelledError:
+            if self.requests is not None:
+                self.requests.adjust(1)
+            if self.tokens is not None:
+                self.tokens.adjust(estimate)
+            raise
+
+    def _estimate(self, prompt: str, system_prompt: Optional[str], context: Optional[list[dict[str,str]]]) -> int:
+        '''Estimate the tokens a call will cost: prompt, system prompt, context and the expected output'''
+        tokens: int = estimate_tokens(prompt) + estimate_tokens(system_prompt or '') + self.expected_output_tokens
+        for message in context or []:
+            content: Any = message.get('content') if isinstance(message, dict) else None
+            if isinstance(content, str):
+                tokens += estimate_tokens(content)
+        return tokens
+
+    def _correct(self, estimate: int, response: LLMResponse) -> None:
+        '''Settle the token reservation with the usage the provider reported'''
+        if self.tokens is None or not response.usage:
+            return
+        used: Any = response.usage.get('total_tokens')
+        if isinstance(used, (int, float)):
+            self.tokens.adjust(estimate - used)
+
+    def _on_error(self, error: Exception, attempt: int, started_at: float) -> Optional[float]:
+        '''
+        Update the limits after failed attempt {attempt} ({error}) started at {started_at}
+        Return the delay before retrying, or None if the error is not retryable
+        '''
+        status: Optional[int] = _status_code(error)
+        timed_out: bool = isinstance(error, (TimeoutError, asyncio.TimeoutError)) or 'Timeout' in type(error).__name__
+        if status not in _RETRY_STATUS and not timed_out:
+            return None
+
+        if status == 429 or timed_out:
+            self.concurrency.on_congestion(started_at)
+        retry_after: Optional[float] = _retry_after(error)
+        if retry_after is not None:
+            # everyone waits, not only this caller
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.pause(retry_after)
+            return retry_after
+        # full jitter keeps the retries of a burst from lining up again
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def structured_output_kwargs(self, schema: type) -> dict:
+        return self.client.structured_output_kwargs(schema)
+
+    async def validate_async(self) -> bool:
+        return await self.client.validate_async()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    @property
+    def provider_name(self) -> str:
+        return self.client.provider_name
+
+    @property
+    def stats(self) -> dict:
+        '''Return the current concurrency limit and retry/throttle counters'''
+        return {
+            'concurrency_limit': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'failures': self.failures,
+        }
+
+    @property
+    def info(self) -> dict:
+        basic_info = self.client.info
+        basic_info['rate_limit'] = {
+            'requests_per_minute': self.requests.rate * 60 if self.requests else None,
+            'tokens_per_minute': self.tokens.rate * 60 if self.tokens else None,
+            'max_concurrency': self.concurrency.maximum,
+        }
+        return basic_info
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    '''HTTP status of a provider error (openai uses status_code, google-genai uses code)'''
+    for attribute in ('status_code', 'code'):
+        value: Any = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response: Any = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    '''Seconds to wait according to the Retry-After(-ms) header of the error's response, if any'''
+    headers: Any = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+        value: Optional[str] = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP date form
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,443 @@
+# multi-process model replicas for TransformersClient
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+from concurrent.futures import Future, InvalidStateError
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+# torch and transformers are only imported inside the replica processes, after their thread
+# settings are in place; the parent needs neither to run the pool
+
+_THREAD_VARIABLES: tuple[str, ...] = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+class ReplicaCrashedError(RuntimeError):
+    '''Raised for the requests a replica had been sent when its process died'''
+
+
+class _Pending:
+    '''One dispatched request and the future its caller is awaiting'''
+    def __init__(self, request_id: int, payload: tuple, future: Future):
+        self.request_id = request_id
+        self.payload = payload
+        self.future = future
+        self.dispatched_at: float = time.perf_counter()
+
+
+class _Replica:
+    '''Parent-side state of one replica process'''
+    def __init__(self, slot: int, cores: Optional[list[int]], window: int):
+        self.slot = slot
+        self.cores = cores
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.requests: Optional[Connection] = None
+        self.results: Optional[Connection] = None
+        # requests waiting for the sender thread, and those sent to the process
+        self.outbox: queue.SimpleQueue = queue.SimpleQueue()
+        self.in_flight: dict[int, _Pending] = {}
+        # at most {window} requests are sent ahead, the rest stay queued where a cancelled one is dropped
+        self.window = threading.Semaphore(window)
+        self.load: int = 0
+        self.ready = threading.Event()
+        # whether the process runs on the shared mapped weights, None until it is ready
+        self.mapped_weights: Optional[bool] = None
+        self.dead: bool = False
+        self.completed: int = 0
+        self.failed: int = 0
+        self.restarts: int = 0
+
+
+def _settle(future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    '''Resolve {future} unless its caller already gave up on it'''
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _serve_replica(model: str, options: dict, threads: int, cores: Optional[list[int]], max_batch_size: int, requests: Connection, results: Connection) -> None:
+    '''Entry point of a replica process: pin its threads, load the model, answer requests until told to stop'''
+    for name in _THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+        from ai_sentinel.llm.transformers_llm import TransformersClient
+
+        client = TransformersClient(model, **options)
+    except Exception:
+        results.send(('failed', traceback.format_exc()))
+        return
+    results.send(('ready', client.mapped_weights))
+
+    while True:
+        try:
+            batch: list = [requests.recv()]
+        except EOFError:
+            return
+        # take whatever else is already waiting, up to a full batch
+        while batch[-1] is not None and len(batch) < max_batch_size and requests.poll():
+            batch.append(requests.recv())
+        stop: bool = batch[-1] is None
+        batch = [item for item in batch if item is not None]
+
+        if batch:
+            started_at: float = time.perf_counter()
+            try:
+                outputs: list = client._generate_batch([payload for _, payload in batch])
+                replies: list[tuple] = [('result', request_id, output) for (request_id, _), output in zip(batch, outputs)]
+            except Exception as e:
+                replies = [('error', request_id, e) for request_id, _ in batch]
+            generation_ms: float = (time.perf_counter() - started_at) * 1000
+            for reply in replies:
+                try:
+                    results.send(reply + (generation_ms,))
+                except Exception:
+                    # the exception could not be pickled, send its text instead
+                    results.send(('error', reply[1], RuntimeError(f'{type(reply[2]).__name__}: {reply[2]}'), generation_ms))
+        if stop:
+            return
+
+
+class TransformersReplicaPool:
+    '''
+    Runs {replicas} copies of a Transformers model in separate processes and spreads requests over them
+
+    Each replica is a spawned process with {threads_per_replica} torch threads (the available
+    cores divided by {replicas} by default) and, with {pin_cores}, bound to its own cores, so the
+    replicas neither share a GIL nor fight over cores. With {shared_weights} the replicas map the
+    safetensors weights read-only instead of loading them, so the weights are held once however
+    many replicas run (see llm.weights); a replica that cannot map them loads a copy, which shows
+    in {stats}.
+
+    Requests go to the replica with the fewest requests outstanding. A replica batches whatever
+    requests are waiting when it finishes the previous ones (up to {max_batch_size}); at most two
+    batches' worth are sent ahead to it, the others wait in the parent and are dropped if their
+    caller is cancelled first. When a
+    replica process dies its outstanding requests fail with ReplicaCrashedError and it is
+    restarted; after {max_restarts} failed restarts in a row it is given up.
+
+    The replicas are started with the 'spawn' method, so scripts creating a pool need the usual
+    if __name__ == '__main__' guard of multiprocessing.
+
+    Parameters:
+    model (str): Model name or local path, as for TransformersClient
+    replicas (int): Number of replica processes
+    threads_per_replica (Optional[int]): Torch threads of each replica | default = None
+    pin_cores (bool): Bind each replica to its own cores where the OS allows it (Linux) | default = True
+    shared_weights (bool): Map safetensors weights shared between replicas instead of loading a copy each | default = True
+    max_batch_size (int): Most requests a replica generates in one call | default = 1
+    client_options (Optional[dict]): TransformersClient options of the replicas (prefix_cache, constrained_json, ...) | default = None
+    startup_timeout (float): Seconds a replica may take to load the model | default = 600.0
+    max_restarts (int): Failed restarts in a row before a replica is given up | default = 3
+    '''
+    def __init__(
+            self,
+            model: str,
+            replicas: int,
+            threads_per_replica: Optional[int] = None,
+            pin_cores: bool = True,
+            shared_weights: bool = True,
+            max_batch_size: int = 1,
+            client_options: Optional[dict] = None,
+            startup_timeout: float = 600.0,
+            max_restarts: int = 3
+        ):
+        if replicas < 1:
+            raise ValueError('Replicas must be at least 1')
+        if threads_per_replica is not None and threads_per_replica < 1:
+            raise ValueError('Threads per replica must be at least 1')
+        if max_batch_size < 1:
+            raise ValueError('Max batch size must be at least 1')
+        if startup_timeout <= 0 or max_restarts < 0:
+            raise ValueError('Startup timeout must be positive and max restarts must not be negative')
+
+        cores: list[int] = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        self.model = model
+        self.replicas = replicas
+        self.threads_per_replica: int = threads_per_replica or max(1, len(cores) // replicas)
+        self.pin_cores = pin_cores and self.threads_per_replica * replicas <= len(cores)
+        self.shared_weights = shared_weights
+        self.max_batch_size = max_batch_size
+        self.client_options: dict = {**(client_options or {}), 'mmap_weights': shared_weights}
+        self.startup_timeout = startup_timeout
+        self.max_restarts = max_restarts
+
+        self._context = multiprocessing.get_context('spawn')
+        self._replicas: list[_Replica] = [
+            _Replica(
+                slot,
+                cores[slot * self.threads_per_replica:(slot + 1) * self.threads_per_replica] if self.pin_cores else None,
+                2 * max_batch_size
+            )
+            for slot in range(replicas)
+        ]
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._rotation = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self._started: bool = False
+        self._closed: bool = False
+
+    def start(self) -> None:
+        '''Start every replica and wait until all of them have loaded the model'''
+        if self._started:
+            return
+        if self.shared_weights:
+            # download once here rather than racing N downloads in the replicas
+            from ai_sentinel.llm.weights import safetensors_files
+
+            safetensors_files(self.model)
+
+        for replica in self._replicas:
+            self._spawn(replica)
+        try:
+            for replica in self._replicas:
+                self._await_ready(replica)
+        except BaseException:
+            self.close()
+            raise
+
+        self._started = True
+        for replica in self._replicas:
+            for target in (self._send_loop, self._receive_loop):
+                thread = threading.Thread(target=target, args=(replica,), name=f'ai-sentinel-replica-{replica.slot}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    async def generate_async(self, payload: tuple, timings: Optional[dict[str, float]] = None) -> str:
+        '''
+        Generate the completion of {payload} ((message, temperature), as TransformersClient._generate takes it)
+        on the least-loaded replica. If {timings} is given, the milliseconds the request waited for
+        its replica are stored in it as 'queue'.
+        '''
+        pending: _Pending = self.submit(payload)
+        output, generation_ms = await asyncio.wrap_future(pending.future)
+        if timings is not None:
+            timings['queue'] = max(0.0, (time.perf_counter() - pending.dispatched_at) * 1000 - generation_ms)
+        return output
+
+    def submit(self, payload: tuple) -> _Pending:
+        '''Queue {payload} on the least-loaded replica and return its pending request'''
+        if self._closed:
+            raise RuntimeError('The replica pool is closed')
+        if not self._started:
+            self.start()
+        with self._lock:
+            alive: list[_Replica] = [replica for replica in self._replicas if not replica.dead]
+            if not alive:
+                raise RuntimeError('Every replica of the pool has been given up')
+            # rotate the starting point so ties do not all land on the first replica
+            offset: int = next(self._rotation) % len(alive)
+            replica: _Replica = min(alive[offset:] + alive[:offset], key=lambda candidate: candidate.load)
+            replica.load += 1
+        pending = _Pending(next(self._request_ids), payload, Future())
+        replica.outbox.put(pending)
+        return pending
+
+    @property
+    def stats(self) -> list[dict]:
+        '''State of every replica: process id, whether it is running, load, completed and failed requests, restarts, whether it maps the shared weights'''
+        with self._lock:
+            return [
+                {
+                    'slot': replica.slot,
+                    'pid': replica.process.pid if replica.process is not None else None,
+                    'running': replica.ready.is_set(),
+                    'dead': replica.dead,
+                    'load': replica.load,
+                    'completed': replica.completed,
+                    'failed': replica.failed,
+                    'restarts': replica.restarts,
+                    'mapped_weights': replica.mapped_weights,
+                    'cores': replica.cores,
+                }
+                for replica in self._replicas
+            ]
+
+    def close(self) -> None:
+        '''Stop every replica; requests still outstanding fail'''
+        if self._closed:
+            return
+        self._closed = True
+        for replica in self._replicas:
+            replica.outbox.put(None)
+            replica.ready.set()
+            try:
+                replica.requests.send(None)
+            except Exception:
+                pass
+        for replica in self._replicas:
+            if replica.process is not None:
+                replica.process.join(timeout=5)
+                if replica.process.is_alive():
+                    replica.process.terminate()
+                    replica.process.join()
+            # the results pipe is left to the receiver thread, which stops at its EOF
+            if replica.requests is not None:
+                replica.requests.close()
+            self._fail(replica, RuntimeError('The replica pool is closed'), queued=True)
+
+    def _spawn(self, replica: _Replica) -> None:
+        '''Start the process of {replica} (without waiting for it to load the model)'''
+        requests_reader, requests_writer = self._context.Pipe(duplex=False)
+        results_reader, results_writer = self._context.Pipe(duplex=False)
+        replica.process = self._context.Process(
+            target=_serve_replica,
+            args=(self.model, self.client_options, self.threads_per_replica, replica.cores, self.max_batch_size, requests_reader, results_writer),
+            name=f'ai-sentinel-replica-{replica.slot}',
+            daemon=True
+        )
+        replica.process.start()
+        # keep only our ends, so a dead process shows up as EOF on the results pipe
+        requests_reader.close()
+        results_writer.close()
+        replica.requests, replica.results = requests_writer, results_reader
+
+    def _await_ready(self, replica: _Replica) -> None:
+        '''Wait until {replica} has loaded the model, raise RuntimeError if it fails or takes too long'''
+        deadline: float = time.monotonic() + self.startup_timeout
+        while not replica.results.poll(0.1):
+            if not replica.process.is_alive() or time.monotonic() > deadline:
+                replica.process.terminate()
+                raise RuntimeError(f'Replica {replica.slot} did not start')
+        try:
+            kind, detail = replica.results.recv()
+        except EOFError:
+            raise RuntimeError(f'Replica {replica.slot} did not start') from None
+        if kind != 'ready':
+            raise RuntimeError(f'Replica {replica.slot} failed to load {self.model}:\n{detail}')
+        replica.mapped_weights = detail
+        replica.ready.set()
+
+    def _send_loop(self, replica: _Replica) -> None:
+        '''Forward the queued requests of {replica} to its process (blocking sends stay off the event loop)'''
+        while True:
+            pending: Optional[_Pending] = replica.outbox.get()
+            if pending is None or self._closed:
+                return
+            replica.ready.wait()
+            replica.window.acquire()
+            if replica.dead or self._closed:
+                replica.window.release()
+                self._finish(replica, pending, error=RuntimeError(f'Replica {replica.slot} has been given up'))
+                continue
+            if pending.future.cancelled():
+                # the caller gave up while the request was queued, don't spend a generation on it
+                replica.window.release()
+                with self._lock:
+                    replica.load -= 1
+                continue
+            with self._lock:
+                replica.in_flight[pending.request_id] = pending
+                connection: Connection = replica.requests
+            try:
+                connection.send((pending.request_id, pending.payload))
+            except (OSError, ValueError):
+                # the process died before it got the request, send it again once it is back
+                self._take_in_flight(replica, pending.request_id)
+                replica.outbox.put(pending)
+                # give the receiver time to notice the death and clear {ready}
+                time.sleep(0.05)
+
+    def _receive_loop(self, replica: _Replica) -> None:
+        '''Route the answers of {replica} to their callers, restart its process when it dies'''
+        while not self._closed:
+            try:
+                kind, request_id, value, generation_ms = replica.results.recv()
+            except (EOFError, OSError):
+                if self._closed:
+                    replica.results.close()
+                    return
+                self._restart(replica)
+                if replica.dead:
+                    return
+                continue
+
+            pending: Optional[_Pending] = self._take_in_flight(replica, request_id)
+            if pending is None:
+                continue
+            if kind == 'result':
+                self._finish(replica, pending, result=(value, generation_ms))
+            else:
+                self._finish(replica, pending, error=value)
+
+    def _restart(self, replica: _Replica) -> None:
+        '''Fail what {replica} was running and start a new process in its place'''
+        replica.ready.clear()
+        replica.process.join(timeout=5)
+        self._fail(replica, ReplicaCrashedError(f'Replica {replica.slot} died (exit code {replica.process.exitcode})'))
+        for connection in (replica.requests, replica.results):
+            connection.close()
+
+        for attempt in range(self.max_restarts):
+            if self._closed:
+                return
+            try:
+                self._spawn(replica)
+                self._await_ready(replica)
+                with self._lock:
+                    replica.restarts += 1
+                return
+            except RuntimeError:
+                for connection in (replica.requests, replica.results):
+                    connection.close()
+                time.sleep(min(2 ** attempt, 30))
+        with self._lock:
+            replica.dead = True
+        # wake the sender so it fails what is still queued
+        replica.ready.set()
+
+    def _fail(self, replica: _Replica, error: BaseException, queued: bool = False) -> None:
+        '''Fail the requests {replica} had been sent (and, with {queued}, those still waiting to be sent)'''
+        with self._lock:
+            pending: list[_Pending] = list(replica.in_flight.values())
+            replica.in_flight.clear()
+        for _ in pending:
+            replica.window.release()
+        if queued:
+            while True:
+                try:
+                    item: Optional[_Pending] = replica.outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    pending.append(item)
+        for item in pending:
+            self._finish(replica, item, error=error)
+
+    def _take_in_flight(self, replica: _Replica, request_id: int) -> Optional[_Pending]:
+        '''Remove request {request_id} from those {replica} was sent, freeing its place in the window'''
+        with self._lock:
+            pending: Optional[_Pending] = replica.in_flight.pop(request_id, None)
+        if pending is not None:
+            replica.window.release()
+        return pending
+
+    def _finish(self, replica: _Replica, pending: _Pending, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            replica.load -= 1
+            if error is None:
+                replica.completed += 1
+            else:
+                replica.failed += 1
+        _settle(pending.future, result, error)
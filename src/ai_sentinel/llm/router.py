@@ -0,0 +1,268 @@
+# client that spreads requests over several providers
+import json
+import random
+import time
+
+from typing import Any, AsyncIterator, Literal, Optional
+
+from pydantic import ValidationError
+
+from ai_sentinel.core.models import LLMResponse
+from ai_sentinel.llm.base import BaseLLMClient, MalformedResponseError
+
+CircuitState = Literal['closed', 'open', 'half_open']
+# how a routed request ended: 'skip' (cancelled or invalid request) leaves the averages alone
+_Outcome = Literal['ok', 'error', 'skip']
+
+
+class CircuitOpenError(RuntimeError):
+    '''Raised when every client of a router is unavailable (circuit open)'''
+
+
+def _invalid_request(error: Exception) -> bool:
+    '''
+    Whether {error} rejects the request itself, which no other client would accept either
+    Malformed provider output (MalformedResponseError, pydantic ValidationError, JSONDecodeError) is
+    a ValueError too, but it is the backend misbehaving: it counts as a failure and the request fails over.
+    '''
+    return isinstance(error, ValueError) and not isinstance(error, (MalformedResponseError, ValidationError, json.JSONDecodeError))
+
+
+class _Backend:
+    '''One routed client with its latency/error averages and circuit breaker'''
+    def __init__(self, client: BaseLLMClient):
+        self.client = client
+        self.latency_ms: Optional[float] = None
+        self.error_rate: float = 0.0
+        self.in_flight: int = 0
+        self.requests: int = 0
+        self.failures: int = 0
+        self.consecutive_failures: int = 0
+        self.state: CircuitState = 'closed'
+        self.opened_at: float = 0.0
+        self.trial_running: bool = False
+
+
+class RouterClient(BaseLLMClient):
+    '''
+    Client that routes every request to one of several clients (providers, deployments, local servers)
+
+    Requests go preferably to the clients with the lowest expected cost: the EWMA of their latency,
+    scaled up by their EWMA error rate and by the requests they already have in flight. Clients
+    without samples yet are tried first. After {failure_threshold} consecutive failures a client's
+    circuit opens and it gets no traffic for {reset_timeout} seconds; then one trial request is let
+    through (half open) and its outcome closes or reopens the circuit. A failed request is retried on
+    the next best client, up to {max_attempts} clients.
+
+    Structured output is requested with each chosen client's own keyword arguments, so a guard
+    using the router gets valid JSON from every provider.
+
+    Parameters:
+    clients (list[BaseLLMClient]): Clients to route between
+    alpha (float): Weight of the newest sample in the latency and error averages | default = 0.2
+    failure_threshold (int): Consecutive failures that open a client's circuit | default = 5
+    reset_timeout (float): Seconds a circuit stays open before a trial request | default = 30.0
+    max_attempts (Optional[int]): Clients tried per request, defaults to all of them | default = None
+    '''
+    def __init__(
+            self,
+            clients: list[BaseLLMClient],
+            alpha: float = 0.2,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            max_attempts: Optional[int] = None
+        ):
+        if not clients:
+            raise ValueError('Clients must be a non-empty list')
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError('Alpha must be between 0.0 and 1.0')
+        if failure_threshold < 1 or reset_timeout <= 0:
+            raise ValueError('Failure threshold must be at least 1 and reset timeout must be positive')
+
+        super().__init__('router', ','.join(client.model for client in clients), max(client.timeout for client in clients))
+        self.backends: list[_Backend] = [_Backend(client) for client in clients]
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_attempts = max_attempts or len(clients)
+
+    def structured_output_kwargs(self, schema: type) -> dict:
+        # translated into the chosen client's own arguments in generate_text_async
+        return {'output_schema': schema}
+
+    async def generate_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = 0.0,
+            **kwargs
+        ) -> LLMResponse:
+        schema: Optional[type] = kwargs.pop('output_schema', None)
+        tried: set[int] = set()
+        last_error: Optional[Exception] = None
+        while len(tried) < self.max_attempts:
+            backend: Optional[_Backend] = self._choose(tried)
+            if backend is None:
+                break
+            tried.add(id(backend))
+
+            options: dict = {**kwargs, **(backend.client.structured_output_kwargs(schema) if schema else {})}
+            start: float = self._start(backend)
+            outcome: _Outcome = 'skip'
+            try:
+                response: LLMResponse = await backend.client.generate_text_async(
+                    prompt, system_prompt, context, temperature, **options
+                )
+                outcome = 'ok'
+            except Exception as e:
+                if _invalid_request(e):
+                    # the request itself is invalid, another client won't do better
+                    raise
+                outcome = 'error'
+                last_error = e
+                continue
+            finally:
+                self._finish(backend, start, outcome)
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError('Every client of the router has an open circuit')
+
+    async def stream_text_async(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[list[dict[str,str]]] = None,
+            temperature: Optional[float] = 0.0,
+            **kwargs
+        ) -> AsyncIterator[str]:
+        schema: Optional[type] = kwargs.pop('output_schema', None)
+        tried: set[int] = set()
+        last_error: Optional[Exception] = None
+        while len(tried) < self.max_attempts:
+            backend: Optional[_Backend] = self._choose(tried)
+            if backend is None:
+                break
+            tried.add(id(backend))
+
+            options: dict = {**kwargs, **(backend.client.structured_output_kwargs(schema) if schema else {})}
+            start: float = self._start(backend)
+            outcome: _Outcome = 'skip'
+            started: bool = False
+            try:
+                async for chunk in backend.client.stream_text_async(prompt, system_prompt, context, temperature, **options):
+                    started = True
+                    yield chunk
+                outcome = 'ok'
+            except Exception as e:
+                if _invalid_request(e):
+                    raise
+                outcome = 'error'
+                # only fail over while nothing has been handed out yet
+                if started:
+                    raise
+                last_error = e
+                continue
+            finally:
+                self._finish(backend, start, outcome)
+            return
+
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError('Every client of the router has an open circuit')
+
+    def _choose(self, tried: set[int]) -> Optional[_Backend]:
+        '''Pick the next client: untried, circuit not open, weighted towards the lowest expected cost'''
+        now: float = time.monotonic()
+        available: list[_Backend] = []
+        for backend in self.backends:
+            if id(backend) in tried:
+                continue
+            if backend.state == 'open' and now - backend.opened_at >= self.reset_timeout:
+                backend.state = 'half_open'
+            if backend.state == 'open' or (backend.state == 'half_open' and backend.trial_running):
+                continue
+            available.append(backend)
+        if not available:
+            return None
+
+        # explore clients without a latency sample before exploiting the others
+        unmeasured: list[_Backend] = [backend for backend in available if backend.latency_ms is None]
+        if unmeasured:
+            return min(unmeasured, key=lambda backend: backend.in_flight)
+
+        weights: list[float] = [1.0 / self._cost(backend) for backend in available]
+        return random.choices(available, weights=weights)[0]
+
+    @staticmethod
+    def _cost(backend: _Backend) -> float:
+        '''Expected cost of sending one more request to {backend}'''
+        return max(backend.latency_ms, 1.0) * (1 + backend.in_flight) / max(0.01, 1.0 - backend.error_rate) ** 2
+
+    def _start(self, backend: _Backend) -> float:
+        backend.in_flight += 1
+        backend.requests += 1
+        if backend.state == 'half_open':
+            backend.trial_running = True
+        return time.perf_counter()
+
+    def _finish(self, backend: _Backend, start: float, outcome: _Outcome) -> None:
+        '''Update the averages and the circuit of {backend} after a request started at {start}'''
+        backend.in_flight -= 1
+        backend.trial_running = False
+        if outcome == 'skip':
+            return
+
+        backend.error_rate += self.alpha * ((1.0 if outcome == 'error' else 0.0) - backend.error_rate)
+        if outcome == 'ok':
+            latency: float = (time.perf_counter() - start) * 1000
+            backend.latency_ms = latency if backend.latency_ms is None else backend.latency_ms + self.alpha * (latency - backend.latency_ms)
+            backend.consecutive_failures = 0
+            backend.state = 'closed'
+            return
+
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.state == 'half_open' or backend.consecutive_failures >= self.failure_threshold:
+            backend.state = 'open'
+            backend.opened_at = time.monotonic()
+
+    async def validate_async(self) -> bool:
+        '''Return True if at least one client is valid'''
+        for backend in self.backends:
+            if await backend.client.validate_async():
+                return True
+        return False
+
+    async def aclose(self) -> None:
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    @property
+    def provider_name(self) -> str:
+        return 'router'
+
+    @property
+    def stats(self) -> list[dict[str, Any]]:
+        '''Return the routing state of every client'''
+        return [
+            {
+                'provider': backend.client.provider_name,
+                'model': backend.client.model,
+                'state': backend.state,
+                'latency_ms': backend.latency_ms,
+                'error_rate': backend.error_rate,
+                'in_flight': backend.in_flight,
+                'requests': backend.requests,
+                'failures': backend.failures,
+            }
+            for backend in self.backends
+        ]
+
+    @property
+    def info(self) -> dict:
+        basic_info = super().info
+        basic_info['clients'] = [backend.client.info for backend in self.backends]
+        return basic_info
@@ -1,30 +1,134 @@
+import copy
 import json
 import jsonschema
+import asyncio
 import re
+import threading
+import time
+import warnings
+import weakref
 
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Any
-from datetime import datetime
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM, LogitsProcessorList, StoppingCriteriaList
 
-from ai_sentinel.llm.base import BaseLLMClient
+from ai_sentinel.llm.base import BaseLLMClient, MalformedResponseError
+from ai_sentinel.llm.batching import BatchScheduler
+from ai_sentinel.llm.constrained import GrammarVocabulary, JSONCompleteCriteria, ToxicityJSONGrammar, ToxicityJSONLogitsProcessor, token_strings
+from ai_sentinel.llm.replicas import TransformersReplicaPool
+from ai_sentinel.llm.weights import load_mapped_model
 from ai_sentinel.core.models import LLMResponse
 from ai_sentinel.guards.toxicity_guard import ToxicityResult
 
+# stands in for the user text when rendering the chat template to find the fixed prefix
+_PROMPT_PLACEHOLDER: str = '<<ai_sentinel_user_prompt>>'
+
+# suffixes used to check that tokenizing the prefix and the user text separately is lossless
+_BOUNDARY_PROBES: tuple[str, ...] = ('hello', ' hello', 'Hello world!', '\nhi', '123', '{"a": 1}', '  x')
+
+# grammar of constrained_json outputs; every token adds at least one character, so its longest
+# object plus eos bounds the tokens a constrained generation can need (below the unconstrained
+# budget, the grammar caps the reason)
+_JSON_GRAMMAR: ToxicityJSONGrammar = ToxicityJSONGrammar()
+_MAX_NEW_TOKENS: int = 512
+_CONSTRAINED_MAX_NEW_TOKENS: int = min(_MAX_NEW_TOKENS, _JSON_GRAMMAR.max_length + 1)
+
+
+class _PrefixEntry:
+    '''Tokenized fixed prompt prefix and the past-key-values from prefilling it'''
+    def __init__(self, text: str, input_ids: torch.Tensor, past_key_values: Any, split_tokenization: bool):
+        self.text = text
+        self.input_ids = input_ids
+        self.past_key_values = past_key_values
+        # True when prefix ids + tokenize(suffix) always equals tokenize(prefix + suffix)
+        self.split_tokenization = split_tokenization
+
+
 class TransformersClient(BaseLLMClient):
-    '''Open Source LLM client implementation using Transformers framework from Huggingface'''
+    '''
+    Open Source LLM client implementation using Transformers framework from Huggingface
+
+    The chat-template prefix in front of the user text (system prompt and context) is constant
+    across calls, so it is tokenized and prefilled once and its past-key-values are reused;
+    only the user-text suffix is prefilled on each call. Set {prefix_cache} to False to disable.
+
+    With {batching} enabled, concurrent generate_text_async calls are collected for up to
+    {batch_wait_ms} (or until {max_batch_size} are waiting), left-padded into a single
+    generate() call on a background thread, and each decoded output is routed back to its caller.
+
+    With {constrained_json} enabled, decoding is restricted to tokens that keep the output a valid
+    ToxicityResult JSON object and stops as soon as the object is closed, so no cleanup is needed.
+
+    With {mmap_weights} enabled, the safetensors weights are memory-mapped read-only instead of
+    copied into memory (they keep their stored dtype), so processes loading the same model share them.
+    A model without safetensors weights, or whose weights do not cover every parameter, is loaded
+    normally instead, with a RuntimeWarning; {mapped_weights} tells which happened.
+
+    With {replicas} set, the model is not loaded in this process: a TransformersReplicaPool runs
+    that many copies of it in worker processes with {threads_per_replica} torch threads each,
+    sharing mapped weights ({mmap_weights} defaults to True with replicas, see the pool's stats for
+    replicas that had to load a copy), and generate_text_async sends every request to the
+    least-loaded one (with {batching}, a replica generates the requests waiting for it together).
+    '''
 
     def __init__(
             self, 
             model: str,
             api_key: Optional[str] = 'EMPTY',
             timeout: Optional[float] = 30.0, 
+            prefix_cache: bool = True,
+            prefix_cache_size: int = 4,
+            batching: bool = False,
+            max_batch_size: int = 8,
+            batch_wait_ms: float = 5.0,
+            constrained_json: bool = False,
+            mmap_weights: Optional[bool] = None,
+            replicas: int = 0,
+            threads_per_replica: Optional[int] = None,
             **kwargs
         ):
         super().__init__(api_key, model, timeout, **kwargs)
 
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model)
-        self.client = AutoModelForCausalLM.from_pretrained(self.model)
+        if replicas < 0:
+            raise ValueError('Replicas must not be negative')
+        # replicas share mapped weights unless told otherwise, a single process loads a copy
+        self.mmap_weights: bool = bool(replicas) if mmap_weights is None else mmap_weights
+        self.mapped_weights: bool = False
+        self.pool: Optional[TransformersReplicaPool] = None
+        if replicas:
+            # the replicas load the model, this process only dispatches to them
+            self.tokenizer = None
+            self.client = None
+            self.pool = TransformersReplicaPool(
+                self.model,
+                replicas,
+                threads_per_replica=threads_per_replica,
+                shared_weights=self.mmap_weights,
+                max_batch_size=max_batch_size if batching else 1,
+                client_options={'prefix_cache': prefix_cache, 'prefix_cache_size': prefix_cache_size, 'constrained_json': constrained_json}
+            )
+            self.pool.start()
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model)
+            self.client = self._load_model()
+
+        self.prefix_cache = prefix_cache
+        self.prefix_cache_size = prefix_cache_size
+        self._prefixes: OrderedDict[str, _PrefixEntry] = OrderedDict()
+        self._prefix_lock = threading.Lock()
+
+        self.batching = batching
+        self.max_batch_size = max_batch_size
+        self.batch_wait_ms = batch_wait_ms
+        # one scheduler per event loop, all feeding the same generation thread
+        self._schedulers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._generation_executor: Optional[ThreadPoolExecutor] = None
+
+        self.constrained_json = constrained_json
+        self._vocabulary: Optional[GrammarVocabulary] = None
 
     async def generate_text_async(
             self, 
@@ -38,23 +142,144 @@ class TransformersClient(BaseLLMClient):
         if not prompt or not isinstance(prompt, str):
             raise ValueError('Prompt must be a non-empty string')
         
-        message = []
-
-        # check if there is a system prompt given
-        if system_prompt:
-            message.append({
-                'role': 'system',
-                'content': system_prompt
-            })
-        # check if there is context given
-        if context:
-            message.extend(context)
-
-        message.append({
-            'role': 'user',
-            'content': prompt
-        })
+        started_at: float = time.perf_counter()
+        message: list = self._build_messages(prompt, system_prompt, context)
+        timings: dict[str, float] = {'prompt_build': (time.perf_counter() - started_at) * 1000}
+
+        started_at = time.perf_counter()
+        if self.pool is not None:
+            response = await self.pool.generate_async((message, temperature), timings)
+        elif self.batching:
+            response = await self._scheduler().submit((message, temperature), timings)
+        else:
+            response = self._generate(message, temperature)
+        # generation excludes the time spent waiting for a batch slot
+        timings['generation'] = (time.perf_counter() - started_at) * 1000 - timings.get('queue', 0.0)
+
+        formatted_response: LLMResponse = self._format_llm_response(response, timings)
+        return formatted_response
+
+    def _load_model(self) -> AutoModelForCausalLM:
+        '''Load the model, mapping its weights when {mmap_weights} is set and they can be mapped'''
+        if self.mmap_weights:
+            try:
+                mapped: AutoModelForCausalLM = load_mapped_model(self.model)
+            except ValueError as e:
+                # no safetensors weights, or weights that leave parameters uninitialized
+                warnings.warn(f'Could not map the weights of {self.model}, loading a private copy instead: {e}', RuntimeWarning)
+            else:
+                self.mapped_weights = True
+                return mapped
+        return AutoModelForCausalLM.from_pretrained(self.model)
+
+    async def aclose(self) -> None:
+        '''Stop the replica processes, if any'''
+        await super().aclose()
+        if self.pool is not None:
+            # joining the replica processes blocks, keep it off the event loop
+            await asyncio.to_thread(self.pool.close)
+
+    def _generate(self, message: list[dict[str, str]], temperature: Optional[float] = 0.0) -> str:
+        '''Run generation for the chat {message} and return the decoded completion'''
+        entry: Optional[_PrefixEntry] = None
+        if self.prefix_cache and len(message) > 1:
+            entry = self._prefix_entry(message, temperature)
+
+        if entry is None:
+            return self._generate_uncached(message, temperature)
+
+        input_ids: Optional[torch.Tensor] = self._prefixed_input_ids(entry, message, temperature)
+        if input_ids is None:
+            # the prefix did not tokenize the same way inside the full prompt, so its cache can't be used
+            return self._generate_uncached(message, temperature)
+
+        response = self.client.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            # generate() extends the cache in place, every call needs its own copy
+            past_key_values=copy.deepcopy(entry.past_key_values),
+            max_new_tokens=self._max_new_tokens(),
+            **self._constraint_kwargs()
+        )
+        return self.tokenizer.decode(response[0][input_ids.shape[-1]:], skip_special_tokens=self.constrained_json)
+
+    def _scheduler(self) -> BatchScheduler:
+        '''Return the batch scheduler of the running event loop'''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        scheduler: Optional[BatchScheduler] = self._schedulers.get(loop)
+        if scheduler is None:
+            if self._generation_executor is None:
+                self._generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-sentinel-generate')
+            scheduler = BatchScheduler(
+                self._generate_batch,
+                executor=self._generation_executor,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.batch_wait_ms
+            )
+            self._schedulers[loop] = scheduler
+        return scheduler
+
+    def _generate_batch(self, requests: list[tuple[list[dict[str, str]], Optional[float]]]) -> list[str]:
+        '''Generate completions for several (message, temperature) requests in one left-padded generate() call'''
+        if len(requests) == 1:
+            return [self._generate(*requests[0])]
 
+        pad_token_id: Optional[int] = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+
+        rendered: list[str] = [self._render(message, temperature) for message, temperature in requests]
+        ids: list[list[int]] = self.tokenizer(rendered, add_special_tokens=False)['input_ids']
+        width: int = max(len(row) for row in ids)
+        input_ids: torch.Tensor = torch.tensor(
+            [[pad_token_id] * (width - len(row)) + row for row in ids], device=self.client.device
+        )
+        attention_mask: torch.Tensor = torch.tensor(
+            [[0] * (width - len(row)) + [1] * len(row) for row in ids], device=self.client.device
+        )
+
+        response = self.client.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            pad_token_id=pad_token_id,
+            max_new_tokens=self._max_new_tokens(),
+            **self._constraint_kwargs()
+        )
+
+        eos_token_ids: Any = self.client.generation_config.eos_token_id
+        if eos_token_ids is None:
+            eos_token_ids = self.tokenizer.eos_token_id
+        eos_token_ids = set(eos_token_ids) if isinstance(eos_token_ids, list) else {eos_token_ids}
+
+        outputs: list[str] = []
+        for row in response[:, width:].tolist():
+            # a row is done at its first eos, everything after it is padding until the longest row finishes
+            end: int = next((idx + 1 for idx, token in enumerate(row) if token in eos_token_ids), len(row))
+            outputs.append(self.tokenizer.decode(row[:end], skip_special_tokens=self.constrained_json))
+        return outputs
+
+    @property
+    def batch_stats(self) -> dict:
+        '''Queue depth and batch-size histogram, summed over every event loop using this client'''
+        schedulers: list[BatchScheduler] = list(self._schedulers.values())
+        histogram: Counter = Counter()
+        for scheduler in schedulers:
+            histogram.update(scheduler.batch_sizes)
+        batches: int = sum(histogram.values())
+        requests: int = sum(scheduler.requests for scheduler in schedulers)
+        wait_ms: float = sum(scheduler.total_wait_ms for scheduler in schedulers)
+        return {
+            'queue_depth': sum(scheduler.queue_depth for scheduler in schedulers),
+            'max_queue_depth': max((scheduler.max_queue_depth for scheduler in schedulers), default=0),
+            'batches': batches,
+            'requests': requests,
+            'batch_size_histogram': dict(sorted(histogram.items())),
+            'mean_batch_size': requests / batches if batches else 0.0,
+            'mean_queue_wait_ms': wait_ms / requests if requests else 0.0,
+        }
+
+    def _generate_uncached(self, message: list[dict[str, str]], temperature: Optional[float] = 0.0) -> str:
+        '''Generation without the prefix cache (the original path)'''
         inputs = self.tokenizer.apply_chat_template(
             message,
             add_generation_prompt=True,
@@ -63,14 +288,96 @@ class TransformersClient(BaseLLMClient):
             return_tensors="pt",
             temperature=temperature
         ).to(self.client.device)
+        response = self.client.generate(**inputs, max_new_tokens=self._max_new_tokens(), **self._constraint_kwargs())
+        return self.tokenizer.decode(response[0][inputs["input_ids"].shape[-1]:], skip_special_tokens=self.constrained_json)
 
-        response_start_time: datetime = datetime.utcnow()
-        response = self.client.generate(**inputs, max_new_tokens=512)
-        response = self.tokenizer.decode(response[0][inputs["input_ids"].shape[-1]:])
-        response_end_time: datetime = datetime.utcnow()
+    def _max_new_tokens(self) -> int:
+        '''Token budget of one generation, enough for any complete object with {constrained_json}'''
+        return _CONSTRAINED_MAX_NEW_TOKENS if self.constrained_json else _MAX_NEW_TOKENS
 
-        formatted_response: LLMResponse = self._format_llm_response(response, response_start_time, response_end_time)
-        return formatted_response
+    def _constraint_kwargs(self) -> dict:
+        '''Return the generate() arguments that enforce ToxicityResult JSON, if enabled'''
+        if not self.constrained_json:
+            return {}
+        if self._vocabulary is None:
+            self._vocabulary = GrammarVocabulary(token_strings(self.tokenizer), _JSON_GRAMMAR)
+
+        # the processor tracks per-row grammar state, so every generate() call needs a new one
+        processor = ToxicityJSONLogitsProcessor(self._vocabulary, self.tokenizer.eos_token_id)
+        return {
+            'logits_processor': LogitsProcessorList([processor]),
+            'stopping_criteria': StoppingCriteriaList([JSONCompleteCriteria(processor)]),
+        }
+
+    def _render(self, message: list[dict[str, str]], temperature: Optional[float] = 0.0) -> str:
+        '''Render the chat template for {message} as text, exactly as the tokenizing path would'''
+        return self.tokenizer.apply_chat_template(
+            message,
+            add_generation_prompt=True,
+            tokenize=False,
+            temperature=temperature
+        )
+
+    def _prefix_entry(self, message: list[dict[str, str]], temperature: Optional[float] = 0.0) -> Optional[_PrefixEntry]:
+        '''Return the cached prefix (everything before the user text) for {message}, prefilling it on first use'''
+        template: list[dict[str, str]] = message[:-1] + [{**message[-1], 'content': _PROMPT_PLACEHOLDER}]
+        rendered: str = self._render(template, temperature)
+        if rendered.count(_PROMPT_PLACEHOLDER) != 1:
+            return None
+        prefix_text: str = rendered[:rendered.index(_PROMPT_PLACEHOLDER)]
+
+        with self._prefix_lock:
+            entry: Optional[_PrefixEntry] = self._prefixes.get(prefix_text)
+            if entry is not None:
+                self._prefixes.move_to_end(prefix_text)
+                return entry
+
+            prefix_ids: list[int] = self.tokenizer(prefix_text, add_special_tokens=False)['input_ids']
+            if not prefix_ids:
+                return None
+            split_tokenization: bool = all(
+                self.tokenizer(prefix_text + probe, add_special_tokens=False)['input_ids']
+                == prefix_ids + self.tokenizer(probe, add_special_tokens=False)['input_ids']
+                for probe in _BOUNDARY_PROBES
+            )
+
+            input_ids: torch.Tensor = torch.tensor([prefix_ids], device=self.client.device)
+            with torch.no_grad():
+                past_key_values = self.client(input_ids=input_ids, use_cache=True).past_key_values
+
+            entry = _PrefixEntry(prefix_text, input_ids, past_key_values, split_tokenization)
+            self._prefixes[prefix_text] = entry
+            while len(self._prefixes) > self.prefix_cache_size:
+                self._prefixes.popitem(last=False)
+            return entry
+
+    def _prefixed_input_ids(
+            self,
+            entry: _PrefixEntry,
+            message: list[dict[str, str]],
+            temperature: Optional[float] = 0.0
+        ) -> Optional[torch.Tensor]:
+        '''
+        Return the full prompt ids for {message}, reusing the cached prefix ids when the prefix and
+        the suffix tokenize independently; None if the prompt does not start with the cached prefix
+        '''
+        rendered: str = self._render(message, temperature)
+        if not rendered.startswith(entry.text):
+            return None
+        suffix_text: str = rendered[len(entry.text):]
+        if not suffix_text:
+            return None
+
+        prefix_length: int = entry.input_ids.shape[-1]
+        if entry.split_tokenization:
+            suffix_ids: list[int] = self.tokenizer(suffix_text, add_special_tokens=False)['input_ids']
+            suffix: torch.Tensor = torch.tensor([suffix_ids], device=self.client.device)
+            return torch.cat([entry.input_ids, suffix], dim=-1)
+
+        full_ids: list[int] = self.tokenizer(rendered, add_special_tokens=False)['input_ids']
+        if len(full_ids) <= prefix_length or full_ids[:prefix_length] != entry.input_ids[0].tolist():
+            return None
+        return torch.tensor([full_ids], device=self.client.device)
 
     def _clean_response(self, response) -> str:
         cleaned = response.strip('```')
@@ -79,12 +386,23 @@ class TransformersClient(BaseLLMClient):
         dict_start_idx = response.find('{')
         dict_end_idx = response[dict_start_idx:].find('}')
         if dict_start_idx == -1 or dict_end_idx == -1:
-            raise ValueError('LLM response does not contain a dictionary/json-compatible object')
+            raise MalformedResponseError('LLM response does not contain a dictionary/json-compatible object')
         return cleaned
 
-    def _format_llm_response(self, response, start_time: datetime, end_time: datetime) -> LLMResponse:
-        '''Convert response to built in Model type to a response type of LLMResponse'''
-        
+    def _format_llm_response(self, response, timings: dict[str, float]) -> LLMResponse:
+        '''Convert response to built in Model type to a response type of LLMResponse, {timings} in ms per stage'''
+        if self.constrained_json:
+            content: str = response.strip()
+            # the grammar only allows ToxicityResult-shaped JSON, but a row that got stuck is ended early
+            if not _JSON_GRAMMAR.accepts(content):
+                raise MalformedResponseError('Constrained generation ended before the ToxicityResult JSON object was complete')
+            return LLMResponse(
+                content=content,
+                model = self.model,
+                response_time_ms = timings['generation'],
+                timings = timings
+            )
+
         cleaned_response = self._clean_response(response)
         toxicity_schema = ToxicityResult.model_json_schema()
 
@@ -99,7 +417,8 @@ class TransformersClient(BaseLLMClient):
         output: LLMResponse = LLMResponse(
             content=json.dumps(response_dict),
             model = self.model,
-            response_time_ms = start_time.timestamp() - end_time.timestamp()
+            response_time_ms = timings['generation'],
+            timings = timings
         )
         return output
 
@@ -111,5 +430,6 @@ class TransformersClient(BaseLLMClient):
             print(f'An unexpected error occurred during API key validation: {e}')
             return False
     
-    def provider_name(self):
+    @property
+    def provider_name(self) -> str:
         return 'transformers'
\ No newline at end of file
@@ -0,0 +1,91 @@
+# connection pool that several LLM clients can share
+import asyncio
+import weakref
+
+from typing import Any, Optional
+
+import httpx
+
+from ai_sentinel.core.runner import close_on_owner_loops, run_sync
+
+
+class HTTPPool:
+    '''
+    Tuned HTTP connection pool shared by several LLM clients
+
+    Pass the same HTTPPool to every client (ex. one per tenant or per model) as {http_pool} and
+    they all reuse the same warm keep-alive connections instead of each opening and handshaking its
+    own. httpx clients are bound to the event loop they are used on, so the pool holds one
+    httpx.AsyncClient per loop. The pool is not closed by the LLM clients, close it once they are done.
+
+    Parameters:
+    max_connections (int): Most connections open at once, per event loop | default = 100
+    max_keepalive_connections (int): Most idle connections kept open for reuse | default = 100
+    keepalive_expiry (float): Seconds an idle connection is kept open | default = 60.0
+    http2 (bool): Negotiate HTTP/2 where the server supports it (needs the 'h2' package) | default = False
+    connect_timeout (float): Seconds allowed to open a connection | default = 10.0
+    **client_kwargs: Passed on to httpx.AsyncClient (ex. proxy, verify)
+    '''
+    def __init__(
+            self,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 100,
+            keepalive_expiry: float = 60.0,
+            http2: bool = False,
+            connect_timeout: float = 10.0,
+            **client_kwargs
+        ):
+        if max_connections < 1 or max_keepalive_connections < 0:
+            raise ValueError('Max connections must be at least 1 and max keepalive connections must not be negative')
+        if keepalive_expiry < 0 or connect_timeout <= 0:
+            raise ValueError('Keepalive expiry must not be negative and connect timeout must be positive')
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as e:
+                raise ImportError("HTTP/2 needs the 'h2' package (pip install 'httpx[http2]')") from e
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        self.timeout = httpx.Timeout(60.0, connect=connect_timeout)
+        self.client_kwargs = client_kwargs
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def get(self) -> httpx.AsyncClient:
+        '''Return the httpx client of the running event loop, creating it on first use'''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        client: Optional[httpx.AsyncClient] = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                http2=self.http2,
+                timeout=self.timeout,
+                **self.client_kwargs
+            )
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self) -> None:
+        '''
+        Close the pool's connections (async)
+        Connections of another event loop that is still running are closed on that loop, those of
+        loops that are already closed are dropped.
+        '''
+        clients: list[tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = list(self._clients.items())
+        self._clients.clear()
+        await close_on_owner_loops([(loop, client.aclose) for loop, client in clients])
+
+    def close(self) -> None:
+        '''Close the pool's connections (sync wrapper)'''
+        run_sync(self.aclose())
+
+    async def __aenter__(self) -> 'HTTPPool':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
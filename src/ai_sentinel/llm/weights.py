@@ -0,0 +1,103 @@
+# model weights mapped from safetensors files instead of copied into memory
+import json
+import mmap
+
+from typing import Optional
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+from transformers.utils import cached_file
+
+try:
+    from transformers.initialization import no_init_weights  # transformers >= 5
+except ImportError:
+    from transformers.modeling_utils import no_init_weights
+
+# safetensors dtype names -> torch dtypes
+_DTYPES: dict[str, torch.dtype] = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+    'F8_E4M3': torch.float8_e4m3fn,
+    'F8_E5M2': torch.float8_e5m2,
+}
+
+
+def safetensors_files(model: str) -> Optional[list[str]]:
+    '''
+    Return the local paths of the safetensors weights of {model} (a model name or a directory),
+    downloading them if needed, or None when the model has no safetensors weights
+    '''
+    single: Optional[str] = cached_file(model, 'model.safetensors', _raise_exceptions_for_missing_entries=False)
+    if single is not None:
+        return [single]
+    index: Optional[str] = cached_file(model, 'model.safetensors.index.json', _raise_exceptions_for_missing_entries=False)
+    if index is None:
+        return None
+    with open(index, encoding='utf-8') as file:
+        names: list[str] = sorted(set(json.load(file)['weight_map'].values()))
+    return [cached_file(model, name) for name in names]
+
+
+def map_safetensors(path: str) -> dict[str, torch.Tensor]:
+    '''
+    Return the tensors of the safetensors file at {path} as views of a private memory map of it
+    Nothing is read up front: pages are loaded from the page cache when first touched and are
+    shared by every process mapping the same file, as long as nobody writes to them (a write only
+    copies the page it touches, the file itself is never modified).
+    '''
+    with open(path, 'rb') as file:
+        header_size: int = int.from_bytes(file.read(8), 'little')
+        header: dict = json.loads(file.read(header_size))
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    start_of_data: int = 8 + header_size
+    tensors: dict[str, torch.Tensor] = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype: torch.dtype = _DTYPES[info['dtype']]
+        start, end = info['data_offsets']
+        count: int = (end - start) // dtype.itemsize
+        if count == 0:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=start_of_data + start).view(info['shape'])
+    return tensors
+
+
+def load_mapped_model(model: str, files: Optional[list[str]] = None) -> AutoModelForCausalLM:
+    '''
+    Build {model} with its parameters backed by the memory-mapped safetensors {files} (found with
+    safetensors_files() when None), so several processes loading it hold one copy of the weights
+    Weights keep the dtype they are stored in. The model is built without initializing its
+    weights and they are then swapped for the mapped tensors, so no full copy is ever resident.
+    '''
+    if files is None:
+        files = safetensors_files(model)
+    if not files:
+        raise ValueError(f'{model} has no safetensors weights to map')
+
+    state: dict[str, torch.Tensor] = {}
+    for path in files:
+        state.update(map_safetensors(path))
+
+    config = AutoConfig.from_pretrained(model)
+    with no_init_weights():
+        mapped = AutoModelForCausalLM.from_config(config)
+    mapped.load_state_dict(state, strict=False, assign=True)
+    mapped.tie_weights()
+
+    # every parameter must now live in the map, anything else was left uninitialized
+    mapped_pointers: set[int] = {tensor.data_ptr() for tensor in state.values()}
+    uncovered: list[str] = [name for name, parameter in mapped.named_parameters() if parameter.data_ptr() not in mapped_pointers]
+    if uncovered:
+        raise ValueError(f'The safetensors weights of {model} do not cover {len(uncovered)} parameters (ex. {uncovered[0]}), load it without mapping')
+    return mapped.eval()
@@ -0,0 +1,15 @@
+# init to show that scan is a module
+from .checkpoint import ScanProgress, checkpoint_path
+from .pipeline import scan, scan_async
+from .records import Record, RecordReader, parse_shard, shard_of
+
+__all__ = [
+    'scan',
+    'scan_async',
+    'ScanProgress',
+    'checkpoint_path',
+    'Record',
+    'RecordReader',
+    'parse_shard',
+    'shard_of'
+]
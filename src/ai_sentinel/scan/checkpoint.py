@@ -0,0 +1,51 @@
+# progress of a bulk scan, saved next to its output so a killed job can resume
+import json
+import os
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+def checkpoint_path(output_path: str) -> str:
+    '''Location of the checkpoint of the scan writing to {output_path}'''
+    return f'{output_path}.checkpoint.json'
+
+
+class ScanProgress(BaseModel):
+    '''Progress and counters of a scan, saved as its checkpoint after every chunk'''
+
+    input_path: str = Field(description='absolute path of the input file')
+    text_field: str = Field(description='field holding the text')
+    id_field: Optional[str] = Field(default=None, description='field holding the record id')
+    shard: tuple[int, int] = Field(default=(0, 1), description='(index, count) of the shard scanned')
+    row: int = Field(default=0, description='next input row to read')
+    input_offset: int = Field(default=0, description='byte offset of the next input row')
+    output_offset: int = Field(default=0, description='bytes of output written and synced')
+    analyzed: int = Field(default=0, description='records of this shard written to the output')
+    skipped: int = Field(default=0, description='records left to the other shards')
+    toxic: int = Field(default=0, description='records judged toxic')
+    failed: int = Field(default=0, description='records that could not be read or analyzed')
+    done: bool = Field(default=False, description='whether the whole input was scanned')
+
+    def same_scan(self, other: 'ScanProgress') -> bool:
+        '''Whether {other} describes the same scan (input, fields and shard)'''
+        return (self.input_path, self.text_field, self.id_field, self.shard) == (other.input_path, other.text_field, other.id_field, other.shard)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ScanProgress']:
+        '''Read the checkpoint at {path}, None if there is none'''
+        try:
+            with open(path, encoding='utf-8') as file:
+                return cls.model_validate(json.load(file))
+        except FileNotFoundError:
+            return None
+
+    def save(self, path: str) -> None:
+        '''Write the checkpoint to {path} atomically, a crash leaves either the old or the new one'''
+        temporary: str = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(self.model_dump_json())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
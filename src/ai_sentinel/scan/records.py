@@ -0,0 +1,158 @@
+# streaming JSONL/CSV input and hash-sharding for bulk scans
+import csv
+import hashlib
+import io
+import json
+
+from dataclasses import dataclass
+from typing import Any, Iterator, Literal, Optional
+
+InputFormat = Literal['jsonl', 'csv']
+
+
+# a plain frozen dataclass rather than a pydantic model: one is built per input row
+@dataclass(frozen=True, slots=True)
+class Record:
+    '''
+    One input record
+
+    row: position of the record in the input, counting from 0 (blank JSONL lines are not records)
+    offset: byte offset just past the record, where reading resumes after it
+    id: value of the id field, None without an id field
+    text: text to analyze, None when the record has none
+    error: why the record could not be read (bad JSON, missing or non-string text), None if it was
+    '''
+    row: int
+    offset: int
+    id: Any = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+def shard_of(key: str, count: int) -> int:
+    '''
+    Return the shard (0 to {count} - 1) of {key}
+    Uses blake2b rather than hash(), which is salted per process, so every process and machine
+    assigns a key to the same shard.
+    '''
+    if count < 1:
+        raise ValueError('Shard count must be at least 1')
+    digest: bytes = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    '''Parse a shard given as "index/count" (ex. "0/4") into (index, count)'''
+    index, separator, count = value.partition('/')
+    try:
+        shard: tuple[int, int] = (int(index), int(count))
+    except ValueError:
+        raise ValueError(f'Shard must look like "index/count", got {value!r}') from None
+    if not separator or shard[1] < 1 or not 0 <= shard[0] < shard[1]:
+        raise ValueError(f'Shard must look like "index/count" with 0 <= index < count, got {value!r}')
+    return shard
+
+
+def detect_format(path: str) -> InputFormat:
+    '''Infer the input format from the extension of {path}'''
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f'Cannot infer the format of {path!r}, pass the format explicitly')
+
+
+class RecordReader:
+    '''
+    Streams the records of a JSONL or CSV file one at a time, so memory does not grow with the file
+
+    Every record carries the byte offset just past it: read() can start again from a saved offset
+    with a seek instead of re-reading everything before it. CSV files need a header row naming the
+    columns.
+
+    Parameters:
+    path (str): File to read
+    input_format (Optional[InputFormat]): 'jsonl' or 'csv', inferred from the extension when None | default = None
+    text_field (str): Field (JSONL key or CSV column) holding the text | default = 'text'
+    id_field (Optional[str]): Field holding the record id, copied to the output | default = None
+    encoding (str): Encoding of the file | default = 'utf-8'
+    '''
+    def __init__(
+            self,
+            path: str,
+            input_format: Optional[InputFormat] = None,
+            text_field: str = 'text',
+            id_field: Optional[str] = None,
+            encoding: str = 'utf-8'
+        ):
+        if not path or not isinstance(path, str):
+            raise ValueError('Path must be a non-empty string')
+        if input_format is None:
+            input_format = detect_format(path)
+        if input_format not in ('jsonl', 'csv'):
+            raise ValueError("Input format must be 'jsonl' or 'csv'")
+        if not text_field:
+            raise ValueError('Text field must be a non-empty string')
+
+        self.path = path
+        self.input_format: InputFormat = input_format
+        self.text_field = text_field
+        self.id_field = id_field
+        self.encoding = encoding
+
+    def read(self, offset: int = 0, row: int = 0) -> Iterator[Record]:
+        '''Yield the records from byte {offset} on, numbering the first one {row}'''
+        with open(self.path, 'rb') as file:
+            if self.input_format == 'jsonl':
+                yield from self._read_jsonl(file, offset, row)
+            else:
+                yield from self._read_csv(file, offset, row)
+
+    def _read_jsonl(self, file: io.BufferedReader, offset: int, row: int) -> Iterator[Record]:
+        file.seek(offset)
+        for line in file:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                fields: Any = json.loads(line)
+            except ValueError as e:
+                yield Record(row, offset, error=f'{type(e).__name__}: {e}')
+            else:
+                if isinstance(fields, dict):
+                    yield self._record(row, offset, fields)
+                else:
+                    yield Record(row, offset, error='Record is not a JSON object')
+            row += 1
+
+    def _read_csv(self, file: io.BufferedReader, offset: int, row: int) -> Iterator[Record]:
+        position: list[int] = [0]
+
+        def lines() -> Iterator[str]:
+            # the csv reader pulls exactly the lines of one row (more for quoted newlines), so
+            # {position} is the end of the last row it returned
+            for line in file:
+                position[0] += len(line)
+                yield line.decode(self.encoding)
+
+        header: Optional[list[str]] = next(csv.reader(lines()), None)
+        if header is None:
+            return
+        if self.text_field not in header:
+            raise ValueError(f'CSV header has no {self.text_field!r} column')
+        if offset > position[0]:
+            file.seek(offset)
+            position[0] = offset
+
+        for values in csv.reader(lines()):
+            if not values:
+                continue
+            yield self._record(row, position[0], dict(zip(header, values)))
+            row += 1
+
+    def _record(self, row: int, offset: int, fields: dict) -> Record:
+        text: Any = fields.get(self.text_field)
+        record_id: Any = fields.get(self.id_field) if self.id_field is not None else None
+        if not isinstance(text, str):
+            return Record(row, offset, record_id, error=f'Record has no string {self.text_field!r} field')
+        return Record(row, offset, record_id, text)
@@ -0,0 +1,58 @@
+# shared fixtures: a scripted judge client that never touches the network
+import asyncio
+import json
+
+from typing import Callable, Optional
+
+import pytest
+
+from ai_sentinel.core.models import LLMResponse
+from ai_sentinel.llm.base import BaseLLMClient
+
+
+class FakeClient(BaseLLMClient):
+    '''
+    Judge client answering from the prompt alone: a text containing "bad" is toxic, "badjson" gets
+    an answer that is not JSON. {fail} is called with every prompt before answering and may raise
+    to simulate a provider error.
+    '''
+    def __init__(self, model: str = 'fake', delay: float = 0.0, fail: Optional[Callable[[str], None]] = None):
+        super().__init__('key', model, 30.0)
+        self.delay = delay
+        self.fail = fail
+        self.calls: int = 0
+
+    async def generate_text_async(self, prompt, system_prompt=None, context=None, temperature=0.0, **kwargs) -> LLMResponse:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail is not None:
+            self.fail(prompt)
+        if 'badjson' in prompt:
+            return LLMResponse(content='{not json', model=self.model)
+        if prompt.startswith('['):
+            verdicts: list[dict] = [dict(self._verdict(item['text']), id=item['id']) for item in json.loads(prompt)]
+            return LLMResponse(content=json.dumps({'results': verdicts}), model=self.model)
+        return LLMResponse(content=json.dumps(self._verdict(prompt)), model=self.model)
+
+    @staticmethod
+    def _verdict(text: str) -> dict:
+        toxic: bool = 'bad' in text
+        return {
+            'is_toxic': toxic,
+            'confidence': 0.9 if toxic else 0.05,
+            'categories': ['harassment'] if toxic else [],
+            'reason': 'scripted',
+        }
+
+    async def validate_async(self) -> bool:
+        return True
+
+    @property
+    def provider_name(self) -> str:
+        return 'fake'
+
+
+@pytest.fixture
+def fake_client() -> FakeClient:
+    return FakeClient()
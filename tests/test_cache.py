@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from conftest import FakeClient
+
+from ai_sentinel.guards.toxicity_guard import ToxicityGuard, ToxicityResult, VerdictCache
+
+
+def _result(reason: str = 'cached') -> ToxicityResult:
+    return ToxicityResult(is_toxic=True, confidence=0.8, categories=['threats'], reason=reason)
+
+
+def test_verdict_cache_evicts_least_recently_used():
+    cache = VerdictCache(max_size=2)
+    cache.set('a', _result('a'))
+    cache.set('b', _result('b'))
+    assert cache.get('a').reason == 'a'
+    cache.set('c', _result('c'))
+
+    assert cache.get('b') is None
+    assert cache.get('a').reason == 'a' and cache.get('c').reason == 'c'
+    assert cache.stats['evictions'] == 1 and len(cache) == 2
+
+
+def test_verdict_cache_expires_entries(monkeypatch):
+    cache = VerdictCache(ttl=10)
+    cache.set('a', _result())
+    now: float = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+
+    assert cache.get('a') is None
+    assert cache.stats['expirations'] == 1 and len(cache) == 0
+
+
+def test_verdict_cache_hands_out_copies():
+    cache = VerdictCache()
+    cache.set('a', _result())
+    cache.get('a').categories.clear()
+    assert cache.get('a').categories == ['threats']
+
+
+def test_guard_answers_repeated_texts_from_the_cache():
+    client = FakeClient()
+    guard = ToxicityGuard(client, cache=VerdictCache())
+
+    first = asyncio.run(guard.analyze_many_async(['a bad text', 'a fine text']))
+    second = asyncio.run(guard.analyze_many_async(['a fine text', 'a bad text', 'another text']))
+
+    assert client.calls == 3
+    assert [result.is_toxic for result in second] == [False, True, False]
+    assert second[1] == first[0]
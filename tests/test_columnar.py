@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from conftest import FakeClient
+
+from ai_sentinel.guards.toxicity_guard import ToxicityBatch, ToxicityGuard, ToxicityResult
+from ai_sentinel.guards.toxicity_guard.columnar import NO_SCORE
+
+
+def _results() -> list[ToxicityResult | Exception]:
+    return [
+        ToxicityResult(is_toxic=True, confidence=0.9, categories=['harassment', 'threats'], reason='a'),
+        ToxicityResult(is_toxic=False, confidence=0.3, reason='b'),
+        ValueError('bad answer'),
+        ToxicityResult(is_toxic=True, confidence=0.71, categories=['violence'], reason='c'),
+    ]
+
+
+def test_rows_round_trip():
+    results = _results()
+    batch = ToxicityBatch.from_results(results)
+
+    assert len(batch) == 4
+    assert batch.to_results()[:2] == results[:2] and batch[3] == results[3]
+    assert batch[2] is results[2]
+    assert batch.score[2] == NO_SCORE and np.isnan(batch.confidence[2])
+    assert batch[-1] == results[-1]
+    with pytest.raises(IndexError):
+        batch[4]
+
+
+def test_assigning_rows():
+    batch = ToxicityBatch.empty(3, keep_reasons=False)
+    assert batch.failed.all()
+
+    batch[1] = _results()[0]
+    batch[2] = RuntimeError('down')
+    assert batch.failed.tolist() == [True, False, True]
+    assert batch[1].categories == _results()[0].categories and batch[1].reason == ''
+    # a retried row replaces its error
+    batch[2] = _results()[1]
+    assert 2 not in batch.errors and batch[2].confidence == 0.3
+
+
+def test_filter_and_concatenate_keep_the_original_index():
+    batch = ToxicityBatch.from_results(_results())
+    toxic = batch.filter(batch.where(toxic=True, min_confidence=0.5))
+    assert toxic.index.tolist() == [0, 3]
+    assert toxic[1].reason == 'c'
+
+    joined = ToxicityBatch.concatenate([batch.filter([2]), toxic])
+    assert joined.index.tolist() == [2, 0, 3]
+    assert isinstance(joined[0], ValueError) and joined[1].reason == 'a'
+
+
+def test_summary():
+    summary: dict = ToxicityBatch.from_results(_results()).summary()
+    assert (summary['rows'], summary['failed'], summary['toxic']) == (4, 1, 2)
+    assert summary['categories']['threats'] == 1 and summary['categories']['harassment'] == 1
+    assert sum(summary['scores'].values()) == 3
+
+
+def test_guard_batches_match_the_list_output():
+    texts: list[str] = ['fine', 'bad one', 'badjson', 'also fine', 'bad again']
+    guard = ToxicityGuard(FakeClient())
+
+    for analyze in (guard.analyze_many_async, guard.analyze_packed_async):
+        listed = asyncio.run(analyze(texts))
+        batch = asyncio.run(analyze(texts, as_columnar=True))
+        assert isinstance(batch, ToxicityBatch)
+        assert [isinstance(row, Exception) for row in batch] == [isinstance(row, Exception) for row in listed]
+        assert [row for row in batch if not isinstance(row, Exception)] == [row for row in listed if not isinstance(row, Exception)]
@@ -0,0 +1,49 @@
+import json
+
+import torch
+
+from ai_sentinel.llm.constrained import GrammarVocabulary, ToxicityJSONGrammar, ToxicityJSONLogitsProcessor
+
+
+def _result(reason: str) -> str:
+    return json.dumps({'is_toxic': False, 'confidence': 0.1, 'categories': [], 'reason': reason})
+
+
+def test_reason_length_counts_escapes():
+    grammar = ToxicityJSONGrammar(max_reason_length=10)
+    assert grammar.accepts(_result('a' * 10))
+    assert grammar.accepts(_result('"' * 5))
+    assert not grammar.accepts(_result('a' * 11))
+    assert not grammar.accepts(_result('a' + '"' * 5))
+
+
+def test_longest_object_fits_the_default_budget():
+    assert ToxicityJSONGrammar().max_length + 1 <= 512
+
+
+def test_pick_falls_back_to_the_best_legal_token():
+    strings: list = [None, 'x', 'zz', '{"', '{', 'y'] + [f'q{n}' for n in range(100)]
+    vocabulary = GrammarVocabulary(strings, ToxicityJSONGrammar())
+    processor = ToxicityJSONLogitsProcessor(vocabulary, eos_token_id=0, top_k=4)
+
+    # the top_k candidates are all illegal, the best legal one is further down
+    scores = torch.zeros(len(strings))
+    scores[6:] = 10.0
+    scores[4] = 2.0
+    scores[3] = 1.0
+    token_id, state = processor._pick(vocabulary.grammar.start, scores)
+    assert strings[token_id] == '{' and state is not None
+
+    # nothing starting with an allowed character: stuck
+    scores[3] = scores[4] = float('-inf')
+    assert processor._pick(vocabulary.grammar.start, scores) == (None, None)
+
+
+def test_allowed_states_are_bounded():
+    vocabulary = GrammarVocabulary(['{', 'a', '"'], ToxicityJSONGrammar(), max_states=2)
+    start: tuple = vocabulary.grammar.start
+    assert vocabulary.allowed(start).tolist() == [True, False, False]
+    states: list[tuple] = [vocabulary.grammar.advance(start, prefix) for prefix in ('{', '{"', '{"is_toxic')]
+    for state in states:
+        vocabulary.allowed(state)
+    assert len(vocabulary._allowed) <= 2
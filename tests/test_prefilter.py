@@ -0,0 +1,43 @@
+import pytest
+
+from ai_sentinel.guards.toxicity_guard.prefilter import LexiconPrefilter, normalize_for_matching
+
+_TERMS: dict[str, list[str]] = {'harassment': ['idiot', 'shut up'], 'threats': ['kill you']}
+
+
+def test_normalize_for_matching():
+    assert normalize_for_matching('ІD1ОТ') == 'idiot'
+    assert normalize_for_matching('sh​ut   uuup!') == 'shut uup!'
+
+
+@pytest.mark.parametrize('whole_words', [True, False])
+def test_decisions(whole_words):
+    prefilter = LexiconPrefilter(_TERMS, block_categories=['threats'], allow_phrases=['Thanks!'], whole_words=whole_words)
+
+    blocked = prefilter.check('I will K1LL  y0u')
+    assert blocked.action == 'block' and blocked.result.is_toxic and blocked.matches == ('kill you',)
+    assert prefilter.check('you idiot').action == 'escalate'
+    allowed = prefilter.check('thanks')
+    assert allowed.rule == 'allow_phrase' and not allowed.result.is_toxic
+    assert prefilter.check('a normal sentence').rule == 'no_match'
+    assert prefilter.stats == {'block_term': 1, 'term_match': 1, 'allow_phrase': 1, 'no_match': 1}
+
+
+def test_allowed_results_are_not_shared():
+    prefilter = LexiconPrefilter(_TERMS, on_no_match='allow')
+    first, second = prefilter.check_many(['hello', 'world'])
+    first.result.categories.append('harassment')
+    assert second.result.categories == [] and second.result.reason.startswith('[prefilter:no_match]')
+
+
+@pytest.mark.parametrize('whole_words', [True, False])
+def test_transition_table_stays_bounded(whole_words):
+    prefilter = LexiconPrefilter(_TERMS, whole_words=whole_words)
+    before: int = sum(len(transitions) for transitions in prefilter._automaton._transitions)
+    prefilter.check_many([f'word{n} and shutter kill idiotic text{n}' for n in range(1000)])
+    after: int = sum(len(transitions) for transitions in prefilter._automaton._transitions)
+
+    # only symbols of the patterns are ever cached, whatever the texts
+    alphabet: int = len(prefilter._automaton._alphabet)
+    assert after <= len(prefilter._automaton._transitions) * alphabet
+    assert after - before < 100
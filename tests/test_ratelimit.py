@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from conftest import FakeClient
+
+from ai_sentinel.core.tokens import estimate_tokens
+from ai_sentinel.llm.ratelimit import AdaptiveConcurrency, RateLimitedClient, TokenBucket
+
+
+class _StatusError(Exception):
+    '''Provider error carrying an HTTP status, like the SDK errors'''
+    def __init__(self, status_code: int):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+
+
+class _FailFirst:
+    '''fail callback raising {error} on the first {times} calls'''
+    def __init__(self, error: Exception, times: int):
+        self.error = error
+        self.times = times
+
+    def __call__(self, prompt: str) -> None:
+        if self.times > 0:
+            self.times -= 1
+            raise self.error
+
+
+def test_token_bucket_queues_callers_past_the_burst():
+    bucket = TokenBucket(per_minute=60, burst=2)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    # the level went negative, the next caller waits behind the previous one
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(per_minute=60)
+    bucket.pause(5)
+    assert bucket.reserve(0) == pytest.approx(5.0, abs=0.05)
+
+
+def test_adaptive_concurrency_decreases_once_per_window():
+    limiter = AdaptiveConcurrency(initial=8, maximum=16)
+    limiter.on_congestion(started_at=0.0)
+    assert int(limiter.limit) == 4
+    # a request started before the decrease does not shrink the limit again
+    limiter.on_congestion(started_at=0.0)
+    assert int(limiter.limit) == 4
+
+    for _ in range(8):
+        limiter.on_success()
+    assert int(limiter.limit) == 5
+
+
+def test_adaptive_concurrency_caps_requests_in_flight():
+    limiter = AdaptiveConcurrency(initial=2)
+    running: list[int] = []
+
+    async def task() -> None:
+        await limiter.acquire()
+        try:
+            running.append(limiter.in_flight)
+            await asyncio.sleep(0.01)
+        finally:
+            limiter.release()
+
+    async def main() -> None:
+        await asyncio.gather(*[task() for _ in range(6)])
+
+    asyncio.run(main())
+    assert max(running) == 2 and limiter.in_flight == 0
+
+
+def test_retryable_errors_are_retried():
+    client = FakeClient(fail=_FailFirst(_StatusError(429), times=2))
+    limited = RateLimitedClient(client, max_concurrency=4, backoff_base=0.001)
+
+    response = asyncio.run(limited.generate_text_async('hello'))
+    assert response.content
+    assert client.calls == 3
+    assert limited.stats['retries'] == 2 and limited.stats['failures'] == 0
+    assert limited.concurrency.limit < 4
+    assert limited.concurrency.in_flight == 0
+
+
+def test_other_errors_and_exhausted_retries_raise():
+    client = FakeClient(fail=_FailFirst(_StatusError(400), times=1))
+    limited = RateLimitedClient(client, backoff_base=0.001)
+    with pytest.raises(_StatusError):
+        asyncio.run(limited.generate_text_async('hello'))
+    assert client.calls == 1
+
+    client = FakeClient(fail=_FailFirst(_StatusError(503), times=5))
+    limited = RateLimitedClient(client, max_retries=2, backoff_base=0.001)
+    with pytest.raises(_StatusError):
+        asyncio.run(limited.generate_text_async('hello'))
+    assert client.calls == 3
+    assert limited.stats['failures'] == 1
+
+
+def test_failed_and_cancelled_calls_give_their_tokens_back():
+    client = FakeClient(delay=1.0, fail=_FailFirst(_StatusError(400), times=1))
+    limited = RateLimitedClient(client, tokens_per_minute=6000)
+    with pytest.raises(_StatusError):
+        asyncio.run(limited.generate_text_async('hello'))
+    assert limited.tokens.level == pytest.approx(6000, abs=1)
+
+    async def cancel_during_call() -> None:
+        task = asyncio.ensure_future(limited.generate_text_async('hello'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_during_call())
+    assert limited.tokens.level == pytest.approx(6000, abs=1)
+    assert limited.concurrency.in_flight == 0
+
+
+def test_cancelled_admission_gives_the_reservation_back():
+    limited = RateLimitedClient(FakeClient(), requests_per_minute=60, tokens_per_minute=6000, max_concurrency=1)
+
+    async def main() -> None:
+        await limited.concurrency.acquire()
+        # the slot is taken: the call waits in _admit with its budget reserved
+        task = asyncio.ensure_future(limited.generate_text_async('hello'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        limited.concurrency.release()
+
+    asyncio.run(main())
+    assert limited.tokens.level == pytest.approx(6000, abs=1)
+    assert limited.requests.level == pytest.approx(60, abs=0.1)
+
+
+def test_stream_reservation_is_reconciled():
+    limited = RateLimitedClient(FakeClient(), tokens_per_minute=6000, expected_output_tokens=500)
+
+    async def consume() -> str:
+        return ''.join([chunk async for chunk in limited.stream_text_async('hello')])
+
+    streamed: str = asyncio.run(consume())
+    # the expected output was swapped for what was streamed, the prompt stays charged
+    spent: float = 6000 - limited.tokens.level
+    assert spent == pytest.approx(estimate_tokens('hello') + estimate_tokens(streamed), abs=1)
+
+    failing = RateLimitedClient(FakeClient(fail=_FailFirst(_StatusError(400), times=1)), tokens_per_minute=6000)
+    with pytest.raises(_StatusError):
+        asyncio.run(failing.stream_text_async('hello').__anext__())
+    assert failing.tokens.level == pytest.approx(6000, abs=1)
+    assert failing.concurrency.in_flight == 0
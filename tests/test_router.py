@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from conftest import FakeClient
+
+from ai_sentinel.llm.base import MalformedResponseError
+from ai_sentinel.llm.router import CircuitOpenError, RouterClient
+
+
+class _Switch:
+    '''fail callback raising {error} while on'''
+    def __init__(self, error: Exception):
+        self.error = error
+        self.on = True
+
+    def __call__(self, prompt: str) -> None:
+        if self.on:
+            raise self.error
+
+
+def _states(router: RouterClient) -> list[str]:
+    return [backend.state for backend in router.backends]
+
+
+def test_failing_client_opens_its_circuit_and_recovers():
+    outage = _Switch(ConnectionError('down'))
+    flaky, healthy = FakeClient('flaky', fail=outage), FakeClient('healthy')
+    router = RouterClient([flaky, healthy], failure_threshold=2, reset_timeout=0.05)
+
+    for _ in range(4):
+        assert asyncio.run(router.generate_text_async('hello')).model == 'healthy'
+    # two failures opened the circuit, the flaky client got no more traffic after them
+    assert flaky.calls == 2 and _states(router) == ['open', 'closed']
+
+    outage.on = False
+    time.sleep(0.06)
+    # after the reset timeout one trial request goes through and closes the circuit
+    assert asyncio.run(router.generate_text_async('hello')).model == 'flaky'
+    assert _states(router) == ['closed', 'closed']
+
+
+def test_failed_trial_reopens_the_circuit():
+    flaky = FakeClient('flaky', fail=_Switch(ConnectionError('down')))
+    router = RouterClient([flaky, FakeClient('healthy')], failure_threshold=1, reset_timeout=0.05)
+    asyncio.run(router.generate_text_async('hello'))
+    opened_at: float = router.backends[0].opened_at
+
+    time.sleep(0.06)
+    asyncio.run(router.generate_text_async('hello'))
+    assert flaky.calls == 2
+    assert _states(router)[0] == 'open' and router.backends[0].opened_at > opened_at
+
+
+def test_malformed_output_fails_over():
+    def malformed(prompt: str) -> None:
+        json.loads('{not json')
+
+    broken = FakeClient('broken', fail=malformed)
+    router = RouterClient([broken, FakeClient('healthy')], failure_threshold=1)
+
+    assert asyncio.run(router.generate_text_async('hello')).model == 'healthy'
+    assert router.backends[0].failures == 1 and _states(router)[0] == 'open'
+
+
+def test_malformed_response_error_fails_over():
+    # what a local backend raises for output that is not the JSON object asked for
+    unfinished = _Switch(MalformedResponseError('Constrained generation ended before the ToxicityResult JSON object was complete'))
+    local, healthy = FakeClient('local', fail=unfinished), FakeClient('healthy')
+    router = RouterClient([local, healthy], failure_threshold=2)
+
+    for _ in range(3):
+        assert asyncio.run(router.generate_text_async('hello')).model == 'healthy'
+    assert local.calls == 2
+    assert router.backends[0].failures == 2 and _states(router)[0] == 'open'
+
+
+def test_invalid_request_is_not_retried():
+    def invalid(prompt: str) -> None:
+        raise ValueError('prompt must be a non-empty string')
+
+    healthy = FakeClient('healthy')
+    router = RouterClient([FakeClient('strict', fail=invalid), healthy])
+
+    with pytest.raises(ValueError):
+        asyncio.run(router.generate_text_async('hello'))
+    assert healthy.calls == 0
+    assert router.backends[0].failures == 0 and router.backends[0].in_flight == 0
+
+
+def test_every_circuit_open():
+    router = RouterClient([FakeClient('down', fail=_Switch(ConnectionError('down')))], failure_threshold=1)
+    with pytest.raises(ConnectionError):
+        asyncio.run(router.generate_text_async('hello'))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(router.generate_text_async('hello'))
@@ -0,0 +1,188 @@
+import csv
+import json
+
+import pytest
+
+from conftest import FakeClient
+
+from ai_sentinel.guards.toxicity_guard import ToxicityGuard
+from ai_sentinel.scan.checkpoint import ScanProgress, checkpoint_path
+from ai_sentinel.scan.pipeline import scan
+from ai_sentinel.scan.records import RecordReader, parse_shard, shard_of
+
+
+def _write_jsonl(path, count: int) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        for row in range(count):
+            text: str = f'message {row}' + (' bad' if row % 4 == 0 else '')
+            file.write(json.dumps({'id': f'r{row}', 'text': text}) + '\n')
+
+
+def _lines(path) -> list[dict]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+class _Outage:
+    '''fail callback raising ConnectionError for the prompts containing one of {texts}'''
+    def __init__(self, *texts: str):
+        self.texts = texts
+
+    def __call__(self, prompt: str) -> None:
+        if any(text in prompt for text in self.texts):
+            raise ConnectionError('provider unavailable')
+
+
+def test_scan_writes_one_line_per_record_in_order(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 10)
+    with open(source, 'a', encoding='utf-8') as file:
+        file.write('not json\n{"text": "badjson"}\n')
+    output = tmp_path / 'out.jsonl'
+
+    progress: ScanProgress = scan(ToxicityGuard(FakeClient()), str(source), str(output), chunk_size=3)
+
+    lines: list[dict] = _lines(output)
+    assert [line['row'] for line in lines] == list(range(12))
+    assert [line['is_toxic'] for line in lines[:10]] == [row % 4 == 0 for row in range(10)]
+    # an unreadable record and an answer that does not parse are both final
+    assert lines[10]['error'].startswith('JSONDecodeError')
+    assert lines[11]['error'].startswith('JSONDecodeError')
+    assert (progress.done, progress.analyzed, progress.toxic, progress.failed) == (True, 12, 3, 2)
+
+
+def test_scan_resumes_after_a_kill(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 20)
+    expected = tmp_path / 'expected.jsonl'
+    scan(ToxicityGuard(FakeClient()), str(source), str(expected), chunk_size=4)
+
+    # the provider goes down in the middle of the third chunk: two chunks are checkpointed
+    output = tmp_path / 'out.jsonl'
+    with pytest.raises(ConnectionError):
+        scan(ToxicityGuard(FakeClient(fail=_Outage('message 9'))), str(source), str(output), chunk_size=4)
+    saved: ScanProgress = ScanProgress.load(checkpoint_path(str(output)))
+    assert (saved.row, saved.analyzed, saved.done) == (8, 8, False)
+    assert output.stat().st_size == saved.output_offset
+
+    # a kill while the next chunk was being written leaves a partial line after the checkpoint
+    with open(output, 'ab') as file:
+        file.write(b'{"row": 8, "is_to')
+
+    client = FakeClient()
+    progress: ScanProgress = scan(ToxicityGuard(client), str(source), str(output), chunk_size=4)
+    assert progress.done and progress.analyzed == 20
+    assert client.calls == 12
+    assert output.read_bytes() == expected.read_bytes()
+
+
+def test_finished_scan_is_not_rerun(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 5)
+    output = tmp_path / 'out.jsonl'
+    scan(ToxicityGuard(FakeClient()), str(source), str(output))
+
+    client = FakeClient()
+    assert scan(ToxicityGuard(client), str(source), str(output)).done
+    assert client.calls == 0
+
+
+def test_checkpoint_of_another_scan_is_refused(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 5)
+    output = tmp_path / 'out.jsonl'
+    scan(ToxicityGuard(FakeClient()), str(source), str(output))
+
+    with pytest.raises(ValueError, match='another scan'):
+        scan(ToxicityGuard(FakeClient()), str(source), str(output), text_field='body')
+
+
+def test_partial_outage_is_neither_written_nor_checkpointed(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 6)
+    output = tmp_path / 'out.jsonl'
+
+    # one text of the second chunk hits a provider error, the others are answered
+    with pytest.raises(ConnectionError):
+        scan(ToxicityGuard(FakeClient(fail=_Outage('message 4'))), str(source), str(output), chunk_size=3)
+    assert all('error' not in line for line in _lines(output))
+    assert ScanProgress.load(checkpoint_path(str(output))).row == 3
+
+    progress: ScanProgress = scan(ToxicityGuard(FakeClient()), str(source), str(output), chunk_size=3)
+    assert (progress.analyzed, progress.failed) == (6, 0)
+    assert [line['row'] for line in _lines(output)] == list(range(6))
+
+
+def test_packed_scan_outage_raises(tmp_path):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 4)
+    output = tmp_path / 'out.jsonl'
+
+    with pytest.raises(ConnectionError):
+        scan(ToxicityGuard(FakeClient(fail=_Outage('message'))), str(source), str(output), packed=True)
+    assert output.read_bytes() == b''
+
+
+@pytest.mark.parametrize('count', [1, 3, 7])
+def test_shards_cover_the_input_exactly_once(tmp_path, count):
+    source = tmp_path / 'in.jsonl'
+    _write_jsonl(source, 50)
+
+    seen: list[str] = []
+    for index in range(count):
+        output = tmp_path / f'out-{index}.jsonl'
+        progress: ScanProgress = scan(
+            ToxicityGuard(FakeClient()), str(source), str(output), id_field='id', shard=(index, count), chunk_size=8
+        )
+        ids: list[str] = [line['id'] for line in _lines(output)]
+        assert all(shard_of(record_id, count) == index for record_id in ids)
+        assert progress.analyzed + progress.skipped == 50
+        seen += ids
+    assert sorted(seen) == sorted(f'r{row}' for row in range(50))
+
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for value in ('4/4', '-1/2', '1', 'a/b', '0/0'):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def _write_csv(path) -> list[str]:
+    texts: list[str] = ['plain', 'first line\nsecond line', 'quoted "bad", with comma', '', 'multi\r\nline\nbad\n']
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'text'])
+        for row, text in enumerate(texts):
+            writer.writerow([f'c{row}', text])
+    return texts
+
+
+def test_csv_reader_keeps_quoted_multiline_records(tmp_path):
+    source = tmp_path / 'in.csv'
+    texts: list[str] = _write_csv(source)
+
+    records = list(RecordReader(str(source), id_field='id').read())
+    assert [record.text for record in records] == texts
+    assert [record.id for record in records] == [f'c{row}' for row in range(len(texts))]
+    assert records[-1].offset == source.stat().st_size
+
+    # reading again from any record's offset yields exactly the records after it
+    for record in records:
+        rest = list(RecordReader(str(source), id_field='id').read(record.offset, record.row + 1))
+        assert rest == records[record.row + 1:]
+
+
+def test_csv_scan_resumes_after_multiline_records(tmp_path):
+    source = tmp_path / 'in.csv'
+    texts: list[str] = _write_csv(source)
+    expected = tmp_path / 'expected.jsonl'
+    scan(ToxicityGuard(FakeClient()), str(source), str(expected), id_field='id', chunk_size=2)
+
+    output = tmp_path / 'out.jsonl'
+    with pytest.raises(ConnectionError):
+        scan(ToxicityGuard(FakeClient(fail=_Outage('multi'))), str(source), str(output), id_field='id', chunk_size=2)
+    scan(ToxicityGuard(FakeClient()), str(source), str(output), id_field='id', chunk_size=2)
+
+    assert output.read_bytes() == expected.read_bytes()
+    assert [line['is_toxic'] for line in _lines(output)] == ['bad' in text for text in texts]
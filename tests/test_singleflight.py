@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from ai_sentinel.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls: list[str] = []
+
+    async def fetch() -> str:
+        calls.append('fetch')
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def main() -> list[str]:
+        return await asyncio.gather(*[flight.do('key', fetch) for _ in range(5)])
+
+    assert asyncio.run(main()) == ['value'] * 5
+    assert calls == ['fetch']
+    assert flight.stats == {'leaders': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+    attempts: list[int] = []
+
+    async def fail() -> None:
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ConnectionError('down')
+
+    async def main() -> list:
+        shared = await asyncio.gather(flight.do('key', fail), flight.do('key', fail), return_exceptions=True)
+        # the failed call is forgotten, the next caller starts a fresh one
+        again = await asyncio.gather(flight.do('key', fail), return_exceptions=True)
+        return shared + again
+
+    outcomes: list = asyncio.run(main())
+    assert all(isinstance(outcome, ConnectionError) for outcome in outcomes)
+    assert len(attempts) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def fetch() -> str:
+        await asyncio.sleep(0.02)
+        return 'value'
+
+    async def main() -> str:
+        first = asyncio.create_task(flight.do('key', fetch))
+        second = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'value'
+
+
+def test_last_waiter_cancelled_cancels_the_call():
+    flight = SingleFlight()
+    finished: list[bool] = []
+
+    async def fetch() -> None:
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    async def main() -> None:
+        waiter = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert flight.in_flight == 0
+        await asyncio.sleep(0.06)
+
+    asyncio.run(main())
+    assert finished == []
@@ -0,0 +1,36 @@
+import time
+
+from ai_sentinel.guards.toxicity_guard import SQLiteVerdictStore, ToxicityResult
+
+
+def _result(reason: str = 'cached') -> ToxicityResult:
+    return ToxicityResult(is_toxic=True, confidence=0.8, categories=['threats'], reason=reason)
+
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    path: str = str(tmp_path / 'verdicts.db')
+    SQLiteVerdictStore(path).set_many({'a': _result('a'), 'b': _result('b')})
+
+    store = SQLiteVerdictStore(path)
+    found: dict[str, ToxicityResult] = store.get_many(['a', 'b', 'missing'])
+    assert {key: result.reason for key, result in found.items()} == {'a': 'a', 'b': 'b'}
+    assert (store.stats['hits'], store.stats['misses'], store.stats['size']) == (2, 1, 2)
+
+
+def test_sqlite_store_compacts_past_its_limit(tmp_path):
+    store = SQLiteVerdictStore(str(tmp_path / 'verdicts.db'), max_entries=10)
+    for key in range(25):
+        store.set(str(key), _result())
+    assert len(store) <= 11
+    # the newest verdicts are the ones kept
+    assert store.get('24') is not None
+
+
+def test_sqlite_store_ttl(tmp_path, monkeypatch):
+    store = SQLiteVerdictStore(str(tmp_path / 'verdicts.db'), ttl=10)
+    store.set('a', _result())
+    now: float = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+
+    assert store.get('a') is None
+    assert store.compact() == 1